@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+from datetime import datetime
+
+# The benchmark runs headless and without a Raspberry Pi Pico, from the repository root (for relative asset paths)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT_DIRPATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT_DIRPATH)
+sys.path.insert(0, ROOT_DIRPATH)
+
+import numpy as np
+import PySide6
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QApplication
+from src.controller.mainController import MainController
+from src.controller.picoProtocol import FRAME_SIZE, SENSOR_VALUE_COUNT, BinaryFrameDecoder, encode_frames
+from src.controller.readerWorker import PicoReaderWorker
+
+# Sample rates which are benchmarked one after another [samples/s]
+DEFAULT_RATES = [10, 100, 1000, 5000, 20000, 50000]
+# Duration of the benchmark per sample rate [s]
+DEFAULT_DURATION = 5.0
+# Interval in which synthetic data is fed into the pipeline, like reads of the reader worker [ms]
+FEED_INTERVAL = 10
+# A rate is considered sustained if the pipeline is busy less than this fraction of the time...
+MAX_SUSTAINED_LOAD = 0.9
+# ...and the oldest sample of a batch is fed at most this late [ms]
+MAX_SUSTAINED_LATENCY = 100
+
+
+def _percentiles(samples: list[float]) -> dict:
+    if len(samples) == 0:
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3), "max": round(max(samples), 3)}
+
+
+def _synthetic_frames(count: int, rate: float) -> bytes:
+    """
+    Generate binary frames with breathing-like pressure and slowly drifting environment values.
+
+    :param count: Number of frames
+    :param rate: Sample rate [samples/s]
+    :return: Encoded frames
+    """
+    t = np.arange(count) / rate
+    values = np.empty((count, SENSOR_VALUE_COUNT))
+    values[:, 0] = 30 + 0.5 * np.sin(t / 60)
+    values[:, 1] = 90 + np.sin(t / 30)
+    values[:, 2] = 400 + 20 * np.sin(t / 10)
+    values[:, 3] = 5 + 15 * np.clip(np.sin(2 * np.pi * t), 0, None)
+    values[:, 4] = 170 + 10 * np.sin(t / 10)
+    return encode_frames(np.arange(count), (t * 1e6).astype(np.int64), values)
+
+
+class PipelineBenchmark:
+    """
+    Feeds synthetic binary frames through decoder -> DeviceSession -> SensorDataModel -> RespiratorMainWindow at a
+    fixed sample rate and measures ingest cost, ingest latency and the frame times (render scheduler frame including
+    the paint of the main window).
+    """
+
+    def __init__(self, app: QApplication, controller: MainController, rate: float, duration: float):
+        self._app = app
+        self._controller = controller
+        self._session = controller.add_device_session("Benchmark")
+        self._rate = rate
+        self._duration = duration
+        self._frames = _synthetic_frames(int(rate * duration) + 1, rate)
+        self._decoder = BinaryFrameDecoder()
+
+        self._fed_samples = 0
+        self._ingest_ns = 0
+        self._decode_ns = 0
+        self._latencies = []
+        self._frame_times = []
+
+    def run(self) -> dict:
+        # Measure every frame of the render scheduler
+        scheduler = self._controller.main_view.render_scheduler
+        scheduler.frame_rendered.connect(self._on_frame_rendered)
+
+        # Let the main window finish its initial layout and paint before measuring
+        self._app.processEvents()
+
+        feed_timer = QTimer()
+        feed_timer.setInterval(FEED_INTERVAL)
+        feed_timer.timeout.connect(self._feed)
+        self._start = time.perf_counter()
+        feed_timer.start()
+        QTimer.singleShot(int(self._duration * 1000), self._app.quit)
+        self._app.exec()
+        feed_timer.stop()
+        elapsed = time.perf_counter() - self._start
+
+        scheduler.frame_rendered.disconnect(self._on_frame_rendered)
+        return self._results(elapsed)
+
+    def _feed(self) -> None:
+        # Feed all samples which are due since the last feed, like one drained read of the reader worker
+        due = min(int((time.perf_counter() - self._start) * self._rate), len(self._frames) // FRAME_SIZE)
+        if due <= self._fed_samples:
+            return
+        latency = (time.perf_counter() - self._start - self._fed_samples / self._rate) * 1000
+        data = self._frames[self._fed_samples * FRAME_SIZE:due * FRAME_SIZE]
+
+        start = time.perf_counter_ns()
+        frames = self._decoder.decode(data)
+        decoded = time.perf_counter_ns()
+        self._session.on_received_sensor_data(frames.values, PicoReaderWorker._host_timestamps(frames))
+        end = time.perf_counter_ns()
+
+        self._decode_ns += decoded - start
+        self._ingest_ns += end - start
+        self._latencies.append(latency)
+        self._fed_samples = due
+
+    def _on_frame_rendered(self, render_time: int) -> None:
+        start = time.perf_counter_ns()
+        # Widgets are only scheduled for repainting by the render scheduler, force the paint to measure its cost
+        self._controller.main_view.repaint()
+        self._frame_times.append((render_time + time.perf_counter_ns() - start) / 1e6)
+
+    def _results(self, elapsed: float) -> dict:
+        load = (self._ingest_ns + sum(self._frame_times) * 1e6) / (elapsed * 1e9)
+        max_latency = max(self._latencies, default=0)
+        return {
+            "rate": self._rate,
+            "duration_s": round(elapsed, 3),
+            "samples": self._fed_samples,
+            "samples_per_s": round(self._fed_samples / elapsed, 1),
+            "ingest_ns_per_sample": round(self._ingest_ns / max(self._fed_samples, 1), 1),
+            "decode_ns_per_sample": round(self._decode_ns / max(self._fed_samples, 1), 1),
+            "ingest_latency_ms": _percentiles(self._latencies),
+            "frame_time_ms": _percentiles(self._frame_times),
+            "frames": len(self._frame_times),
+            # Render quality level the render scheduler settled on (see QUALITY_LEVELS)
+            "render_quality_level": self._controller.main_view.render_scheduler.quality_level,
+            "load": round(load, 3),
+            "sustained": load < MAX_SUSTAINED_LOAD and max_latency < MAX_SUSTAINED_LATENCY,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless end-to-end throughput and latency benchmark of the "
+                                                 "respirator GUI pipeline")
+    parser.add_argument("--rates", type=float, nargs="+", default=DEFAULT_RATES,
+                        help="Sample rates to be benchmarked [samples/s]")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION,
+                        help="Duration per sample rate [s]")
+    parser.add_argument("--shared-canvas", action="store_true",
+                        help="Plot the graphs on one shared canvas instead of one graph per channel")
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    results = []
+    for rate in args.rates:
+        # Fresh controller per rate, so that the ring buffers start empty
+        controller = MainController(record_session=False)
+        controller.main_view.shared_canvas_action.setChecked(args.shared_canvas)
+        results.append(PipelineBenchmark(app, controller, rate, args.duration).run())
+        controller.shutdown()
+        controller.main_view.close()
+        print(f"{rate:>10.0f} samples/s: {results[-1]['ingest_ns_per_sample']} ns/sample, frame time p95 "
+              f"{results[-1]['frame_time_ms'].get('p95')} ms, sustained: {results[-1]['sustained']}", file=sys.stderr)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pyside6": PySide6.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "qt_platform": os.environ["QT_QPA_PLATFORM"],
+        "shared_canvas": args.shared_canvas,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, mode="w") as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,105 @@
 import sys
 import logging
-from PySide6.QtWidgets import QApplication
-from PySide6.QtCore import QTimer
-from src.controller.mainController import MainController
+import argparse
+from src.model.metricsModel import StartupProfile
+from src.controller.loggingController import configure_logging
 
-# Configure logging globally
 log_path = "assets/logs.log"
-log_fmt = "[{asctime},{msecs:3f}] {levelname} ({module}): {message}"
-date_fmt = "%d.%m.%Y %H:%M:%S"
-console_handler = logging.StreamHandler(sys.stdout)
-file_handler = logging.FileHandler(filename=log_path)
-logging.basicConfig(format=log_fmt, datefmt=date_fmt, handlers=[console_handler, file_handler], style="{")
-
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-if __debug__:
-    logger.setLevel(logging.DEBUG)
 
-logger.info("\n-------------- New session started --------------")
 
-logger.debug("Creating sensor data model")
+def _parse_speed(speed: str) -> float | None:
+    """
+    Parse the replay speed argument.
+
+    :param speed: Multiple of the recorded speed or "max" for as fast as possible
+    :return: Replay speed; None for as fast as possible
+    """
+    if speed == "max":
+        return None
+    if float(speed) <= 0:
+        raise argparse.ArgumentTypeError("Replay speed must be positive")
+    return float(speed)
+
+
+def _parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Respirator GUI")
+    parser.add_argument("--demo", action="store_true", help="Display random sensor data instead of reading from the "
+                                                            "Raspberry Pi Pico")
+    parser.add_argument("--binary", action="store_true", help="Raspberry Pi Pico sends binary frames instead of "
+                                                              "text lines")
+    parser.add_argument("--port", action="append", help="Serial port of a Raspberry Pi Pico (e.g. of "
+                                                        "tools/picoSimulator.py), may be given several times; all "
+                                                        "Picos are searched automatically if not given")
+    parser.add_argument("--no-record", action="store_true", help="Do not record the session")
+    parser.add_argument("--replay", metavar="FILE", help="Replay a recorded session or a raw serial dump instead of "
+                                                         "reading from the Raspberry Pi Pico")
+    parser.add_argument("--speed", type=_parse_speed, default=1.0, help="Replay speed as multiple of the recorded "
+                                                                        "speed, or \"max\" (default: 1)")
+    parser.add_argument("--debug", action="store_true", help="Log DEBUG messages")
+    parser.add_argument("--profile-startup", action="store_true", help="Log the duration of each startup phase "
+                                                                       "(imports, main window, instrument panels) "
+                                                                       "and quit")
+    # Qt specific arguments are left to the QApplication
+    return parser.parse_known_args()[0]
+
 
 if __name__ == "__main__":
+    startup_profile = StartupProfile()
+    args = _parse_arguments()
+
+    # Configure logging globally, records are written by a background thread
+    configure_logging(log_path, debug=args.debug)
+    logger.info("\n-------------- New session started --------------")
+    startup_profile.mark("Configure logging")
+
+    # Qt and the controllers are imported here instead of at the top, so that their import times are profiled
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QTimer
+    startup_profile.mark("Import Qt")
 
     logger.debug("Creating PyQt application")
     app = QApplication(sys.argv)
+    startup_profile.mark("Create Qt application")
+
+    from src.controller.mainController import MainController
+    startup_profile.mark("Import controllers and views")
 
     logger.debug("Loading main MVC controller")
-    mc = MainController()
+    # Every session is recorded, except for replays of already recorded data
+    mc = MainController(record_session=not (args.no_record or args.replay))
+    startup_profile.mark("Create main window")
 
     timer = QTimer()
     timer.setInterval(800)
 
-    # Use the sensor data mock if "demo" argument is given
-    if "--demo" in sys.argv:
-        timer.timeout.connect(mc.write_random_data)
-    else:
-        timer.timeout.connect(mc.read_sensor_data)
+    def start_data_source() -> None:
+        """
+        Use the sensor data mock if "demo" argument is given, replay a file if "replay" argument is given, otherwise
+        read from all Picos in dedicated threads. This is called once the event loop runs, so that the main window is
+        shown before the instrument panels are built (which imports pyqtgraph).
+        """
+        startup_profile.mark("Show main window")
+        if args.demo:
+            mc.start_demo()
+            timer.timeout.connect(mc.write_random_data)
+            timer.start()
+        elif args.replay:
+            mc.start_replay(args.replay, args.speed, binary_protocol=args.binary)
+        else:
+            mc.start_acquisition(binary_protocol=args.binary, ports=args.port)
+        startup_profile.mark("Start data source and build panels")
+        if args.profile_startup:
+            QTimer.singleShot(0, finish_startup_profile)
+
+    def finish_startup_profile() -> None:
+        startup_profile.mark("Show instrument panels")
+        startup_profile.report()
+        app.quit()
+
+    QTimer.singleShot(0, start_data_source)
+    app.aboutToQuit.connect(mc.shutdown)
 
     while 1:
         logger.info("Running application main loop")
-        timer.start()
         sys.exit(app.exec())
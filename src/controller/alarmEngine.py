@@ -0,0 +1,189 @@
+import math
+import logging
+import numpy as np
+from typing import NamedTuple
+from src.model.channelRegistry import ChannelSpec
+
+# An alarm is raised if no sample was received for this long, e.g. because the Raspberry Pi Pico hangs [ns]
+NO_DATA_TIMEOUT_NS = 2_000_000_000
+
+# Kinds of alarms: value below the minimum or above the maximum of its channel, value changing faster than the maximum
+# rate of its channel, no samples received for NO_DATA_TIMEOUT_NS and connection to the Raspberry Pi Pico lost
+CHANNEL_ALARM_KINDS = ("min", "max", "rate")
+DEVICE_ALARM_KINDS = ("no_data", "disconnected")
+
+
+class Alarm(NamedTuple):
+    """
+    Alarm raised or cleared by the AlarmEngine.
+    """
+    # Channel name; "" for alarms of the whole device (see DEVICE_ALARM_KINDS)
+    channel: str
+    kind: str
+    # Offending sensor value (the latest value if the alarm is cleared); NaN for alarms of the whole device
+    value: float
+    # Monotonic timestamp [ns] of the offending sample, from which the notification latency is measured. For "no_data"
+    # alarms it's the time at which the timeout expired, for "disconnected" alarms the time the connection was lost.
+    timestamp: int
+
+
+class AlarmEngine:
+    """
+    AlarmEngine checks every batch of samples of a Raspberry Pi Pico against the alarm limits of its channels (see the
+    channel registry) with vectorised comparisons over the whole batch, i.e. the cost per batch hardly depends on the
+    number of samples. It's called by the reader worker right after a batch is decoded, so an alarm is raised within
+    the time it takes to read and decode the batch, independent of the GUI. Alarms stay active until the latest sample
+    is within the limits again, and are only reported when they are raised and when they are cleared.
+
+    The checks run in the reader thread, while the limits are set from the GUI thread. The limits are therefore never
+    modified in place, but replaced as a whole.
+    """
+
+    # Channel names by column of the samples sent by the Raspberry Pi Pico
+    _names = list
+    _columns = dict
+    # Limits by column; NaN if a channel has no such limit
+    _minimum = np.ndarray
+    _maximum = np.ndarray
+    # Maximum rate of change [unit/s]
+    _max_rate = np.ndarray
+    _no_data_timeout = int
+    # Whether a channel alarm is active, by kind and column
+    _active = dict
+    # Active alarms of the whole device by kind
+    _device_alarms = dict
+    # Latest sample of the previous batch, from which the rate of change of the first sample of a batch is computed
+    _last_values = np.ndarray
+    _last_timestamp = int
+
+    def __init__(self, channels: list[ChannelSpec], no_data_timeout: int = NO_DATA_TIMEOUT_NS):
+        """
+        :param channels: Sensor channels of the channel registry; only channels sent by the Pico are checked
+        :param no_data_timeout: Time without samples after which a "no_data" alarm is raised [ns]
+        """
+        wire_channels = sorted((channel for channel in channels if channel.wire_index is not None),
+                               key=lambda channel: channel.wire_index)
+        self._names = [channel.name for channel in wire_channels]
+        self._columns = {name: column for column, name in enumerate(self._names)}
+        self._minimum = self._limits(channel.alarm_min for channel in wire_channels)
+        self._maximum = self._limits(channel.alarm_max for channel in wire_channels)
+        self._max_rate = self._limits(channel.alarm_max_rate for channel in wire_channels)
+        self._no_data_timeout = no_data_timeout
+        self._active = {kind: np.zeros(len(wire_channels), dtype=bool) for kind in CHANNEL_ALARM_KINDS}
+        self._device_alarms = {}
+        self._last_values = None
+        self._last_timestamp = None
+
+    @staticmethod
+    def _limits(limits) -> np.ndarray:
+        return np.array([math.nan if limit is None else limit for limit in limits], dtype=np.float64)
+
+    def set_limits(self, channel: str, minimum: float | None, maximum: float | None) -> bool:
+        """
+        Set the alarm limits of a channel, e.g. from a respiration preset. The limits apply from the next batch on.
+        Limits which don't leave any valid value (minimum >= maximum) are rejected, since they would keep an alarm
+        active for every sample.
+
+        :param channel: Channel name
+        :param minimum: Minimum value; None to not check the minimum
+        :param maximum: Maximum value; None to not check the maximum
+        :return: Whether the limits were set
+        :raises KeyError: If the channel is not sent by the Raspberry Pi Pico
+        """
+        column = self._columns[channel]
+        if minimum is not None and maximum is not None and minimum >= maximum:
+            logging.warning(f"Rejecting alarm limits of {channel}: minimum {minimum} is not below maximum {maximum}")
+            return False
+        # Replace the arrays instead of modifying them, so that a running check sees either the old or the new limits
+        limits = self._minimum.copy()
+        limits[column] = math.nan if minimum is None else minimum
+        self._minimum = limits
+        limits = self._maximum.copy()
+        limits[column] = math.nan if maximum is None else maximum
+        self._maximum = limits
+        return True
+
+    def check(self, values: np.ndarray, timestamps: np.ndarray) -> tuple[list[Alarm], list[Alarm]]:
+        """
+        Check a batch of samples against the alarm limits.
+
+        :param values: Sensor values with shape (number of samples, number of channels sent by the Pico)
+        :param timestamps: Monotonic timestamps [ns] of the samples (ascending)
+        :return: Tuple of (raised alarms, cleared alarms)
+        """
+        raised = []
+        # Receiving samples clears the alarms of the whole device
+        cleared = [self._device_alarms.pop(kind)._replace(timestamp=int(timestamps[0]))
+                   for kind in DEVICE_ALARM_KINDS if kind in self._device_alarms]
+        # Comparisons with NaN limits are always False, so channels without limits never violate them
+        minimum, maximum, max_rate = self._minimum, self._maximum, self._max_rate
+        violations = {
+            "min": values < minimum,
+            "max": values > maximum,
+            "rate": self._rate_violations(values, timestamps, max_rate),
+        }
+
+        for kind, violated in violations.items():
+            active = self._active[kind]
+            new = violated.any(axis=0) & ~active
+            for column in np.flatnonzero(new):
+                # The alarm is timestamped with the first offending sample of the batch
+                row = int(violated[:, column].argmax())
+                raised.append(Alarm(self._names[column], kind, float(values[row, column]), int(timestamps[row])))
+            # An alarm stays active as long as the latest sample violates the limit
+            still_violated = violated[-1]
+            for column in np.flatnonzero((active | new) & ~still_violated):
+                cleared.append(Alarm(self._names[column], kind, float(values[-1, column]), int(timestamps[-1])))
+            self._active[kind] = still_violated
+
+        self._last_values = values[-1].copy()
+        self._last_timestamp = int(timestamps[-1])
+        return raised, cleared
+
+    def _rate_violations(self, values: np.ndarray, timestamps: np.ndarray, max_rate: np.ndarray) -> np.ndarray:
+        """
+        :return: Whether the change from the previous sample exceeds the maximum rate, by sample and column
+        """
+        if np.isnan(max_rate).all():
+            return np.zeros(values.shape, dtype=bool)
+        if self._last_values is not None:
+            values = np.vstack((self._last_values, values))
+            timestamps = np.append(self._last_timestamp, timestamps)
+        intervals = np.diff(timestamps) / 1e9
+        # Compared as |change| > maximum rate * interval. Samples which share a timestamp (text lines of one read) have no
+        # interval from which a rate could be computed, so they never violate the maximum rate; only the changes between
+        # samples with different timestamps (e.g. from one read to the next) are checked.
+        violated = (intervals[:, None] > 0) & (np.abs(np.diff(values, axis=0)) > max_rate * intervals[:, None])
+        if self._last_values is None:
+            # The first sample ever received has no predecessor
+            violated = np.vstack((np.zeros((1, len(max_rate)), dtype=bool), violated))
+        return violated
+
+    def check_no_data(self, now: int) -> list[Alarm]:
+        """
+        Check whether no sample was received for longer than the timeout. This check is supposed to be run by the
+        reader worker after every read which didn't yield any samples, so its latency is bounded by the read timeout.
+
+        :param now: Current monotonic time [ns]
+        :return: Raised alarms
+        """
+        if self._last_timestamp is None or "no_data" in self._device_alarms:
+            return []
+        deadline = self._last_timestamp + self._no_data_timeout
+        if now < deadline:
+            return []
+        return [self._raise_device_alarm("no_data", deadline)]
+
+    def connection_lost(self, now: int) -> list[Alarm]:
+        """
+        :param now: Current monotonic time [ns]
+        :return: Raised alarms
+        """
+        if "disconnected" in self._device_alarms:
+            return []
+        return [self._raise_device_alarm("disconnected", now)]
+
+    def _raise_device_alarm(self, kind: str, timestamp: int) -> Alarm:
+        alarm = Alarm("", kind, math.nan, timestamp)
+        self._device_alarms[kind] = alarm
+        return alarm
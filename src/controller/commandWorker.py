@@ -0,0 +1,191 @@
+import time
+import queue
+import logging
+from typing import NamedTuple
+from PySide6.QtCore import QObject, Signal, Slot
+from src.controller.usbController import PicoUSBController
+from src.controller.picoProtocol import COMMAND_DEDUPE_WINDOW, encode_command
+from src.model.metricsModel import pipeline_metrics
+
+# Maximum number of commands which are sent before their acknowledgements are received; a repeated command must still
+# be within the IDs remembered by the Raspberry Pi Pico, so this mustn't exceed COMMAND_DEDUPE_WINDOW
+MAX_IN_FLIGHT = 4
+# Time after which an unacknowledged command is sent again; doubled with every attempt [ns]
+ACK_TIMEOUT_NS = 200_000_000
+# A command fails if it isn't acknowledged after this many attempts
+MAX_SEND_ATTEMPTS = 4
+# Interval in which the worker checks whether it's stopped while no command is pending [s]
+IDLE_INTERVAL = 0.5
+
+
+class PendingCommand(NamedTuple):
+    """
+    Command which was sent to the Raspberry Pi Pico and not acknowledged yet.
+    """
+    payload: bytes
+    attempts: int
+    # Monotonic timestamps [ns] of the first transmission and the time after which the command is sent again
+    first_sent_ns: int
+    deadline_ns: int
+
+
+class CommandWorker(QObject):
+    """
+    CommandWorker sends commands (e.g. presets) to the Raspberry Pi Pico and waits for their acknowledgements. It is
+    supposed to be moved to a dedicated QThread, so that neither the GUI nor the reader thread is blocked by serial
+    writes or by waiting for acknowledgements. Commands are queued by send() and up to MAX_IN_FLIGHT of them are sent
+    before their acknowledgements are received. Acknowledgements are extracted from the received data by the reader
+    worker, which passes them to acknowledge(). Unacknowledged commands are sent again with exponential backoff.
+    """
+
+    # Signals
+    # Command ID and round-trip latency from the first transmission to the acknowledgement [ns]
+    command_acknowledged = Signal(int, "qint64")
+    # Command ID and description of the error
+    command_failed = Signal(int, str)
+    finished = Signal()
+
+    _usb_controller = PicoUSBController
+    # Events for the worker thread: ("send", command ID, payload), ("ack", command IDs, monotonic time [ns]) or None to
+    # stop the worker
+    _events = queue.Queue
+    # Commands which wait to be sent, as tuples of (command ID, payload), and sent commands by command ID
+    _queued = list
+    _in_flight = dict
+    _running = False
+
+    def __init__(self, usb_controller: PicoUSBController):
+        """
+        :param usb_controller: Controller of the serial connection to the Raspberry Pi Pico
+        """
+        logging.debug("Creating new command worker for Raspberry Pi Pico")
+        super(CommandWorker, self).__init__()
+        self._usb_controller = usb_controller
+        self._events = queue.Queue()
+        self._queued = []
+        self._in_flight = {}
+
+    def send(self, command_id: int, payload: bytes) -> None:
+        """
+        Queue a command to be sent to the Raspberry Pi Pico. This method is meant to be called from another thread.
+
+        :param command_id: Command ID, with which the command is reported by command_acknowledged or command_failed; it
+        is assigned by the device session, so that it isn't reused after a reconnect
+        :param payload: Command data without line breaks
+        :return: None
+        :raises ValueError: Payload contains a line break
+        """
+        if b"\n" in payload:
+            raise ValueError("Command payload must not contain line breaks")
+        self._events.put(("send", command_id, payload))
+
+    def acknowledge(self, command_ids: list[int], received_ns: int) -> None:
+        """
+        Report received acknowledgements. This method is meant to be called from the reader thread.
+
+        :param command_ids: IDs of the acknowledged commands
+        :param received_ns: Monotonic time [ns] at which the acknowledgements were received
+        :return: None
+        """
+        self._events.put(("ack", command_ids, received_ns))
+
+    @Slot()
+    def run(self) -> None:
+        """
+        Send loop of the worker, which runs until stop() is called. Commands which are still pending then fail.
+
+        :return: None
+        """
+        logging.debug("Starting to send commands to Raspberry Pi Pico")
+        self._running = True
+        while self._running:
+            try:
+                event = self._events.get(timeout=self._time_until_next_deadline())
+            except queue.Empty:
+                event = ()
+            if event is None:
+                break
+            if len(event) > 0 and event[0] == "send":
+                self._queued.append(event[1:])
+            elif len(event) > 0:
+                self._on_acknowledged(*event[1:])
+            self._retry_overdue_commands()
+            self._send_queued_commands()
+
+        for command_id in [*self._in_flight, *(command_id for command_id, _ in self._queued)]:
+            self._fail(command_id, "Command channel was closed before the command was acknowledged")
+        self._in_flight.clear()
+        self._queued.clear()
+        logging.debug("Stopped sending commands to Raspberry Pi Pico")
+        self.finished.emit()
+
+    def stop(self) -> None:
+        """
+        Stop the send loop. This method is meant to be called from another thread.
+
+        :return: None
+        """
+        self._running = False
+        self._events.put(None)
+
+    def _time_until_next_deadline(self) -> float:
+        """
+        :return: Time until the next unacknowledged command is due to be sent again [s]
+        """
+        if len(self._in_flight) == 0:
+            return IDLE_INTERVAL
+        deadline = min(command.deadline_ns for command in self._in_flight.values())
+        return min(max(deadline - time.monotonic_ns(), 0) / 1e9, IDLE_INTERVAL)
+
+    def _on_acknowledged(self, command_ids: list[int], received_ns: int) -> None:
+        for command_id in command_ids:
+            command = self._in_flight.pop(command_id, None)
+            if command is None:
+                # Acknowledgement of a command which was sent again, or which was already acknowledged
+                continue
+            latency = max(received_ns - command.first_sent_ns, 0)
+            pipeline_metrics.record("command_rtt", latency)
+            logging.info("Command %d acknowledged by Raspberry Pi Pico at %s after %.1f ms (%d attempts)", command_id,
+                         self._usb_controller.port, latency / 1e6, command.attempts)
+            self.command_acknowledged.emit(command_id, latency)
+
+    def _retry_overdue_commands(self) -> None:
+        now = time.monotonic_ns()
+        for command_id, command in list(self._in_flight.items()):
+            if now < command.deadline_ns:
+                continue
+            if command.attempts >= MAX_SEND_ATTEMPTS:
+                del self._in_flight[command_id]
+                self._fail(command_id, f"Command was not acknowledged after {command.attempts} attempts")
+                continue
+            logging.warning("Command %d not acknowledged by Raspberry Pi Pico at %s, sending it again", command_id,
+                            self._usb_controller.port)
+            pipeline_metrics.count("command_retries")
+            self._transmit(command_id, command.payload, command.attempts + 1, command.first_sent_ns)
+
+    def _send_queued_commands(self) -> None:
+        while len(self._queued) > 0 and len(self._in_flight) < MAX_IN_FLIGHT:
+            command_id, payload = self._queued.pop(0)
+            pipeline_metrics.count("commands")
+            self._transmit(command_id, payload, 1, None)
+
+    def _transmit(self, command_id: int, payload: bytes, attempt: int, first_sent_ns: int | None) -> None:
+        """
+        Write a command to the Raspberry Pi Pico and wait for its acknowledgement until the backoff of the attempt.
+
+        :param command_id: Command ID
+        :param payload: Command data
+        :param attempt: Number of the attempt, starting with 1
+        :param first_sent_ns: Monotonic timestamp [ns] of the first transmission; None for the first attempt
+        :return: None
+        """
+        now = time.monotonic_ns()
+        self._in_flight[command_id] = PendingCommand(payload, attempt, now if first_sent_ns is None else first_sent_ns,
+                                                     now + ACK_TIMEOUT_NS * 2 ** (attempt - 1))
+        # A failed write is retried like a lost acknowledgement
+        self._usb_controller.write_to_pico(encode_command(command_id, payload))
+
+    def _fail(self, command_id: int, error: str) -> None:
+        logging.error("Command %d to Raspberry Pi Pico at %s failed: %s", command_id, self._usb_controller.port, error)
+        pipeline_metrics.count("command_failures")
+        self.command_failed.emit(command_id, error)
@@ -0,0 +1,424 @@
+import os
+import re
+import time
+import random
+import logging
+import numpy as np
+from datetime import datetime
+from serial.serialutil import SerialException
+from PySide6.QtCore import QObject, QThread, QTimer, Signal, Slot
+from src.view.instrumentPanel import InstrumentPanel
+from src.model.sensorDataModel import SensorDataModel
+from src.model.breathAnalyzer import BreathAnalyzer, IE_RATIO_CHANNEL, RESPIRATORY_RATE_CHANNEL
+from src.model.channelRegistry import ChannelSpec
+from src.model.sessionRecorder import SessionRecorder
+from src.model.metricsModel import pipeline_metrics
+from src.controller.usbController import PicoUSBController
+from src.controller.readerWorker import PicoReaderWorker
+from src.controller.commandWorker import CommandWorker
+from src.controller.picoProtocol import COMMAND_ID_LIMIT
+from src.controller.alarmEngine import Alarm, AlarmEngine
+from src.controller.replayWorker import ReplayWorker
+
+# Channel whose alarm limits are set from the respiration presets and from which the breaths are analyzed
+PRESSURE_CHANNEL = "air_pressure"
+# The pressure alarm band of a preset reaches from its minimum (PEEP) to its maximum (peak) pressure, widened by this
+# fraction of the band on both sides, so that the regular breathing doesn't touch the alarm limits
+PRESSURE_ALARM_TOLERANCE = 0.1
+# If the reader stops on an error while the Raspberry Pi Pico is still present, its port is reopened after this
+# interval [ms], up to MAX_REOPEN_ATTEMPTS times
+REOPEN_INTERVAL = 500
+MAX_REOPEN_ATTEMPTS = 10
+
+
+class DeviceSession(QObject):
+    """
+    DeviceSession bundles everything which belongs to one data source (a Raspberry Pi Pico, a replayed file or the
+    demo data): its sensor data model, session recording and instrument panel, and its acquisition worker in a
+    dedicated thread. The sessions of several devices are independent of each other, so a slow or stalled serial port
+    only affects its own reader thread. If the connection to a Raspberry Pi Pico is lost, its session is kept, so that
+    the acquisition continues in the same model, recording and panel when the Pico is reconnected. Commands to a live
+    Raspberry Pi Pico are sent by a command worker in another dedicated thread.
+    """
+
+    # Signals
+    # Name of the session and the alarm raised or cleared by the alarm engine in the reader thread
+    alarm_raised = Signal(str, Alarm)
+    alarm_cleared = Signal(str, Alarm)
+    # Name of the session, command ID and round-trip latency [ns] of an acknowledged command
+    command_acknowledged = Signal(str, int, "qint64")
+    # Name of the session, command ID and description of the error of a failed command
+    command_failed = Signal(str, int, str)
+
+    # MVC components
+    sensor_model = SensorDataModel
+    panel = InstrumentPanel
+    usb_controller = PicoUSBController
+    # Acquisition (live from the Pico or replayed from a file) in a dedicated thread
+    _acquisition_thread = QThread
+    _acquisition_worker = PicoReaderWorker | ReplayWorker
+    _session_recorder = SessionRecorder
+    # Commands to the Raspberry Pi Pico in a dedicated thread
+    _command_thread = QThread
+    _command_worker = CommandWorker
+    # ID of the next command, which continues across reconnects, so that the Pico doesn't take a new command for a repeated
+    # one
+    _next_command_id = 0
+    # Alarm checks of the live sensor data, which keep their limits and state across reconnects
+    alarm_engine = AlarmEngine
+    # Breath analysis of the pressure, whose results are appended to the model as derived channels
+    breath_analyzer = BreathAnalyzer
+    # Column of the pressure in the samples sent by the Raspberry Pi Pico; None if the pressure isn't sent
+    _pressure_column = int
+
+    name = str
+    # USB serial number of the Raspberry Pi Pico ("" if unknown), which identifies it if it reappears at another port
+    serial_number = ""
+    connected = False
+    _binary_protocol = False
+    # Whether the port is reopened after a read error; not after the Pico was removed or the session was closed
+    _reopen_on_error = False
+    # Monotonic timestamp [ns] of the last received sample
+    _last_sample_ns = None
+    # Monotonic time [ns] at which the Raspberry Pi Pico reappeared, until its first samples are received
+    _reconnect_detected_ns = None
+
+    def __init__(self, name: str, channels: list[ChannelSpec], panel: InstrumentPanel, sessions_dirpath: str | None):
+        """
+        :param name: Name of the data source, e.g. the serial port of the Raspberry Pi Pico
+        :param channels: Sensor channels of the channel registry
+        :param panel: Instrument panel which displays the sensor data
+        :param sessions_dirpath: Directory in which the sensor data is recorded; None to not record the session
+        """
+        logging.debug(f"Creating new device session for {name}")
+        super(DeviceSession, self).__init__()
+        self.name = name
+        self.panel = panel
+        self.sensor_model = SensorDataModel(channels)
+        self.alarm_engine = AlarmEngine(channels)
+        self.breath_analyzer = BreathAnalyzer()
+        wire_channels = self.sensor_model.wire_channel_names
+        self._pressure_column = wire_channels.index(PRESSURE_CHANNEL) if PRESSURE_CHANNEL in wire_channels else None
+        self.usb_controller = None
+        self._acquisition_thread = None
+        self._command_thread = None
+        # Random start, so that the IDs don't repeat the ones of a previous run of the GUI
+        self._next_command_id = random.randrange(COMMAND_ID_LIMIT)
+        self._session_recorder = None
+        if sessions_dirpath is not None:
+            self._start_session_recording(sessions_dirpath)
+
+        # Modified channels are dispatched to their instruments by the panel
+        self.sensor_model.modified_channels.connect(self.panel.on_modified_channels)
+
+    def close(self) -> None:
+        """
+        Stop the acquisition and close the session recording.
+
+        :return: None
+        """
+        self._reopen_on_error = False
+        self.stop_acquisition()
+        if self.usb_controller is not None:
+            self.usb_controller.close()
+        if self._session_recorder is not None:
+            self.sensor_model.set_recorder(None)
+            self._session_recorder.close()
+            self._session_recorder = None
+
+    def _start_session_recording(self, sessions_dirpath: str) -> None:
+        # Sessions of several devices are started at the same time, so the file name also contains the device
+        device = re.sub(r"[^\w.-]", "_", os.path.basename(self.name))
+        filename = datetime.now().strftime(f"session_%Y-%m-%d_%H-%M-%S_{device}.rsr")
+        try:
+            self._session_recorder = SessionRecorder(os.path.join(sessions_dirpath, filename),
+                                                     self.sensor_model.channel_names)
+        except OSError as error:
+            logging.error(f"Could not create session recording, sensor data of {self.name} will not be recorded: "
+                          f"{error}")
+        else:
+            self.sensor_model.set_recorder(self._session_recorder)
+
+    """
+    Methods for managing the acquisition
+    """
+
+    def start_acquisition(self, usb_controller: PicoUSBController, binary_protocol: bool = False,
+                          serial_number: str = "") -> None:
+        """
+        Start reading the sensor data from the Raspberry Pi Pico in a dedicated reader thread, so that serial reads do
+        not block the GUI or the other devices.
+
+        :param usb_controller: Controller of the serial connection to the Raspberry Pi Pico
+        :param binary_protocol: Whether the Pico sends binary frames instead of text lines (see picoProtocol)
+        :param serial_number: USB serial number of the Raspberry Pi Pico ("" if unknown)
+        :return: None
+        """
+        self.usb_controller = usb_controller
+        self.serial_number = serial_number
+        self._binary_protocol = binary_protocol
+        self._reopen_on_error = True
+        self._start_command_thread(usb_controller)
+        worker = PicoReaderWorker(usb_controller, binary_protocol, self.sensor_model.wire_value_count,
+                                  self.alarm_engine, self._command_worker)
+        worker.received_sensor_data.connect(self.on_received_sensor_data)
+        worker.connection_changed.connect(self.on_connection_changed)
+        worker.alarm_raised.connect(self.on_alarm_raised)
+        worker.alarm_cleared.connect(self.on_alarm_cleared)
+        worker.read_failed.connect(self.on_read_failed)
+        self._start_acquisition_thread(worker)
+
+    def start_replay(self, filepath: str, speed: float | None = 1.0, binary_protocol: bool = False) -> None:
+        """
+        Replay a recorded session or a raw serial dump through the same pipeline as the live Raspberry Pi Pico.
+
+        :param filepath: Path of a session file or a raw serial dump
+        :param speed: Replay speed as multiple of the recorded speed; None to replay as fast as possible
+        :param binary_protocol: Whether a raw serial dump contains binary frames instead of text lines
+        :return: None
+        """
+        worker = ReplayWorker(filepath, speed, binary_protocol, self.sensor_model.wire_value_count)
+        # Raw dumps are parsed like live data, recorded sessions already contain parsed samples
+        worker.received_sensor_data.connect(self.on_received_sensor_data)
+        worker.received_samples.connect(self.on_received_samples)
+        # Connected after the slots above, so that the worker emits its next batch only after this one was appended
+        worker.received_sensor_data.connect(self.on_replayed_batch)
+        worker.received_samples.connect(self.on_replayed_batch)
+        self._start_acquisition_thread(worker)
+
+    def set_pressure_limits(self, minimum: float, maximum: float) -> tuple[float, float] | None:
+        """
+        Set the pressure alarm limits, e.g. from the selected respiration preset. The alarm band reaches from the
+        minimum (PEEP) to the maximum (peak) pressure, widened by PRESSURE_ALARM_TOLERANCE. A range which doesn't
+        contain any pressure (minimum >= maximum) is rejected and the previous limits are kept.
+
+        :param minimum: Minimum pressure (PEEP) [psi]
+        :param maximum: Maximum pressure (peak) [psi]
+        :return: Tuple of (lower, upper) alarm limits [psi]; None if the range was rejected
+        """
+        if minimum >= maximum:
+            logging.warning(f"Not setting pressure alarm limits of {self.name}: minimum pressure {minimum} psi is not "
+                            f"below maximum pressure {maximum} psi")
+            return None
+        tolerance = PRESSURE_ALARM_TOLERANCE * (maximum - minimum)
+        lower, upper = minimum - tolerance, maximum + tolerance
+        if not self.alarm_engine.set_limits(PRESSURE_CHANNEL, lower, upper):
+            return None
+        logging.info(f"Setting pressure alarm limits of {self.name} to {lower} - {upper} psi")
+        return lower, upper
+
+    def set_breath_targets(self, respiratory_rate: float, ie_ratio: float) -> None:
+        """
+        Set the respiratory rate and I/E ratio, with which the analyzed breaths are compared, e.g. from the selected
+        respiration preset.
+
+        :param respiratory_rate: Respiratory rate [1/min]
+        :param ie_ratio: Inspiration to expiration ratio
+        :return: None
+        """
+        logging.info(f"Setting breath targets of {self.name} to {respiratory_rate} 1/min, I/E {ie_ratio}")
+        for channel, target in ((RESPIRATORY_RATE_CHANNEL, respiratory_rate), (IE_RATIO_CHANNEL, ie_ratio)):
+            if channel in self.panel.instruments:
+                self.panel.instruments[channel][0].set_target(target)
+
+    def reconnect(self, usb_controller: PicoUSBController, detected_ns: int) -> None:
+        """
+        Resume the acquisition after the Raspberry Pi Pico reappeared, possibly at another serial port.
+
+        :param usb_controller: Controller of the new serial connection to the Raspberry Pi Pico
+        :param detected_ns: Monotonic time [ns] at which the Pico reappeared
+        :return: None
+        """
+        logging.info(f"Reconnecting to Raspberry Pi Pico {self.name} at {usb_controller.port}")
+        # The reader of the lost connection has already stopped or stops with its next read
+        self.stop_acquisition()
+        if self.usb_controller is not None:
+            self.usb_controller.close()
+        self._reconnect_detected_ns = detected_ns
+        # The breath in progress when the connection was lost can't be completed
+        self.breath_analyzer = BreathAnalyzer()
+        self.start_acquisition(usb_controller, self._binary_protocol, self.serial_number)
+
+    def on_device_removed(self) -> None:
+        """
+        Stop reading from the Raspberry Pi Pico after it disappeared, without waiting for the pending read.
+
+        :return: None
+        """
+        # The Pico is reopened by the MainController once it reappears
+        self._reopen_on_error = False
+        if self._acquisition_thread is not None and self._acquisition_thread.isRunning():
+            self._acquisition_worker.stop()
+        # Pending commands can't be acknowledged anymore
+        if self._command_thread is not None and self._command_thread.isRunning():
+            self._command_worker.stop()
+        self.on_connection_changed(False)
+
+    @Slot(str)
+    def on_read_failed(self, error: str) -> None:
+        """
+        Reopen the serial port after the reader stopped on an error. If the Raspberry Pi Pico was unplugged, the
+        device watcher reports it as removed and the reopen is given up; if the port is still present (e.g. after a
+        transient I/O error), the watcher doesn't report the Pico again, so the session has to reopen it itself.
+
+        :param error: Description of the error
+        :return: None
+        """
+        failed_ns = time.monotonic_ns()
+        logging.info(f"Reopening Raspberry Pi Pico {self.name} in {REOPEN_INTERVAL} ms after read error: {error}")
+        QTimer.singleShot(REOPEN_INTERVAL, lambda: self._reopen(failed_ns, 1))
+
+    def _reopen(self, failed_ns: int, attempt: int) -> None:
+        # The Pico may have been removed or already reopened by the MainController in the meantime
+        if not self._reopen_on_error or self.is_acquiring:
+            return
+        try:
+            usb_controller = PicoUSBController(self.usb_controller.port)
+        except SerialException as error:
+            if attempt < MAX_REOPEN_ATTEMPTS:
+                QTimer.singleShot(REOPEN_INTERVAL, lambda: self._reopen(failed_ns, attempt + 1))
+            else:
+                logging.error(f"Could not reopen Raspberry Pi Pico {self.name}: {error}")
+            return
+        self.reconnect(usb_controller, failed_ns)
+
+    @property
+    def recording_filepath(self) -> str | None:
+        """
+        :return: Path of the file to which the session is recorded; None if the session isn't recorded
+        """
+        return None if self._session_recorder is None else self._session_recorder.filepath
+
+    @property
+    def is_acquiring(self) -> bool:
+        return self._acquisition_thread is not None and self._acquisition_thread.isRunning()
+
+    def stop_acquisition(self) -> None:
+        """
+        Stop the acquisition and command threads and wait until the pending serial read has finished.
+
+        :return: None
+        """
+        if self._acquisition_thread is not None and self._acquisition_thread.isRunning():
+            logging.debug(f"Stopping acquisition thread of {self.name}")
+            self._acquisition_worker.stop()
+            self._acquisition_thread.quit()
+            self._acquisition_thread.wait()
+        if self._command_thread is not None and self._command_thread.isRunning():
+            logging.debug(f"Stopping command thread of {self.name}")
+            self._command_worker.stop()
+            self._command_thread.quit()
+            self._command_thread.wait()
+
+    def send_command(self, payload: bytes) -> int | None:
+        """
+        Send a command to the Raspberry Pi Pico without waiting for it to be written or acknowledged. The result is
+        reported by command_acknowledged or command_failed.
+
+        :param payload: Command data without line breaks
+        :return: Command ID; None if the session isn't connected to a Raspberry Pi Pico
+        """
+        if self._command_thread is None or not self._command_thread.isRunning() or not self.connected:
+            return None
+        command_id = self._next_command_id
+        self._command_worker.send(command_id, payload)
+        self._next_command_id = (command_id + 1) % COMMAND_ID_LIMIT
+        return command_id
+
+    def _start_command_thread(self, usb_controller: PicoUSBController) -> None:
+        logging.debug(f"Starting command thread of {self.name}")
+        self._command_thread = QThread()
+        self._command_worker = CommandWorker(usb_controller)
+        self._command_worker.moveToThread(self._command_thread)
+        self._command_thread.started.connect(self._command_worker.run)
+        self._command_worker.finished.connect(self._command_thread.quit)
+        self._command_worker.command_acknowledged.connect(self.on_command_acknowledged)
+        self._command_worker.command_failed.connect(self.on_command_failed)
+        self._command_thread.start()
+
+    def _start_acquisition_thread(self, worker: PicoReaderWorker | ReplayWorker) -> None:
+        logging.debug(f"Starting acquisition thread of {self.name}")
+        self._acquisition_thread = QThread()
+        self._acquisition_worker = worker
+        worker.moveToThread(self._acquisition_thread)
+
+        # Signals are emitted in the acquisition thread, so the slots are invoked as queued connections in the GUI
+        # thread
+        self._acquisition_thread.started.connect(worker.run)
+        worker.finished.connect(self._acquisition_thread.quit)
+        self._acquisition_thread.start()
+
+    @Slot(np.ndarray, np.ndarray)
+    def on_received_sensor_data(self, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """
+        Write a batch of sensor values parsed by the reader worker to the sensor data model.
+
+        :param values: Sensor values with shape (number of samples, number of values per sample)
+        :param timestamps: Monotonic timestamps [ns] of the samples
+        :return: None
+        """
+        if self._reconnect_detected_ns is not None:
+            self._record_reconnect(int(timestamps[0]))
+        self._last_sample_ns = int(timestamps[-1])
+
+        # The breaths completed by the batch are appended together with it
+        derived_samples = None
+        if self._pressure_column is not None:
+            derived_samples = self.breath_analyzer.process(values[:, self._pressure_column], timestamps)
+        # The columns are mapped to the channels by their wire indices in the channel registry
+        self.sensor_model.append_frames(values, timestamps, derived_samples)
+
+    @Slot(dict)
+    def on_received_samples(self, samples: dict) -> None:
+        """
+        Write a batch of already parsed samples (e.g. from a replayed session) to the sensor data model.
+
+        :param samples: Tuples of (values, monotonic timestamps [ns]) by channel name
+        :return: None
+        """
+        self.sensor_model.append_samples(samples)
+
+    @Slot()
+    def on_replayed_batch(self) -> None:
+        """
+        Let the replay worker emit its next batch, after the previous one was appended to the sensor data model.
+
+        :return: None
+        """
+        if isinstance(self._acquisition_worker, ReplayWorker):
+            self._acquisition_worker.batch_processed()
+
+    @Slot(bool)
+    def on_connection_changed(self, connected: bool) -> None:
+        if connected != self.connected:
+            logging.info(f"Connection to Raspberry Pi Pico {self.name} {'established' if connected else 'lost'}")
+        self.connected = connected
+
+    @Slot(Alarm)
+    def on_alarm_raised(self, alarm: Alarm) -> None:
+        self.alarm_raised.emit(self.name, alarm)
+
+    @Slot(Alarm)
+    def on_alarm_cleared(self, alarm: Alarm) -> None:
+        self.alarm_cleared.emit(self.name, alarm)
+
+    @Slot(int, "qint64")
+    def on_command_acknowledged(self, command_id: int, latency: int) -> None:
+        self.command_acknowledged.emit(self.name, command_id, latency)
+
+    @Slot(int, str)
+    def on_command_failed(self, command_id: int, error: str) -> None:
+        self.command_failed.emit(self.name, command_id, error)
+
+    def _record_reconnect(self, first_sample_ns: int) -> None:
+        latency = time.monotonic_ns() - self._reconnect_detected_ns
+        pipeline_metrics.record("reconnect_latency", latency)
+        pipeline_metrics.count("reconnects")
+        self._reconnect_detected_ns = None
+        if self._last_sample_ns is None:
+            logging.info(f"Reconnected to Raspberry Pi Pico {self.name} after {latency / 1e6:.0f} ms")
+            return
+        gap = max(first_sample_ns - self._last_sample_ns, 0)
+        pipeline_metrics.record("data_gap", gap)
+        logging.info(f"Reconnected to Raspberry Pi Pico {self.name} after {latency / 1e6:.0f} ms, sensor data is "
+                     f"missing for {gap / 1e9:.1f} s")
@@ -0,0 +1,83 @@
+import os
+import time
+import logging
+from PySide6.QtCore import QObject, Signal, Slot
+from src.controller.usbController import list_pico_devices
+
+# Interval in which the serial ports are polled [s]
+POLL_INTERVAL = 0.25
+
+
+class DeviceWatcher(QObject):
+    """
+    DeviceWatcher polls the serial ports for Raspberry Pi Picos being plugged in or removed (or reset, which looks the
+    same), so that their acquisition can be resumed without restarting the application. Like the reader workers it is
+    supposed to be moved to a dedicated QThread, since enumerating the ports may block for a while on some platforms.
+    All devices which are present when the watcher is started are reported as added with the first poll.
+    """
+
+    # Signals
+    # Serial port and USB serial number ("" if unknown) of the device, and the monotonic time [ns] it was detected at
+    device_added = Signal(str, str, "qint64")
+    device_removed = Signal(str, str, "qint64")
+    finished = Signal()
+
+    _ports = list
+    _devices = dict
+    _running = False
+
+    def __init__(self, ports: list[str] = None):
+        """
+        :param ports: Serial ports which are watched (e.g. pseudo-terminals of tools/picoSimulator.py); all Raspberry
+        Pi Picos are watched if not given
+        """
+        logging.debug("Creating new device watcher")
+        super(DeviceWatcher, self).__init__()
+        self._ports = ports
+        self._devices = {}
+
+    @Slot()
+    def run(self) -> None:
+        """
+        Poll loop of the watcher, which runs until stop() is called.
+
+        :return: None
+        """
+        logging.debug("Starting to watch serial ports")
+        self._running = True
+        devices = self._scan()
+        if len(devices) == 0:
+            logging.info("Waiting for Raspberry Pi Pico to be connected")
+        while self._running:
+            now = time.monotonic_ns()
+            for port in devices.keys() - self._devices.keys():
+                logging.info(f"Raspberry Pi Pico appeared at {port}")
+                self.device_added.emit(port, devices[port], now)
+            for port in self._devices.keys() - devices.keys():
+                logging.info(f"Raspberry Pi Pico disappeared from {port}")
+                self.device_removed.emit(port, self._devices[port], now)
+            self._devices = devices
+            time.sleep(POLL_INTERVAL)
+            devices = self._scan()
+
+        logging.debug("Stopped watching serial ports")
+        self.finished.emit()
+
+    def stop(self) -> None:
+        """
+        Stop the poll loop after the current poll. This method is meant to be called from another thread.
+
+        :return: None
+        """
+        self._running = False
+
+    def _scan(self) -> dict[str, str]:
+        """
+        :return: USB serial numbers ("" if unknown) by the serial ports of all present devices
+        """
+        if self._ports is None:
+            return list_pico_devices()
+        # Explicitly given ports may not be USB devices (e.g. pseudo-terminals), so they are present as long as they
+        # exist
+        devices = list_pico_devices()
+        return {port: devices.get(port, "") for port in self._ports if port in devices or os.path.exists(port)}
@@ -0,0 +1,205 @@
+import os
+import time
+import zipfile
+import logging
+import numpy as np
+from typing import Iterator
+from PySide6.QtCore import QObject, Signal, Slot
+from src.model.ringBuffer import MONOTONIC_TO_EPOCH_OFFSET_NS
+from src.model.sessionRecorder import SessionReader
+
+# Export formats: CSV with one row per sample, and a NumPy .npz archive with one int64 timestamp and one float64 value
+# array per channel (columnar, compressed, loadable with numpy.load())
+EXPORT_FORMATS = ("csv", "npz")
+# In-memory samples are exported in blocks of this many samples, recorded sessions chunk by chunk as recorded
+EXPORT_BLOCK_SIZE = 65536
+# Header of CSV exports; timestamps are UNIX epoch timestamps [s]
+CSV_HEADER = "epoch_time,channel,value\n"
+# Minimum interval between two progress reports, so that exporting many small chunks doesn't flood the GUI [ns]
+PROGRESS_INTERVAL_NS = 100_000_000
+
+
+class ExportWorker(QObject):
+    """
+    ExportWorker streams the samples of a recorded session file (see SessionRecorder) or a snapshot of a device
+    session's model to a CSV file or a .npz archive. Like the reader workers it is supposed to be moved to a
+    dedicated QThread. The session file is memory-mapped and written chunk by chunk, so exporting a session of several
+    hours neither blocks the GUI nor loads the session into memory. Samples can be filtered by channel and time range.
+
+    The samples are exported in the order of the session's chunks, i.e. grouped by channel within each flush of the
+    recorder. The .npz archive contains the arrays "<channel>.timestamps" (UNIX epoch timestamps [ns]) and
+    "<channel>.values" of every exported channel.
+    """
+
+    # Signals
+    # Number of exported samples and number of samples to be exported
+    progress = Signal("qint64", "qint64")
+    # Description of the error if the export failed
+    failed = Signal(str)
+    finished = Signal()
+
+    _target_filepath = str
+    _export_format = str
+    _session_filepath = str
+    # Snapshot of in-memory samples: tuples of (values, monotonic timestamps [ns]) by channel name
+    _samples = dict
+    _channels = list
+    # Time range of the exported samples as UNIX epoch timestamps [ns]
+    _time_range = tuple
+    # Offset for converting the timestamps of the source into UNIX epoch timestamps [ns]
+    _epoch_offset = int
+    _last_progress_ns = 0
+    _running = False
+
+    def __init__(self, target_filepath: str, export_format: str, channels: list[str], session_filepath: str = None,
+                 samples: dict[str, tuple[np.ndarray, np.ndarray]] = None, time_range: tuple[int, int] = None):
+        """
+        :param target_filepath: Path of the exported file
+        :param export_format: Format of the exported file (see EXPORT_FORMATS)
+        :param channels: Names of the exported channels
+        :param session_filepath: Path of the exported session file
+        :param samples: Snapshot of the exported in-memory samples, if no session file is given: tuples of (values,
+        monotonic timestamps [ns]) by channel name
+        :param time_range: Tuple of (start, end) UNIX epoch timestamps [ns] of the exported samples; all samples if not
+        given
+        """
+        logging.debug(f"Creating new export worker for {target_filepath}")
+        super(ExportWorker, self).__init__()
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Export format must be one of {EXPORT_FORMATS}, got {export_format!r}")
+        self._target_filepath = target_filepath
+        self._export_format = export_format
+        self._channels = channels
+        self._session_filepath = session_filepath
+        self._samples = samples
+        self._time_range = time_range
+        self._epoch_offset = MONOTONIC_TO_EPOCH_OFFSET_NS
+
+    @Slot()
+    def run(self) -> None:
+        """
+        Export the samples until all are written or stop() is called.
+
+        :return: None
+        """
+        source = self._session_filepath or "in-memory samples"
+        logging.info(f"Exporting {source} to {self._target_filepath}")
+        self._running = True
+        reader = None
+        try:
+            if self._session_filepath is not None:
+                reader = SessionReader(self._session_filepath)
+                self._epoch_offset = reader.epoch_offset_ns
+            counts = self._count_samples(reader)
+            if self._export_format == "csv":
+                self._export_csv(reader, sum(counts.values()))
+            else:
+                self._export_npz(reader, counts)
+            if not self._running:
+                # A partially written archive is corrupt, so cancelled exports are removed
+                os.remove(self._target_filepath)
+                logging.info(f"Cancelled exporting {source} to {self._target_filepath}")
+            else:
+                logging.info(f"Finished exporting {source} to {self._target_filepath}")
+        except (OSError, ValueError) as error:
+            logging.error(f"Could not export {source} to {self._target_filepath}: {error}")
+            self.failed.emit(str(error))
+        finally:
+            if reader is not None:
+                reader.close()
+        self.finished.emit()
+
+    def stop(self) -> None:
+        """
+        Cancel the export after the current block and remove the partially exported file. This method is meant to be
+        called from another thread.
+
+        :return: None
+        """
+        self._running = False
+
+    def _count_samples(self, reader: SessionReader | None) -> dict[str, int]:
+        """
+        Count the samples to be exported in advance, which is cheap compared to writing them (only the timestamps of
+        the blocks are searched for the time range) and is needed for the progress and the array headers of .npz
+        archives.
+
+        :param reader: Reader of the exported session file; None to export the in-memory samples
+        :return: Number of samples to be exported by channel name
+        """
+        counts = {}
+        for channel, timestamps, _ in self._iter_blocks(reader):
+            counts[channel] = counts.get(channel, 0) + len(timestamps)
+        return counts
+
+    def _export_csv(self, reader: SessionReader | None, total: int) -> None:
+        exported = 0
+        with open(self._target_filepath, mode="w", encoding="utf8", newline="") as csv_file:
+            csv_file.write(CSV_HEADER)
+            for channel, timestamps, values in self._iter_blocks(reader):
+                if not self._running:
+                    break
+                # The channel name is part of the row format, so that every row is formatted by one format operation
+                np.savetxt(csv_file, np.column_stack(((timestamps + self._epoch_offset) * 1e-9, values)),
+                           fmt=f"%.6f,{channel.replace('%', '%%')},%.10g")
+                exported += len(timestamps)
+                self._report_progress(exported, total)
+        self.progress.emit(exported, total)
+
+    def _export_npz(self, reader: SessionReader | None, counts: dict[str, int]) -> None:
+        # Progress counts the written timestamps and values
+        total = 2 * sum(counts.values())
+        exported = 0
+        with zipfile.ZipFile(self._target_filepath, mode="w", compression=zipfile.ZIP_DEFLATED,
+                             allowZip64=True) as archive:
+            # Every array is written as one .npy member, whose header needs the number of samples in advance. Zip
+            # members can't be written concurrently, so the samples are read once per array.
+            for channel, count in counts.items():
+                for array, dtype in (("timestamps", "<i8"), ("values", "<f8")):
+                    with archive.open(f"{channel}.{array}.npy", mode="w", force_zip64=True) as member:
+                        np.lib.format.write_array_header_1_0(member, {"descr": dtype, "fortran_order": False,
+                                                                      "shape": (count,)})
+                        for _, timestamps, values in self._iter_blocks(reader, [channel]):
+                            if not self._running:
+                                return
+                            if array == "timestamps":
+                                member.write((timestamps + self._epoch_offset).astype(dtype).tobytes())
+                            else:
+                                member.write(values.astype(dtype).tobytes())
+                            exported += len(values)
+                            self._report_progress(exported, total)
+        self.progress.emit(exported, total)
+
+    def _report_progress(self, exported: int, total: int) -> None:
+        now = time.monotonic_ns()
+        if now - self._last_progress_ns >= PROGRESS_INTERVAL_NS:
+            self._last_progress_ns = now
+            self.progress.emit(exported, total)
+
+    def _iter_blocks(self, reader: SessionReader | None,
+                     channels: list[str] = None) -> Iterator[tuple[str, np.ndarray, np.ndarray]]:
+        """
+        Iterate over the samples to be exported in blocks.
+
+        :param reader: Reader of the exported session file; None to export the in-memory samples
+        :param channels: Names of the iterated channels; all exported channels if not given
+        :return: Iterator of tuples (channel name, timestamps of the source [ns], values), without empty blocks; the
+        timestamps are converted into UNIX epoch timestamps by adding _epoch_offset
+        """
+        channels = self._channels if channels is None else channels
+        if reader is not None:
+            blocks = reader.iter_chunks(channels)
+        else:
+            blocks = ((channel, timestamps[start:start + EXPORT_BLOCK_SIZE], values[start:start + EXPORT_BLOCK_SIZE])
+                      for channel, (values, timestamps) in self._samples.items() if channel in channels
+                      for start in range(0, len(values), EXPORT_BLOCK_SIZE))
+        # The time range is converted once instead of converting the timestamps of every block
+        time_range = None if self._time_range is None else np.array(self._time_range) - self._epoch_offset
+
+        for channel, timestamps, values in blocks:
+            if time_range is not None:
+                # Timestamps within a block are ascending
+                start, end = np.searchsorted(timestamps, time_range)
+                timestamps, values = timestamps[start:end], values[start:end]
+            if len(timestamps) > 0:
+                yield channel, timestamps, values
@@ -0,0 +1,104 @@
+import sys
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = "[{asctime},{msecs:3f}] {levelname} ({module}): {message}"
+DATE_FORMAT = "%d.%m.%Y %H:%M:%S"
+# Size at which the log file is rotated [bytes] and number of rotated log files which are kept
+MAX_LOG_FILE_SIZE = 5 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 3
+# Each call site may log RATE_LIMIT_BURST records of level WARNING and above per RATE_LIMIT_INTERVAL [s]
+RATE_LIMIT_BURST = 10
+RATE_LIMIT_INTERVAL = 10.0
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Limits the number of records of level WARNING and above per call site (source file and line), e.g. to keep
+    repeated serial warnings during a disconnect storm from flooding the disk. The number of suppressed records is
+    appended to the first record which passes after the suppression.
+    """
+
+    def __init__(self, burst: int = RATE_LIMIT_BURST, interval: float = RATE_LIMIT_INTERVAL):
+        """
+        :param burst: Number of records per call site and interval
+        :param interval: Interval [s]
+        """
+        super(RateLimitFilter, self).__init__()
+        self._burst = burst
+        self._interval = interval
+        # Call site -> [start of the current interval, records in the interval, suppressed records]; records are
+        # filtered in the threads which log them, so the state is only updated under the lock
+        self._call_sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+
+        now = time.monotonic()
+        with self._lock:
+            state = self._call_sites.setdefault((record.pathname, record.lineno), [now, 0, 0])
+            if now - state[0] >= self._interval:
+                state[0] = now
+                state[1] = 0
+            if state[1] >= self._burst:
+                state[2] += 1
+                return False
+
+            state[1] += 1
+            suppressed = state[2]
+            state[2] = 0
+        if suppressed > 0:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+class _BackgroundQueueHandler(QueueHandler):
+    """
+    QueueHandler which only merges the message with its arguments in the logging thread. Formatting the complete
+    record (timestamp etc.) and writing it is left to the QueueListener's background thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(log_path: str, debug: bool = False) -> QueueListener:
+    """
+    Configure the root logger to hand all records to a queue, which is written to stdout and a size-rotated log file
+    by a background thread. That way logging never blocks the GUI or the acquisition on console or disk I/O.
+
+    :param log_path: Path of the log file
+    :param debug: Whether DEBUG records are logged
+    :return: Listener which writes the queued records; stopped automatically at exit
+    """
+    formatter = logging.Formatter(fmt=LOG_FORMAT, datefmt=DATE_FORMAT, style="{")
+    console_handler = logging.StreamHandler(sys.stdout)
+    file_handler = RotatingFileHandler(filename=log_path, maxBytes=MAX_LOG_FILE_SIZE,
+                                       backupCount=LOG_FILE_BACKUP_COUNT, encoding="utf8")
+    for handler in (console_handler, file_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _BackgroundQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+    listener = QueueListener(log_queue, console_handler, file_handler)
+
+    logger = logging.getLogger()
+    logger.handlers = [queue_handler]
+    logger.setLevel(logging.DEBUG if debug else logging.INFO)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
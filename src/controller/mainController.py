@@ -1,126 +1,507 @@
+import os
+import time
 import logging
-from random import randrange, uniform
+import numpy as np
+from random import uniform
+from serial.serialutil import SerialException
+from PySide6.QtCore import QObject, QThread, QTimer, Slot
 from src.view.mainView import RespiratorMainWindow
 from src.view.presetsView import PresetsViewWindow
-from src.model.sensorDataModel import SensorDataModel
+from src.view.exportView import ExportViewWindow
+from src.model.metricsModel import pipeline_metrics
+from src.model.channelRegistry import load_channel_registry
+from src.model.sessionRecorder import read_channel_names
 from src.controller.usbController import PicoUSBController
+from src.controller.deviceSession import DeviceSession
+from src.controller.deviceWatcher import DeviceWatcher
+from src.controller.alarmEngine import Alarm
+from src.controller.exportWorker import ExportWorker
 
+# Directory in which every session is recorded
+sessions_dirpath = "assets/sessions"
+# Interval in which the pipeline metrics in the status bar are updated [ms]
+STATUS_UPDATE_INTERVAL = 1000
+# A Raspberry Pi Pico may not be ready to be opened as soon as its port appears, so opening it is retried in this
+# interval [ms] up to MAX_OPEN_ATTEMPTS times
+OPEN_RETRY_INTERVAL = 100
+MAX_OPEN_ATTEMPTS = 20
+# TODO add translations
+# Descriptions of the alarm kinds (see AlarmEngine)
+alarm_kind_descriptions = {
+    "min": "unter Minimum",
+    "max": "über Maximum",
+    "rate": "ändert sich zu schnell",
+    "no_data": "keine Messwerte",
+    "disconnected": "Verbindung verloren",
+}
 
-class MainController:
+
+class MainController(QObject):
     """
-    MainController handles the logic between model and view components. The model and view components as well as the
-    USBController are instantiated when the MainController is instantiated.
+    MainController handles the logic between model and view components. The views are instantiated when the
+    MainController is instantiated. Every data source (each connected Raspberry Pi Pico, a replayed file or the demo
+    data) gets its own DeviceSession with its own model, reader thread and instrument panel when the acquisition is
+    started. During a live acquisition a DeviceWatcher reports Raspberry Pi Picos being plugged in or removed, so that
+    new Picos get their own session and reappearing Picos resume their previous one.
     """
 
     # MVC components
-    _sensor_model = SensorDataModel
     _main_view = RespiratorMainWindow
     _presets_view = PresetsViewWindow
-    _usb_controller = PicoUSBController
-
-    _pico_connected = False
+    _export_view = ExportViewWindow
+    # Sensor channels of the channel registry
+    _channels = list
+    # Descriptions of the active alarms by (session name, channel name, alarm kind)
+    _active_alarms = dict
+    # Names of the presets which were sent and not acknowledged yet by (session name, command ID)
+    _preset_commands = dict
+    # Sessions of all data sources
+    _device_sessions = list
+    _record_sessions = bool
+    _status_timer = QTimer
+    # Hot-plug detection of Raspberry Pi Picos in a dedicated thread
+    _watcher_thread = QThread
+    _device_watcher = DeviceWatcher
+    _binary_protocol = False
+    # Export of a session in a dedicated thread
+    _export_thread = QThread
+    _export_worker = ExportWorker
 
-    def __init__(self):
+    def __init__(self, record_session: bool = True):
+        """
+        :param record_session: Whether all sensor data of the session is recorded to a file in sessions_dirpath
+        """
         logging.debug("Creating new MVC main controller")
+        super(MainController, self).__init__()
 
-        # Models
-        self._sensor_model = SensorDataModel()
-        # Views
+        self._channels = load_channel_registry()
+        self._device_sessions = []
+        self._active_alarms = {}
+        self._preset_commands = {}
+        self._record_sessions = record_session
+        self._watcher_thread = None
+        self._export_thread = None
+        # Views; the presets and export windows are only built when they are opened for the first time, so that they
+        # don't delay the main window (the presets window loads the whole presets library)
         self._main_view = RespiratorMainWindow()
-        self._presets_view = PresetsViewWindow()
-        # Additional controllers
-        self._usb_controller = PicoUSBController()
+        self._presets_view = None
+        self._export_view = None
 
         self._main_view.show()
 
+        self._status_timer = QTimer(self)
+        self._status_timer.setInterval(STATUS_UPDATE_INTERVAL)
+        self._status_timer.timeout.connect(self._update_status_bar)
+        self._status_timer.start()
+
         # Connect PyQt Signals to Slots
-        self._connect_instrument_signals()
         self._connect_menu_actions()
-        self._connect_presets_view_actions()
 
-    """
-    Methods for connecting PyQt signals and slots
-    """
-
-    def _connect_instrument_signals(self) -> None:
-        logging.debug("Connecting PyQt signals to slots for instrument widgets")
-        # Connect "modified data" signals to corresponding numerical instruments
-        self._sensor_model.modified_animal_temp_data.connect(self._main_view.animal_temp_instrument.on_modified_data)
-        self._sensor_model.modified_animal_temp_data.connect(self._main_view.animal_temp_graph.on_modified_data)
-
-        self._sensor_model.modified_heatbed_temp_data.connect(self._main_view.heatbed_temp_instrument.on_modified_data)
-        self._sensor_model.modified_heatbed_temp_data.connect(self._main_view.heatbed_temp_graph.on_modified_data)
+    @property
+    def main_view(self) -> RespiratorMainWindow:
+        """
+        :return: Main window with the instrument panels of the device sessions
+        """
+        return self._main_view
 
-        self._sensor_model.modified_air_temp_data.connect(self._main_view.air_temp_instrument.on_modified_data)
-        self._sensor_model.modified_air_temp_data.connect(self._main_view.air_temp_graph.on_modified_data)
+    def shutdown(self) -> None:
+        """
+        Stop the acquisition and close the session recordings, e.g. when the application is about to quit.
 
-        self._sensor_model.modified_air_pressure_data.connect(self._main_view.pressure_inspiration_instrument.on_modified_data)
-        self._sensor_model.modified_air_pressure_data.connect(self._main_view.pressure_inspiration_graph.on_modified_data)
+        :return: None
+        """
+        if self._watcher_thread is not None and self._watcher_thread.isRunning():
+            self._device_watcher.stop()
+            self._watcher_thread.quit()
+            self._watcher_thread.wait()
+        if self._export_thread is not None and self._export_thread.isRunning():
+            self._export_worker.stop()
+            self._export_thread.quit()
+            self._export_thread.wait()
+        for session in self._device_sessions:
+            session.close()
 
-        self._sensor_model.modified_eTVOC_data.connect(self._main_view.eTVOC_instrument.on_modified_data)
-        self._sensor_model.modified_eTVOC_data.connect(self._main_view.eTVOC_graph.on_modified_data)
+    def add_device_session(self, name: str, record_session: bool | None = None) -> DeviceSession:
+        """
+        Create the session of a data source and its instrument panel.
 
-        self._sensor_model.modified_eCO2_data.connect(self._main_view.eCO2_instrument.on_modified_data)
-        self._sensor_model.modified_eCO2_data.connect(self._main_view.eCO2_graph.on_modified_data)
+        :param name: Name of the data source, e.g. the serial port of the Raspberry Pi Pico
+        :param record_session: Whether the sensor data is recorded; as configured for the controller if not given
+        :return: Device session
+        """
+        if record_session is None:
+            record_session = self._record_sessions
+        panel = self._main_view.add_instrument_panel(os.path.basename(name), self._channels)
+        session = DeviceSession(name, self._channels, panel, sessions_dirpath if record_session else None)
+        session.alarm_raised.connect(self.on_alarm_raised)
+        session.alarm_cleared.connect(self.on_alarm_cleared)
+        session.command_acknowledged.connect(self.on_command_acknowledged)
+        session.command_failed.connect(self.on_command_failed)
+        self._device_sessions.append(session)
+        return session
 
-        self._sensor_model.modified_relative_humidity_data.connect(self._main_view.relative_humidity_instrument.on_modified_data)
-        self._sensor_model.modified_relative_humidity_data.connect(self._main_view.relative_humidity_graph.on_modified_data)
+    """
+    Methods for connecting PyQt signals and slots
+    """
 
     def _connect_menu_actions(self) -> None:
         logging.debug("Connecting PyQt signals to slots for menu actions")
-        self._main_view.open_presets_action.triggered.connect(self._presets_view.show)
+        self._main_view.open_presets_action.triggered.connect(self.open_presets_view)
+        self._main_view.open_export_action.triggered.connect(self.open_export_view)
+        self._main_view.dump_metrics_action.triggered.connect(pipeline_metrics.dump)
 
     def _connect_presets_view_actions(self) -> None:
         logging.debug("Connecting PyQt signals to slots for presets view actions")
         self._presets_view.send_preset_button.clicked.connect(self.send_preset_to_pico)
+        self._presets_view.apply_preset_button.clicked.connect(self.apply_preset)
+        self._presets_view.add_preset_button.clicked.connect(self.create_preset)
 
         # Connect signal which gets emitted when a presets table row is selected
         self._presets_view.presets_table.selectionModel().selectionChanged.connect(self._presets_view.presets_table.get_table_row_data)
 
+    def _connect_export_view_actions(self) -> None:
+        logging.debug("Connecting PyQt signals to slots for export view actions")
+        self._export_view.session_file_selected.connect(self.on_export_session_file_selected)
+        self._export_view.current_session_button.toggled.connect(self.on_export_source_changed)
+        self._export_view.export_button.clicked.connect(self.start_export)
+        self._export_view.cancel_button.clicked.connect(self.cancel_export)
+
     """
     Methods for managing data and communication with Raspberry Pi Pico
     """
 
+    @Slot()
+    def open_presets_view(self) -> None:
+        if self._presets_view is None:
+            self._presets_view = PresetsViewWindow()
+            self._connect_presets_view_actions()
+        self._presets_view.show()
+        self._presets_view.raise_()
+
     def send_preset_to_pico(self) -> bool:
         """
-        Send selected preset to Raspberry Pi Pico when "Send presets" button in the PresetsView is clicked.
+        Send selected preset to Raspberry Pi Pico when "Send presets" button in the PresetsView is clicked. The preset
+        is sent as a command by the session's command thread, and its acknowledgement by the Pico is reported by
+        on_command_acknowledged() or on_command_failed().
 
-        :return: Success of sending the selected preset to the Raspberry Pi Pico.
+        :return: Success of queueing the selected preset to be sent to the Raspberry Pi Pico.
         """
         data = self._presets_view.presets_table.get_table_row_data()
+        if len(data) == 0:
+            logging.error("Could not send preset: No preset selected")
+            self._presets_view.show_command_status("Keine Voreinstellung ausgewählt")
+            return False
         data_str = ""
         for key in data:
             data_str += data[key] + "\\ "
-        # TODO add some char sequence to beginning of the data for check in Pico, if necessary
         data_bytes = data_str.encode()
-        success = self._usb_controller.write_to_pico(data_bytes)
-        # TODO check for ACK signal (some char sequence) to confirm that Pico indeed successfully got the data
-        return success
+        # The preset is sent to the device whose instrument panel is selected; its alarm limits and targets are only
+        # applied with the separate apply button (see apply_preset())
+        session = self._current_device_session()
+        command_id = None if session is None else session.send_command(data_bytes)
+        if command_id is None:
+            logging.error("Could not send preset: Not connected to Raspberry Pi Pico")
+            self._presets_view.show_command_status("Nicht mit Beatmungsgerät verbunden")
+            return False
+        self._preset_commands[(session.name, command_id)] = self._presets_view.selected_preset_name()
+        self._presets_view.show_command_status("Voreinstellung wird gesendet...")
+        return True
 
-    def read_sensor_data(self) -> None:
+    @Slot(str, int, "qint64")
+    def on_command_acknowledged(self, session_name: str, command_id: int, latency: int) -> None:
         """
-        Read the sensor data from the Raspberry Pi Pico. Receiving data serves as a "health check" for the connection to
-        the Raspberry Pi Pico.
+        :param session_name: Name of the session
+        :param command_id: ID of the acknowledged command
+        :param latency: Round-trip latency of the command [ns]
+        :return: None
+        """
+        preset = self._preset_commands.pop((session_name, command_id), None)
+        if preset is not None:
+            self._presets_view.show_command_status(f"Voreinstellung {preset} von {os.path.basename(session_name)} "
+                                                   f"bestätigt ({latency / 1e6:.0f} ms)")
+
+    @Slot(str, int, str)
+    def on_command_failed(self, session_name: str, command_id: int, error: str) -> None:
+        preset = self._preset_commands.pop((session_name, command_id), None)
+        if preset is not None:
+            self._presets_view.show_command_status(f"Voreinstellung {preset} wurde von "
+                                                   f"{os.path.basename(session_name)} nicht bestätigt")
+
+    def apply_preset(self) -> bool:
+        """
+        Set the pressure alarm limits of the device whose instrument panel is selected to the pressure range of the
+        selected preset, and compare its analyzed breaths with the preset's frequency and I/E ratio.
+
+        :return: Success of applying the selected preset
+        """
+        data = self._presets_view.presets_table.get_table_row_data()
+        if len(data) == 0:
+            logging.error("Could not apply preset: No preset selected")
+            self._presets_view.show_command_status("Keine Voreinstellung ausgewählt")
+            return False
+        session = self._current_device_session()
+        if session is None:
+            logging.error("Could not apply preset: No device session")
+            return False
+        try:
+            limits = session.set_pressure_limits(float(data["pressure_min"]), float(data["pressure_max"]))
+            # The frequencies of the presets are breaths per minute (e.g. 150 for a mouse)
+            session.set_breath_targets(float(data["frequency"]), float(data["i_to_e_ratio"]))
+        except (KeyError, ValueError) as error:
+            logging.error(f"Could not apply preset: {error}")
+            return False
+        # TODO add translations
+        preset = self._presets_view.selected_preset_name()
+        device = os.path.basename(session.name)
+        if limits is None:
+            self._presets_view.show_command_status(f"Voreinstellung {preset}: Minimaler Druck muss kleiner als "
+                                                   f"maximaler Druck sein, Alarmgrenzen von {device} nicht geändert")
+            return False
+        self._presets_view.show_command_status(f"Voreinstellung {preset}: Druck-Alarmgrenzen von {device} "
+                                               f"{limits[0]:.1f} - {limits[1]:.1f} psi übernommen")
+        return True
+
+    def create_preset(self) -> bool:
+        """
+        Create a new preset with the DEFAULT values when the "Create preset" button in the PresetsView is clicked. Its
+        values are edited in the presets table.
+
+        :return: Success of creating the preset
+        """
+        name = self._presets_view.ask_preset_name()
+        if name is None:
+            return False
+        return self._presets_view.presets_table.add_preset(name)
+
+    def start_acquisition(self, binary_protocol: bool = False, ports: list[str] = None) -> None:
+        """
+        Watch for Raspberry Pi Picos in a dedicated thread and read the sensor data of each of them in a dedicated
+        reader thread as soon as it's connected, so that serial reads do not block the GUI or each other. Picos which
+        are already connected are reported by the first poll of the watcher, so scanning the serial ports never
+        delays the GUI.
 
+        :param binary_protocol: Whether the Picos send binary frames instead of text lines (see picoProtocol)
+        :param ports: Serial ports of the Raspberry Pi Picos; all Picos are searched automatically if not given
         :return: None
         """
-        connected = False
-        read_data = self._usb_controller.read_from_pico().decode("utf8")
+        self._binary_protocol = binary_protocol
+        logging.debug("Starting device watcher thread")
+        self._watcher_thread = QThread()
+        self._device_watcher = DeviceWatcher(ports or None)
+        self._device_watcher.moveToThread(self._watcher_thread)
+        self._watcher_thread.started.connect(self._device_watcher.run)
+        self._device_watcher.finished.connect(self._watcher_thread.quit)
+        self._device_watcher.device_added.connect(self.on_device_added)
+        self._device_watcher.device_removed.connect(self.on_device_removed)
+        self._watcher_thread.start()
 
-        if read_data != "":
-            connected = True
-            # The sensor data comes as one string of values which are separated by a "/".
-            # IMPORTANT NOTE: Order of the received data and the value separator is as in the Raspberry Pi Pico
-            # respirator implementation.
-            read_data = read_data.split("/")
+    @Slot(str, str, "qint64")
+    def on_device_added(self, port: str, serial_number: str, detected_ns: int, attempt: int = 1) -> None:
+        """
+        Open a Raspberry Pi Pico which appeared, and resume its session if it was connected before (identified by its
+        USB serial number, or its port if the serial number is unknown) or start a new one.
 
-            self._sensor_model.air_temp_data = float(read_data[0])
-            self._sensor_model.relative_humidity_data = float(read_data[1])
-            self._sensor_model.eCO2_data = float(read_data[2])
-            self._sensor_model.air_pressure_data = float(read_data[3])
-            self._sensor_model.eTVOC_data = float(read_data[4])
+        :param port: Serial port of the Raspberry Pi Pico
+        :param serial_number: USB serial number of the Raspberry Pi Pico ("" if unknown)
+        :param detected_ns: Monotonic time [ns] at which the Pico appeared
+        :param attempt: Number of the attempt to open the Pico
+        :return: None
+        """
+        session = self._find_device_session(port, serial_number)
+        if session is not None and session.is_acquiring and session.connected:
+            return
+        try:
+            usb_controller = PicoUSBController(port)
+        except SerialException as error:
+            if attempt < MAX_OPEN_ATTEMPTS:
+                QTimer.singleShot(OPEN_RETRY_INTERVAL,
+                                  lambda: self.on_device_added(port, serial_number, detected_ns, attempt + 1))
+            else:
+                logging.error(f"Could not connect to Raspberry Pi Pico at {port}: {error}")
+            return
 
-        self._pico_connected = connected
+        if session is None:
+            self.add_device_session(port).start_acquisition(usb_controller, self._binary_protocol, serial_number)
+        else:
+            session.reconnect(usb_controller, detected_ns)
+
+    @Slot(str, str, "qint64")
+    def on_device_removed(self, port: str, serial_number: str, detected_ns: int) -> None:
+        """
+        Stop reading from a Raspberry Pi Pico which disappeared. Its session is kept until it reappears.
+
+        :param port: Serial port of the Raspberry Pi Pico
+        :param serial_number: USB serial number of the Raspberry Pi Pico ("" if unknown)
+        :param detected_ns: Monotonic time [ns] at which the Pico disappeared
+        :return: None
+        """
+        session = self._find_device_session(port, serial_number)
+        if session is not None and session.usb_controller.port == port:
+            session.on_device_removed()
+
+    def _find_device_session(self, port: str, serial_number: str) -> DeviceSession | None:
+        for session in self._device_sessions:
+            if session.usb_controller is None:
+                # Replayed or demo data
+                continue
+            if serial_number != "" and session.serial_number == serial_number:
+                return session
+            if serial_number == "" and session.serial_number == "" and session.usb_controller.port == port:
+                return session
+        return None
+
+    def start_replay(self, filepath: str, speed: float | None = 1.0, binary_protocol: bool = False) -> None:
+        """
+        Replay a recorded session or a raw serial dump through the same pipeline as the live Raspberry Pi Pico.
+
+        :param filepath: Path of a session file or a raw serial dump
+        :param speed: Replay speed as multiple of the recorded speed; None to replay as fast as possible
+        :param binary_protocol: Whether a raw serial dump contains binary frames instead of text lines
+        :return: None
+        """
+        # Replays of already recorded data are not recorded again
+        self.add_device_session(filepath, record_session=False).start_replay(filepath, speed, binary_protocol)
+
+    def start_demo(self) -> None:
+        """
+        Create the session which displays the random data of write_random_data().
+
+        :return: None
+        """
+        self.add_device_session("Demo")
+
+    def _current_device_session(self) -> DeviceSession | None:
+        panel = self._main_view.current_instrument_panel()
+        for session in self._device_sessions:
+            if session.panel is panel:
+                return session
+        return None
+
+    """
+    Methods for exporting sessions
+    """
+
+    @Slot()
+    def open_export_view(self) -> None:
+        if self._export_view is None:
+            self._export_view = ExportViewWindow()
+            self._connect_export_view_actions()
+        if self._export_view.session_filepath() is None:
+            self.on_export_source_changed(True)
+        self._export_view.show()
+        self._export_view.raise_()
+
+    @Slot(bool)
+    def on_export_source_changed(self, current_session: bool) -> None:
+        """
+        Show the channels of the device session whose instrument panel is selected, if it's the source of the export.
+
+        :param current_session: Whether the current device session is the source of the export
+        :return: None
+        """
+        if current_session:
+            session = self._current_device_session()
+            self._export_view.set_channels([] if session is None else session.sensor_model.channel_names)
+
+    @Slot(str)
+    def on_export_session_file_selected(self, filepath: str) -> None:
+        """
+        Show the channels of a session file which was selected as source of the export. Only the file header is read,
+        the session itself is read by the export worker.
+
+        :param filepath: Path of the session file
+        :return: None
+        """
+        try:
+            channel_names = read_channel_names(filepath)
+        except (OSError, ValueError) as error:
+            logging.error(f"Could not open session file {filepath}: {error}")
+            self._export_view.show_error(str(error))
+            self._export_view.set_channels([])
+            return
+        self._export_view.set_channels(channel_names)
+
+    @Slot()
+    def start_export(self) -> None:
+        """
+        Export the selected session file or the device session whose instrument panel is selected in a dedicated
+        thread. A recorded device session is exported from its recording, which contains all of its samples, otherwise
+        the samples still kept in its model are copied.
+
+        :return: None
+        """
+        if self._export_thread is not None and self._export_thread.isRunning():
+            return
+        session_filepath = self._export_view.session_filepath()
+        samples = None
+        if session_filepath is None:
+            session = self._current_device_session()
+            if session is None:
+                logging.error("Could not export session: No device session")
+                self._export_view.show_error("Keine Sitzung vorhanden")
+                return
+            session_filepath = session.recording_filepath
+            if session_filepath is None:
+                samples = session.sensor_model.snapshot()
+        channels = self._export_view.selected_channels()
+        target_filepath = self._export_view.ask_target_filepath()
+        if target_filepath is None:
+            return
+
+        logging.debug("Starting export thread")
+        self._export_thread = QThread()
+        self._export_worker = ExportWorker(target_filepath, self._export_view.export_format(), channels,
+                                           session_filepath, samples, self._export_view.time_range())
+        self._export_worker.moveToThread(self._export_thread)
+        self._export_thread.started.connect(self._export_worker.run)
+        self._export_worker.finished.connect(self._export_thread.quit)
+        self._export_worker.finished.connect(self.on_export_finished)
+        self._export_worker.progress.connect(self._export_view.show_progress)
+        self._export_worker.failed.connect(self._export_view.show_error)
+        self._export_view.set_exporting(True)
+        self._export_thread.start()
+
+    @Slot()
+    def cancel_export(self) -> None:
+        if self._export_thread is not None and self._export_thread.isRunning():
+            self._export_worker.stop()
+
+    @Slot()
+    def on_export_finished(self) -> None:
+        self._export_view.set_exporting(False)
+
+    @Slot(str, Alarm)
+    def on_alarm_raised(self, session_name: str, alarm: Alarm) -> None:
+        """
+        Show an alarm raised by the alarm engine of a session in the main window.
+
+        :param session_name: Name of the session
+        :param alarm: Raised alarm
+        :return: None
+        """
+        self._active_alarms[(session_name, alarm.channel, alarm.kind)] = self._describe_alarm(session_name, alarm)
+        self._main_view.show_alarms(list(self._active_alarms.values()))
+        pipeline_metrics.record("alarm_latency", max(time.monotonic_ns() - alarm.timestamp, 0))
+        pipeline_metrics.count("alarms")
+
+    @Slot(str, Alarm)
+    def on_alarm_cleared(self, session_name: str, alarm: Alarm) -> None:
+        if self._active_alarms.pop((session_name, alarm.channel, alarm.kind), None) is not None:
+            self._main_view.show_alarms(list(self._active_alarms.values()))
+
+    def _describe_alarm(self, session_name: str, alarm: Alarm) -> str:
+        device = os.path.basename(session_name)
+        description = alarm_kind_descriptions.get(alarm.kind, alarm.kind)
+        channel = next((channel for channel in self._channels if channel.name == alarm.channel), None)
+        if channel is None:
+            return f"{device}: {description}"
+        return f"{device}: {channel.label} {description} ({alarm.value:.1f} {channel.unit})"
+
+    @Slot()
+    def _update_status_bar(self) -> None:
+        sessions = self._device_sessions
+        self._main_view.show_pipeline_metrics(pipeline_metrics.snapshot(),
+                                              sum(session.connected for session in sessions), len(sessions))
 
     def write_random_data(self) -> None:
         """
@@ -129,10 +510,12 @@ class MainController:
 
         :return: None
         """
-        self._sensor_model.air_temp_data = uniform(29, 32)
-        self._sensor_model.air_pressure_data = uniform(25, 30)
-        self._sensor_model.animal_temp_data = randrange(37, 39, 1)
-        self._sensor_model.heatbed_temp_data = randrange(35, 40, 1)
-        self._sensor_model.eTVOC_data = randrange(150, 200, 1)
-        self._sensor_model.eCO2_data = randrange(300, 500, 1)
-        self._sensor_model.relative_humidity_data = randrange(80, 100, 1)
+        for session in self._device_sessions:
+            self._write_random_data(session)
+
+    def _write_random_data(self, session: DeviceSession) -> None:
+        timestamps = np.array([time.monotonic_ns()])
+        session.sensor_model.append_samples({
+            channel.name: (np.array([uniform(channel.demo_min, channel.demo_max)]), timestamps)
+            for channel in self._channels
+        })
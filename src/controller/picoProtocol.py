@@ -0,0 +1,332 @@
+import re
+import logging
+from binascii import crc_hqx
+from typing import NamedTuple
+import numpy as np
+
+# Wire formats of the sensor data sent by the Raspberry Pi Pico.
+#
+# Text format (default, fallback for existing firmware): one line per sample with the sensor values separated by a "/",
+# e.g. "29.5/85.0/400.0/27.1/150.0\n".
+#
+# Binary format (little-endian, 10 + 4 * N bytes per frame, i.e. 30 bytes for the N = 5 values of the current firmware):
+#
+# +-----------+---------+-----------------------------------------------------------+
+# |  Field    |  Type   |  Description                                              |
+# +-----------+---------+-----------------------------------------------------------+
+# | sync      |  uint16 |  Sync word 0x5AA5 (bytes A5 5A)                           |
+# | sequence  |  uint16 |  Frame counter, wraps around at 65535                     |
+# | timestamp |  uint32 |  Device timestamp [us], wraps around after ~71 minutes    |
+# | values    |  N x f4 |  Sensor values in the same order as in the text format   |
+# | crc       |  uint16 |  CRC-16/CCITT-FALSE over all preceding bytes of the frame |
+# +-----------+---------+-----------------------------------------------------------+
+#
+# Commands sent to the Raspberry Pi Pico (e.g. presets) are text lines in both wire formats. Each one is framed with an
+# ID, which the Pico acknowledges once it has applied the command. Acknowledgements are interleaved between the
+# samples (text lines or binary frames). A command may be sent again with the same ID if its acknowledgement was lost,
+# in which case the Pico acknowledges it again without applying it twice. The Pico only remembers the IDs of the last
+# COMMAND_DEDUPE_WINDOW applied commands, older IDs are applied again. The host therefore assigns consecutive IDs per
+# session which continue across reconnects and start at a random ID, so that a new command doesn't reuse the ID of a
+# recent one, e.g. after the GUI was restarted, and is acknowledged without being applied.
+#
+# +----------------+-----------------------+----------------------------------------------------------+
+# |  Direction     |  Format               |  Description                                             |
+# +----------------+-----------------------+----------------------------------------------------------+
+# | host -> Pico   |  "$<id>:<payload>\n"  |  Command with ID 0-65535, the payload has no line break  |
+# | Pico -> host   |  "$ACK:<id>\n"        |  Acknowledgement of the command with the ID              |
+# +----------------+-----------------------+----------------------------------------------------------+
+
+# Number of sensor values which are sent by the Raspberry Pi Pico in one sample by default; the actual number is given
+# by the channels with a wire index in the channel registry (see channelRegistry)
+SENSOR_VALUE_COUNT = 5
+# Separator of the sensor values in the text format, as in the Raspberry Pi Pico respirator implementation
+SENSOR_VALUE_SEPARATOR = b"/"
+# Lines longer than this without a line break are considered garbage [bytes]
+MAX_LINE_LENGTH = 1024
+
+SYNC_WORD = 0x5AA5
+SYNC_BYTES = SYNC_WORD.to_bytes(2, "little")
+# Initial value of the CRC-16/CCITT-FALSE checksum
+CRC_INIT = 0xFFFF
+
+# Command IDs wrap around at this value
+COMMAND_ID_LIMIT = 0x10000
+# Number of the most recently applied command IDs which the Pico acknowledges again without applying the command
+COMMAND_DEDUPE_WINDOW = 16
+ACK_PATTERN = re.compile(rb"\$ACK:(\d{1,5})\r?\n")
+# Beginning of an acknowledgement which is continued by the next read
+INCOMPLETE_ACK_PATTERN = re.compile(rb"\$(?:A(?:C(?:K(?::\d{0,5}\r?)?)?)?)?\Z")
+MAX_ACK_LENGTH = len(b"$ACK:65535\r\n")
+
+
+def frame_dtype(value_count: int) -> np.dtype:
+    """
+    :param value_count: Number of sensor values per frame
+    :return: NumPy dtype of a binary frame
+    """
+    return np.dtype([
+        ("sync", "<u2"),
+        ("sequence", "<u2"),
+        ("timestamp", "<u4"),
+        ("values", "<f4", (value_count,)),
+        ("crc", "<u2"),
+    ])
+
+
+FRAME_DTYPE = frame_dtype(SENSOR_VALUE_COUNT)
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+
+class DecodedFrames(NamedTuple):
+    """
+    Sensor samples decoded from the data received from the Raspberry Pi Pico.
+    """
+    # Sensor values with shape (number of samples, number of values per sample)
+    values: np.ndarray
+    # Device timestamps [us] of the samples; None if the wire format doesn't carry timestamps
+    device_timestamps: np.ndarray | None
+
+
+def parse_sensor_line(line: bytes, value_count: int = SENSOR_VALUE_COUNT) -> list[float] | None:
+    """
+    Parse one line of sensor data in the text format.
+
+    :param line: Raw line read from the Raspberry Pi Pico
+    :param value_count: Number of sensor values per sample
+    :return: Sensor values in the order as they were sent; None if the line is malformed
+    """
+    values = line.strip().split(SENSOR_VALUE_SEPARATOR)
+    if len(values) < value_count:
+        return None
+    try:
+        return [float(value) for value in values[:value_count]]
+    except ValueError:
+        return None
+
+
+def encode_frames(sequence: np.ndarray, timestamps: np.ndarray, values: np.ndarray) -> bytes:
+    """
+    Encode samples in the binary format (e.g. for simulating the Raspberry Pi Pico or for benchmarks).
+
+    :param sequence: Frame counters
+    :param timestamps: Device timestamps [us]
+    :param values: Sensor values with shape (number of samples, number of values per sample)
+    :return: Binary frames including sync words and CRCs
+    """
+    dtype = frame_dtype(np.shape(values)[1])
+    frames = np.zeros(len(values), dtype=dtype)
+    frames["sync"] = SYNC_WORD
+    frames["sequence"] = np.asarray(sequence) & 0xFFFF
+    frames["timestamp"] = np.asarray(timestamps) & 0xFFFFFFFF
+    frames["values"] = values
+    data = frames.tobytes()
+    frames["crc"] = [crc_hqx(data[offset:offset + dtype.itemsize - 2], CRC_INIT)
+                     for offset in range(0, len(data), dtype.itemsize)]
+    return frames.tobytes()
+
+
+def encode_command(command_id: int, payload: bytes) -> bytes:
+    """
+    Frame a command to be sent to the Raspberry Pi Pico.
+
+    :param command_id: Command ID (0 - 65535)
+    :param payload: Command data without line breaks
+    :return: Framed command
+    """
+    if b"\n" in payload:
+        raise ValueError("Command payload must not contain line breaks")
+    return b"$%d:%s\n" % (command_id, payload)
+
+
+def encode_ack(command_id: int) -> bytes:
+    """
+    :param command_id: ID of the acknowledged command (e.g. for simulating the Raspberry Pi Pico)
+    :return: Acknowledgement as sent by the Raspberry Pi Pico
+    """
+    return b"$ACK:%d\n" % command_id
+
+
+class AckExtractor:
+    """
+    Extracts the acknowledgements of commands from the data received from the Raspberry Pi Pico before it's decoded,
+    so that they aren't counted as malformed lines or discarded bytes. An acknowledgement which is split across two
+    reads is kept until the rest of it is received.
+    """
+
+    _pending = bytes
+
+    def __init__(self):
+        self._pending = b""
+
+    def extract(self, data: bytes) -> tuple[bytes, list[int]]:
+        """
+        :param data: Data received from the Raspberry Pi Pico
+        :return: Tuple of (data without the acknowledgements, IDs of the acknowledged commands)
+        """
+        if self._pending:
+            data = self._pending + data
+            self._pending = b""
+        if b"$" not in data:
+            # Fast path: text lines never contain a "$"
+            return data, []
+
+        command_ids = [int(command_id) for command_id in ACK_PATTERN.findall(data)]
+        if len(command_ids) > 0:
+            data = ACK_PATTERN.sub(b"", data)
+        incomplete = INCOMPLETE_ACK_PATTERN.search(data, max(len(data) - MAX_ACK_LENGTH, 0))
+        if incomplete is not None:
+            self._pending = data[incomplete.start():]
+            data = data[:incomplete.start()]
+        return data, command_ids
+
+
+class TextLineDecoder:
+    """
+    Decoder for the line based text format. Incomplete lines are kept until the rest of the line is received and
+    malformed lines are skipped.
+    """
+
+    _pending = bytes
+    _value_count = int
+    malformed_lines = int
+
+    def __init__(self, value_count: int = SENSOR_VALUE_COUNT):
+        """
+        :param value_count: Number of sensor values per sample
+        """
+        self._pending = b""
+        self._value_count = value_count
+        self.malformed_lines = 0
+
+    @property
+    def dropped_samples(self) -> int:
+        return self.malformed_lines
+
+    def decode(self, data: bytes) -> DecodedFrames:
+        """
+        Decode all complete lines in the received data.
+
+        :param data: Data received from the Raspberry Pi Pico
+        :return: Decoded samples
+        """
+        lines = (self._pending + data).split(b"\n")
+        # The last element is either empty or an incomplete line
+        self._pending = lines.pop()
+        if len(self._pending) > MAX_LINE_LENGTH:
+            logging.warning("Discarding %d bytes of sensor data without line break", len(self._pending))
+            self._pending = b""
+
+        rows = []
+        for line in lines:
+            values = parse_sensor_line(line, self._value_count)
+            if values is None:
+                self.malformed_lines += 1
+                logging.warning("Discarding malformed sensor data from Raspberry Pi Pico: %s", line)
+                continue
+            rows.append(values)
+        return DecodedFrames(np.array(rows, dtype=np.float64).reshape(-1, self._value_count), None)
+
+
+class BinaryFrameDecoder:
+    """
+    Decoder for the binary frame format. All complete frames in the received data are parsed at once with NumPy.
+    Bytes in front of a sync word as well as frames with a CRC mismatch are discarded and the decoder resynchronises on
+    the next sync word.
+    """
+
+    _pending = bytes
+    _frame_dtype = np.dtype
+    _frame_size = int
+    _last_sequence = int
+    crc_errors = int
+    discarded_bytes = int
+    dropped_frames = int
+
+    def __init__(self, value_count: int = SENSOR_VALUE_COUNT):
+        """
+        :param value_count: Number of sensor values per frame
+        """
+        self._pending = b""
+        self._frame_dtype = frame_dtype(value_count)
+        self._frame_size = self._frame_dtype.itemsize
+        self._last_sequence = None
+        self.crc_errors = 0
+        self.discarded_bytes = 0
+        self.dropped_frames = 0
+
+    @property
+    def dropped_samples(self) -> int:
+        # Corrupt frames leave a gap in the sequence numbers, so they are included in the dropped frames
+        return self.dropped_frames
+
+    def decode(self, data: bytes) -> DecodedFrames:
+        """
+        Decode all complete frames in the received data.
+
+        :param data: Data received from the Raspberry Pi Pico
+        :return: Decoded samples
+        """
+        data = self._pending + data
+        blocks = []
+        pos = 0
+        while True:
+            start = data.find(SYNC_BYTES, pos)
+            if start < 0:
+                # Keep a trailing byte which might be the first half of the next sync word
+                keep = len(data) - 1 if data.endswith(SYNC_BYTES[:1]) else len(data)
+                self.discarded_bytes += max(keep - pos, 0)
+                pos = max(keep, pos)
+                break
+            self.discarded_bytes += start - pos
+
+            count = (len(data) - start) // self._frame_size
+            if count == 0:
+                pos = start
+                break
+
+            block = np.frombuffer(data, dtype=self._frame_dtype, count=count, offset=start)
+            valid = self._count_valid_frames(data, start, block)
+            if valid > 0:
+                blocks.append(block[:valid])
+            pos = start + valid * self._frame_size
+
+            if valid < count and data.startswith(SYNC_BYTES, pos):
+                # Frame at the sync word is corrupt, resynchronise on the next sync word
+                self.crc_errors += 1
+                self.discarded_bytes += 1
+                pos += 1
+
+        self._pending = data[pos:]
+        if len(blocks) == 0:
+            value_count = self._frame_dtype["values"].shape[0]
+            return DecodedFrames(np.empty((0, value_count), dtype=np.float64), np.empty(0, dtype=np.int64))
+
+        frames = np.concatenate(blocks)
+        self._count_dropped_frames(frames["sequence"])
+        return DecodedFrames(frames["values"].astype(np.float64), frames["timestamp"].astype(np.int64))
+
+    def _count_valid_frames(self, data: bytes, start: int, block: np.ndarray) -> int:
+        """
+        Count the consecutive valid frames at the beginning of a block of frames.
+
+        :param data: Received data
+        :param start: Offset of the block in the received data
+        :param block: Frames starting at the offset
+        :return: Number of valid frames until the first invalid one
+        """
+        sync_ok = block["sync"] == SYNC_WORD
+        limit = len(block) if sync_ok.all() else int(np.argmin(sync_ok))
+
+        view = memoryview(data)
+        crcs = block["crc"]
+        for i in range(limit):
+            offset = start + i * self._frame_size
+            if crc_hqx(view[offset:offset + self._frame_size - 2], CRC_INIT) != crcs[i]:
+                return i
+        return limit
+
+    def _count_dropped_frames(self, sequence: np.ndarray) -> None:
+        previous = sequence[0] - 1 if self._last_sequence is None else self._last_sequence
+        gaps = (np.diff(sequence.astype(np.int64), prepend=previous) - 1) % 0x10000
+        self.dropped_frames += int(gaps.sum())
+        self._last_sequence = int(sequence[-1])
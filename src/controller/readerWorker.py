@@ -0,0 +1,156 @@
+import time
+import logging
+import numpy as np
+from serial.serialutil import SerialException
+from PySide6.QtCore import QObject, Signal, Slot
+from src.controller.usbController import PicoUSBController
+from src.controller.alarmEngine import Alarm, AlarmEngine
+from src.controller.commandWorker import CommandWorker
+from src.controller.picoProtocol import SENSOR_VALUE_COUNT, AckExtractor, BinaryFrameDecoder, DecodedFrames, \
+    TextLineDecoder
+from src.model.metricsModel import pipeline_metrics
+
+
+class PicoReaderWorker(QObject):
+    """
+    PicoReaderWorker continuously reads the sensor data from the Raspberry Pi Pico. It is supposed to be moved to a
+    dedicated QThread, so that blocking serial reads never stall the Qt event loop of the GUI. Each read drains the
+    whole serial input buffer, and all samples parsed from it are handed over to the GUI thread as one batch via a
+    (queued) signal. If an AlarmEngine is given, every batch is checked for alarms before it's handed over, so alarms
+    don't depend on the GUI thread keeping up. If a CommandWorker is given, the acknowledgements of its commands are
+    extracted from the received data and passed to it directly.
+    """
+
+    # Signals
+    # Sensor values with shape (number of samples, value_count) and their monotonic timestamps [ns]
+    received_sensor_data = Signal(np.ndarray, np.ndarray)
+    connection_changed = Signal(bool)
+    # Alarms raised and cleared by the alarm engine
+    alarm_raised = Signal(Alarm)
+    alarm_cleared = Signal(Alarm)
+    # Description of the error on which the read loop stopped
+    read_failed = Signal(str)
+    finished = Signal()
+
+    _usb_controller = PicoUSBController
+    _decoder = TextLineDecoder | BinaryFrameDecoder
+    _alarm_engine = AlarmEngine
+    _command_worker = CommandWorker
+    _ack_extractor = AckExtractor
+    _running = False
+    _connected = False
+
+    def __init__(self, usb_controller: PicoUSBController, binary_protocol: bool = False,
+                 value_count: int = SENSOR_VALUE_COUNT, alarm_engine: AlarmEngine = None,
+                 command_worker: CommandWorker = None):
+        """
+        :param usb_controller: Controller of the serial connection to the Raspberry Pi Pico
+        :param binary_protocol: Whether the Pico sends binary frames instead of text lines (see picoProtocol)
+        :param value_count: Number of sensor values per sample
+        :param alarm_engine: Alarm engine which checks every batch of samples; None to not check for alarms
+        :param command_worker: Command worker whose commands are acknowledged by the Pico; None if no commands are sent
+        """
+        logging.debug("Creating new reader worker for Raspberry Pi Pico")
+        super(PicoReaderWorker, self).__init__()
+        self._usb_controller = usb_controller
+        self._decoder = BinaryFrameDecoder(value_count) if binary_protocol else TextLineDecoder(value_count)
+        self._alarm_engine = alarm_engine
+        self._command_worker = command_worker
+        self._ack_extractor = AckExtractor()
+
+    @Slot()
+    def run(self) -> None:
+        """
+        Read loop of the worker, which runs until stop() is called or the serial port fails (e.g. because the Raspberry
+        Pi Pico was unplugged or reset). Receiving data serves as a "health check" for the connection to the Pico.
+
+        :return: None
+        """
+        logging.debug("Starting to read from Raspberry Pi Pico")
+        self._running = True
+        while self._running:
+            start = time.perf_counter_ns()
+            try:
+                data = self._usb_controller.read_all_from_pico()
+            except (SerialException, OSError) as error:
+                # The port is reopened by the MainController as soon as the Pico reappears, or by the DeviceSession if
+                # the port is still present
+                logging.warning("Lost connection to Raspberry Pi Pico: %s", error)
+                self._set_connected(False)
+                if self._alarm_engine is not None:
+                    self._emit_alarms(self._alarm_engine.connection_lost(time.monotonic_ns()), [])
+                self.read_failed.emit(str(error))
+                break
+            if data == b"":
+                # Read timed out, no data received
+                self._set_connected(False)
+                self._check_no_data()
+                continue
+            read = time.perf_counter_ns()
+
+            self._set_connected(True)
+            if self._command_worker is not None:
+                data, command_ids = self._ack_extractor.extract(data)
+                if len(command_ids) > 0:
+                    self._command_worker.acknowledge(command_ids, time.monotonic_ns())
+            dropped = self._decoder.dropped_samples
+            frames = self._decoder.decode(data)
+            pipeline_metrics.record("serial_read", read - start)
+            pipeline_metrics.record("parse", time.perf_counter_ns() - read)
+            if self._decoder.dropped_samples > dropped:
+                pipeline_metrics.count("dropped_samples", self._decoder.dropped_samples - dropped)
+            if len(frames.values) == 0:
+                self._check_no_data()
+                continue
+            timestamps = self._host_timestamps(frames)
+            if self._alarm_engine is not None:
+                self._emit_alarms(*self._alarm_engine.check(frames.values, timestamps))
+            self.received_sensor_data.emit(frames.values, timestamps)
+
+        logging.debug("Stopped reading from Raspberry Pi Pico")
+        self.finished.emit()
+
+    def stop(self) -> None:
+        """
+        Stop the read loop after the currently pending read. This method is meant to be called from another thread,
+        since the worker's own event loop is blocked by the read loop.
+
+        :return: None
+        """
+        self._running = False
+
+    @staticmethod
+    def _host_timestamps(frames: DecodedFrames) -> np.ndarray:
+        """
+        Assign monotonic host timestamps to decoded samples. The youngest sample is stamped with the current time. If
+        the wire format carries device timestamps, the older samples of the batch are spread accordingly, otherwise the
+        whole batch shares the current time.
+
+        :param frames: Decoded samples
+        :return: Monotonic timestamps [ns]
+        """
+        now = time.monotonic_ns()
+        if frames.device_timestamps is None:
+            return np.full(len(frames.values), now, dtype=np.int64)
+        # Device timestamps [us] wrap around at 2^32, so the offsets to the youngest sample are taken modulo 2^32
+        offsets = (frames.device_timestamps - frames.device_timestamps[-1] + 2 ** 31) % 2 ** 32 - 2 ** 31
+        return now + offsets * 1000
+
+    def _check_no_data(self) -> None:
+        if self._alarm_engine is not None:
+            self._emit_alarms(self._alarm_engine.check_no_data(time.monotonic_ns()), [])
+
+    def _emit_alarms(self, raised: list[Alarm], cleared: list[Alarm]) -> None:
+        for alarm in raised:
+            logging.warning("Alarm raised at %s: %s %s (value %s)", self._usb_controller.port,
+                            alarm.channel or "device", alarm.kind, alarm.value)
+            self.alarm_raised.emit(alarm)
+        for alarm in cleared:
+            logging.info("Alarm cleared at %s: %s %s (value %s)", self._usb_controller.port,
+                         alarm.channel or "device", alarm.kind, alarm.value)
+            self.alarm_cleared.emit(alarm)
+
+    def _set_connected(self, connected: bool) -> None:
+        if connected != self._connected:
+            self._connected = connected
+            self.connection_changed.emit(connected)
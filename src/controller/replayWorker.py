@@ -0,0 +1,294 @@
+import time
+import logging
+import numpy as np
+from typing import Iterator
+from PySide6.QtCore import QObject, QSemaphore, Signal, Slot
+from src.controller.picoProtocol import SENSOR_VALUE_COUNT, BinaryFrameDecoder, DecodedFrames, TextLineDecoder
+from src.model.sessionRecorder import SESSION_FILE_MAGIC, SessionReader
+
+# Interval of recorded time which is replayed as one batch [ns]
+REPLAY_WINDOW_NS = 20_000_000
+# Interval of recorded time which is replayed as one batch when replaying as fast as possible [ns]
+REPLAY_MAX_SPEED_WINDOW_NS = 1_000_000_000
+# Raw serial dumps are read and decoded in blocks of this size [bytes]
+RAW_DUMP_BLOCK_SIZE = 65536
+# Text lines don't carry timestamps, so they are replayed with the interval of the original poll timer [ns]
+TEXT_FRAME_INTERVAL_NS = 800_000_000
+# Maximum time the worker sleeps at once, so that it can be stopped during long gaps in the recording [s]
+MAX_SLEEP = 0.1
+# Maximum number of emitted batches which aren't appended to the model yet, so that a fast replay can't flood the
+# event queue of the GUI thread
+MAX_PENDING_BATCHES = 2
+
+
+class ReplayWorker(QObject):
+    """
+    ReplayWorker feeds a recorded session (see SessionRecorder) or a captured raw serial byte dump through the same
+    pipeline as the live Raspberry Pi Pico, at N times the recorded speed or as fast as possible. Like the
+    PicoReaderWorker it is supposed to be moved to a dedicated QThread. The replayed samples are timestamped as if they
+    were received now, so that they are displayed like live data. Recorded sessions are streamed chunk by chunk from
+    the memory-mapped session file, so only the samples of the current window are copied into memory, however long the
+    session is. The next batch is only emitted once the receiver reported by batch_processed() that it appended one of
+    the MAX_PENDING_BATCHES previous batches, so the replay never gets ahead of the GUI.
+    """
+
+    # Signals
+    # Raw dumps: sensor values with shape (number of samples, value_count) and their monotonic timestamps [ns],
+    # like PicoReaderWorker.received_sensor_data
+    received_sensor_data = Signal(np.ndarray, np.ndarray)
+    # Recorded sessions: tuples of (values, monotonic timestamps [ns]) by channel name, see
+    # SensorDataModel.append_samples()
+    received_samples = Signal(dict)
+    finished = Signal()
+
+    _filepath = str
+    _speed = float
+    _binary_protocol = bool
+    _value_count = int
+    _running = False
+    # Recorded time which is mapped to the start of the replay [ns]
+    _recorded_origin = int
+    _replay_start = int
+    # Batches which can be emitted before the receiver processed the previous ones
+    _batch_slots = QSemaphore
+
+    def __init__(self, filepath: str, speed: float | None = 1.0, binary_protocol: bool = False,
+                 value_count: int = SENSOR_VALUE_COUNT):
+        """
+        :param filepath: Path of a session file or a raw serial dump
+        :param speed: Replay speed as multiple of the recorded speed; None to replay as fast as possible
+        :param binary_protocol: Whether a raw serial dump contains binary frames instead of text lines
+        :param value_count: Number of sensor values per sample of a raw serial dump
+        """
+        logging.debug(f"Creating new replay worker for {filepath}")
+        super(ReplayWorker, self).__init__()
+        self._filepath = filepath
+        self._speed = speed
+        self._binary_protocol = binary_protocol
+        self._value_count = value_count
+        self._batch_slots = QSemaphore(MAX_PENDING_BATCHES)
+
+    @Slot()
+    def run(self) -> None:
+        """
+        Replay the file until its end or until stop() is called.
+
+        :return: None
+        """
+        speed = "as fast as possible" if self._speed is None else f"at {self._speed}x speed"
+        logging.info(f"Replaying {self._filepath} {speed}")
+        self._running = True
+        try:
+            with open(self._filepath, mode="rb") as replay_file:
+                is_session = replay_file.read(len(SESSION_FILE_MAGIC)) == SESSION_FILE_MAGIC
+            if is_session:
+                self._replay_session()
+            else:
+                self._replay_raw_dump()
+        except (OSError, ValueError) as error:
+            logging.error(f"Could not replay {self._filepath}: {error}")
+        else:
+            logging.info(f"Finished replaying {self._filepath}")
+        self.finished.emit()
+
+    def stop(self) -> None:
+        """
+        Stop the replay after the current batch. This method is meant to be called from another thread.
+
+        :return: None
+        """
+        self._running = False
+
+    def batch_processed(self) -> None:
+        """
+        Report that an emitted batch was appended, so that the next one can be emitted. This method is meant to be
+        called from the thread which receives the batches.
+
+        :return: None
+        """
+        self._batch_slots.release()
+
+    def _replay_session(self) -> None:
+        reader = SessionReader(self._filepath)
+        try:
+            self._replay_chunks(reader)
+        finally:
+            # The memory-mapped file can only be closed once the views of its chunks are released, i.e. after
+            # _replay_chunks() returned
+            reader.close()
+
+    def _replay_chunks(self, reader: SessionReader) -> None:
+        # The chunks of every channel are ascending in time, so every channel is read with its own cursor and the
+        # cursors are advanced window by window
+        cursors = {}
+        for channel in reader.channel_names:
+            cursor = _ChunkCursor(reader.iter_chunks([channel]))
+            if not cursor.exhausted:
+                cursors[channel] = cursor
+        if len(cursors) == 0:
+            return
+
+        self._start_clock(min(cursor.next_timestamp for cursor in cursors.values()))
+        window_start = self._recorded_origin
+        while self._running and len(cursors) > 0:
+            window_end = window_start + self._window()
+            batch = {}
+            for channel, cursor in list(cursors.items()):
+                timestamps, values = cursor.take_until(window_end)
+                if len(timestamps) > 0:
+                    batch[channel] = (values, self._rebase(timestamps))
+                if cursor.exhausted:
+                    del cursors[channel]
+
+            self._wait_until(window_end)
+            if len(batch) > 0 and self._acquire_batch_slot():
+                self.received_samples.emit(batch)
+            window_start = window_end
+
+    def _replay_raw_dump(self) -> None:
+        decoder = BinaryFrameDecoder(self._value_count) if self._binary_protocol else TextLineDecoder(self._value_count)
+        clock = _DeviceClock()
+        self._start_clock(0)
+        with open(self._filepath, mode="rb") as dump_file:
+            while self._running:
+                data = dump_file.read(RAW_DUMP_BLOCK_SIZE)
+                if data == b"":
+                    break
+                frames = decoder.decode(data)
+                if len(frames.values) == 0:
+                    continue
+
+                recorded = clock.timestamps(frames)
+                start = 0
+                while self._running and start < len(recorded):
+                    stop = int(np.searchsorted(recorded, recorded[start] + self._window()))
+                    self._wait_until(recorded[stop - 1])
+                    if not self._acquire_batch_slot():
+                        break
+                    self.received_sensor_data.emit(frames.values[start:stop], self._rebase(recorded[start:stop]))
+                    start = stop
+
+    def _acquire_batch_slot(self) -> bool:
+        """
+        Wait until the receiver processed enough of the emitted batches to emit the next one.
+
+        :return: Whether a batch can be emitted; False if the worker was stopped while waiting
+        """
+        while self._running:
+            if self._batch_slots.tryAcquire(1, int(MAX_SLEEP * 1000)):
+                return True
+        return False
+
+    def _window(self) -> int:
+        return REPLAY_MAX_SPEED_WINDOW_NS if self._speed is None else REPLAY_WINDOW_NS
+
+    def _start_clock(self, recorded_origin: int) -> None:
+        self._recorded_origin = recorded_origin
+        self._replay_start = time.monotonic_ns()
+
+    def _rebase(self, recorded: np.ndarray) -> np.ndarray:
+        """
+        Map recorded timestamps to the replay time.
+
+        :param recorded: Recorded timestamps [ns]
+        :return: Monotonic timestamps [ns] as if the samples were received during the replay
+        """
+        speed = 1.0 if self._speed is None else self._speed
+        return self._replay_start + ((recorded - self._recorded_origin) / speed).astype(np.int64)
+
+    def _wait_until(self, recorded: int) -> None:
+        """
+        Sleep until the sample with the recorded timestamp is due (no-op when replaying as fast as possible).
+
+        :param recorded: Recorded timestamp [ns]
+        :return: None
+        """
+        if self._speed is None:
+            return
+        due = self._replay_start + (recorded - self._recorded_origin) / self._speed
+        while self._running:
+            remaining = (due - time.monotonic_ns()) * 1e-9
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, MAX_SLEEP))
+
+
+class _DeviceClock:
+    """
+    Continuous recorded time axis for the samples of a raw serial dump: unwrapped device timestamps for binary frames,
+    TEXT_FRAME_INTERVAL_NS spacing for text lines.
+    """
+
+    def __init__(self):
+        self._time = 0
+        self._last_device_timestamp = None
+
+    def timestamps(self, frames: DecodedFrames) -> np.ndarray:
+        if frames.device_timestamps is None:
+            recorded = self._time + np.arange(1, len(frames.values) + 1, dtype=np.int64) * TEXT_FRAME_INTERVAL_NS
+        else:
+            device_timestamps = frames.device_timestamps
+            previous = device_timestamps[0] if self._last_device_timestamp is None else self._last_device_timestamp
+            # Device timestamps [us] wrap around at 2^32
+            steps = np.diff(device_timestamps, prepend=previous) % 2 ** 32
+            recorded = self._time + np.cumsum(steps) * 1000
+            self._last_device_timestamp = int(device_timestamps[-1])
+        self._time = int(recorded[-1])
+        return recorded
+
+
+class _ChunkCursor:
+    """
+    Read position in the chunks of one channel of a session file. Only the current chunk is referenced, as zero-copy
+    view of the memory-mapped file.
+    """
+
+    def __init__(self, chunks: Iterator[tuple[str, np.ndarray, np.ndarray]]):
+        """
+        :param chunks: Chunks of the channel, see SessionReader.iter_chunks()
+        """
+        self._chunks = chunks
+        self._timestamps = None
+        self._values = None
+        self._position = 0
+        self._next_chunk()
+
+    @property
+    def exhausted(self) -> bool:
+        return self._timestamps is None
+
+    @property
+    def next_timestamp(self) -> int:
+        """
+        :return: Recorded timestamp [ns] of the next sample
+        """
+        return int(self._timestamps[self._position])
+
+    def take_until(self, end: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param end: Recorded timestamp [ns] before which the samples are taken
+        :return: Tuple of (recorded timestamps [ns], values) of the taken samples, copied from the file
+        """
+        timestamps = []
+        values = []
+        while self._timestamps is not None:
+            stop = self._position + int(np.searchsorted(self._timestamps[self._position:], end))
+            timestamps.append(self._timestamps[self._position:stop])
+            values.append(self._values[self._position:stop])
+            if stop < len(self._timestamps):
+                self._position = stop
+                break
+            self._next_chunk()
+        if len(timestamps) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return np.concatenate(timestamps), np.concatenate(values)
+
+    def _next_chunk(self) -> None:
+        self._timestamps = None
+        self._values = None
+        self._position = 0
+        for _, timestamps, values in self._chunks:
+            if len(timestamps) > 0:
+                self._timestamps = timestamps
+                self._values = values
+                return
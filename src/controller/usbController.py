@@ -11,26 +11,39 @@ PICO_CDC_PRODUCT_ID = 0x000A
 
 # Timeout for reading from / writing to devices [seconds]
 TIMEOUT = 0.5
-# Maximum buffer size for reading [bytes]
-READ_BUFFER_SIZE = 128
+
+
+def list_pico_devices() -> dict[str, str]:
+    """
+    List all Raspberry Pi Picos (as "Raspberry Pi Pico SDK CDC UART") without logging, so that it can be polled
+    :return: USB serial numbers ("" if unknown) by the COM ports at which the Raspberry Pi Picos are connected to
+    """
+    return {port.device: port.serial_number or "" for port in list_ports.comports()
+            if port.vid == PICO_VENDOR_ID and port.pid == PICO_CDC_PRODUCT_ID}
+
+
+def find_pico_com_ports() -> list[str]:
+    """
+    Find all Raspberry Pi Picos and the COM ports at which they're connected to
+    :return: COM ports at which Raspberry Pi Picos are connected to; empty if none were found
+    """
+    logging.info("Scanning serial ports on device")
+    ports = list(list_pico_devices())
+    for port in ports:
+        logging.info(f"Found Raspberry Pi Pico at {port}")
+    if len(ports) == 0:
+        logging.warning("Could not find Raspberry Pi Pico connected to your device. Please check the connection and "
+                        "try again.")
+    return ports
 
 
 def _find_pico_com_port() -> str | None:
     """
-    Find Raspberry Pi Pico (as "Raspberry Pi Pico SDK CDC UART") and the COM port at which it's connected to
+    Find the first Raspberry Pi Pico and the COM port at which it's connected to
     :return: COM port at which the Raspberry Pi Pico is connected to; None if not found
     """
-    # TODO maybe add retry mechanism, user should also be able to trigger it himself if necessary
-    # TODO (e.g. when connection is lost after it was established before)
-    logging.info("Scanning serial ports on device")
-    for port in list_ports.comports():
-        if port.vid == PICO_VENDOR_ID and port.pid == PICO_CDC_PRODUCT_ID:
-            logging.info(f"Found Raspberry Pi Pico at {port.name}")
-            return port.name
-        else:
-            logging.warning("Could not find Raspberry Pi Pico connected to your device. Please check the connection "
-                            "and try again.")
-            return None
+    ports = find_pico_com_ports()
+    return ports[0] if len(ports) > 0 else None
 
 
 class PicoUSBController:
@@ -41,30 +54,52 @@ class PicoUSBController:
     _serial_controller = Serial
     _PICO_COM_PORT = ""
 
-    def __init__(self):
+    @property
+    def port(self) -> str:
+        return self._PICO_COM_PORT
+
+    def __init__(self, port: str = None):
+        """
+        :param port: Serial port at which the Raspberry Pi Pico is connected (e.g. a simulator's pseudo-terminal); the
+        port is searched by the Pico's vendor/product ID if not given
+        """
         logging.debug("Creating new USB controller for Raspberry Pi Pico")
-        self._PICO_COM_PORT = _find_pico_com_port()
+        self._PICO_COM_PORT = port if port is not None else _find_pico_com_port()
 
         if self._PICO_COM_PORT is not None and not "":
             # Initialize CDC connection to Raspberry Pi Pico
-            self._serial_controller = Serial(port=self._PICO_COM_PORT, timeout=TIMEOUT)
+            # Writes time out as well, so that a stalled Pico can't block the command thread forever
+            self._serial_controller = Serial(port=self._PICO_COM_PORT, timeout=TIMEOUT, write_timeout=TIMEOUT)
             logging.debug(f"Successfully initialised serial port {self._PICO_COM_PORT}")
         else:
             raise SerialException("Could not find Raspberry Pi Pico connected to your device. Please check the "
                                   "connection and try again.")
 
-    def read_from_pico(self) -> bytes:
-        data = self._serial_controller.readline(READ_BUFFER_SIZE)
-        logging.debug(f"Read data from Raspberry Pi Pico: {data}")
+    def close(self) -> None:
+        logging.debug(f"Closing serial port {self._PICO_COM_PORT}")
+        self._serial_controller.close()
+
+    def read_all_from_pico(self) -> bytes:
+        """
+        Drain the serial input buffer in one call. Blocks until at least one byte is received or the read times out,
+        so that the caller doesn't have to poll.
+
+        :return: All bytes which were received from the Raspberry Pi Pico; empty if the read timed out
+        """
+        data = self._serial_controller.read(max(1, self._serial_controller.in_waiting))
+        # If the read blocked for the first byte, the rest of the burst has arrived in the meantime
+        if data and self._serial_controller.in_waiting:
+            data += self._serial_controller.read(self._serial_controller.in_waiting)
+        logging.debug("Read %d bytes from Raspberry Pi Pico", len(data))
         return data
 
     def write_to_pico(self, data: bytes) -> bool:
-        logging.debug(f"Sending data to Raspberry Pi Pico: {data}")
+        logging.debug("Sending data to Raspberry Pi Pico: %s", data)
         try:
             self._serial_controller.write(data)
-        except SerialException:
-            logging.error(f"Could not send data to Raspberry Pi Pico: {data}")
+        except (SerialException, OSError):
+            logging.error("Could not send data to Raspberry Pi Pico: %s", data)
             return False
         else:
-            logging.info("Successfully sent preset to Raspberry Pi Pico")
+            logging.debug("Successfully sent %d bytes to Raspberry Pi Pico", len(data))
             return True
@@ -0,0 +1,122 @@
+import math
+import numpy as np
+from src.model.metricsModel import pipeline_metrics
+
+# Derived channels of the breath analyzer, which are declared in the channel registry like the other channels
+RESPIRATORY_RATE_CHANNEL = "respiratory_rate"
+PEAK_PRESSURE_CHANNEL = "peak_pressure"
+PEEP_PRESSURE_CHANNEL = "peep_pressure"
+IE_RATIO_CHANNEL = "ie_ratio"
+# A phase ends when the pressure has moved away from the phase's extreme (the peak for an inspiration, PEEP for an
+# expiration) by this fraction of the amplitude (peak - PEEP) of the previous breath
+PHASE_THRESHOLD = 0.2
+# Minimum pressure difference which ends a phase, so that noise isn't detected as breaths (e.g. before the first breath
+# or while the respirator is stopped) [psi]
+MIN_PHASE_HYSTERESIS = 1.0
+
+INSPIRATION = "inspiration"
+EXPIRATION = "expiration"
+
+
+class BreathAnalyzer:
+    """
+    BreathAnalyzer detects the inspiration and expiration phases in the pressure stream of a respirator and derives
+    the respiratory rate, peak pressure, PEEP and I/E ratio of every complete breath. The inspiration starts when the
+    pressure rises above the minimum of the expiration by the hysteresis, the expiration when it falls below the
+    maximum of the inspiration. The state (current phase and its running extreme) is carried from batch to batch, and
+    every batch is searched for the next phase transition with vectorised running extremes. After every transition
+    the rest of the batch is searched again, so a batch costs O(batch size x phase transitions in the batch). Batches
+    of a serial read span a fraction of a breath, i.e. they rarely contain more than one or two transitions.
+
+    Breaths are only reported once the analyzer has seen both of their phases from the start, so the breath in
+    progress when the analysis starts is never reported with wrong durations. Breaths whose phases can't be timed, e.g.
+    because all text lines of one serial read share a timestamp, are dropped and counted as "dropped_breaths".
+    """
+
+    _phase = str
+    # Running extreme of the current phase: maximum of an inspiration, minimum of an expiration
+    _extreme = float
+    # Monotonic timestamps [ns] at which the current breath's inspiration and expiration started
+    _inspiration_start = int
+    _expiration_start = int
+    # Peak pressure of the current breath's inspiration and amplitude of the previous breath [psi]
+    _peak = float
+    _amplitude = float
+
+    def __init__(self):
+        # No phase is known until the first fall of the pressure
+        self._phase = None
+        self._extreme = -math.inf
+        self._inspiration_start = None
+        self._expiration_start = None
+        self._peak = math.nan
+        self._amplitude = 0.0
+
+    def process(self, pressure: np.ndarray, timestamps: np.ndarray) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """
+        Analyze a batch of pressure samples.
+
+        :param pressure: Pressure values [psi]
+        :param timestamps: Monotonic timestamps [ns] of the pressure values (ascending)
+        :return: Tuples of (values, monotonic timestamps [ns]) by derived channel name of the breaths completed by the
+        batch, timestamped with their end (the start of the next inspiration); empty if no breath was completed
+        """
+        breaths = []
+        start = 0
+        while start < len(pressure):
+            segment = pressure[start:]
+            hysteresis = max(PHASE_THRESHOLD * self._amplitude, MIN_PHASE_HYSTERESIS)
+            if self._phase == EXPIRATION:
+                extremes = np.minimum(np.minimum.accumulate(segment), self._extreme)
+                crossed = segment > extremes + hysteresis
+            else:
+                extremes = np.maximum(np.maximum.accumulate(segment), self._extreme)
+                crossed = segment < extremes - hysteresis
+            index = int(crossed.argmax())
+            if not crossed[index]:
+                # The current phase continues beyond the batch
+                self._extreme = float(extremes[-1])
+                break
+
+            transition = int(timestamps[start + index])
+            if self._phase == EXPIRATION:
+                if self._inspiration_start is not None:
+                    breath = self._complete_breath(transition, float(extremes[index]))
+                    if breath is not None:
+                        breaths.append(breath)
+                self._phase = INSPIRATION
+                self._inspiration_start = transition
+            else:
+                if self._phase == INSPIRATION:
+                    self._peak = float(extremes[index])
+                self._phase = EXPIRATION
+                self._expiration_start = transition
+            # The extreme of the new phase starts with the sample which ended the previous phase
+            self._extreme = float(segment[index])
+            start += index + 1
+
+        if len(breaths) == 0:
+            return {}
+        breaths = np.array(breaths)
+        timestamps = breaths[:, 0].astype(np.int64)
+        return {
+            RESPIRATORY_RATE_CHANNEL: (breaths[:, 1], timestamps),
+            PEAK_PRESSURE_CHANNEL: (breaths[:, 2], timestamps),
+            PEEP_PRESSURE_CHANNEL: (breaths[:, 3], timestamps),
+            IE_RATIO_CHANNEL: (breaths[:, 4], timestamps),
+        }
+
+    def _complete_breath(self, end: int, peep: float) -> tuple[int, float, float, float, float] | None:
+        """
+        :param end: Monotonic timestamp [ns] at which the next inspiration starts
+        :param peep: Minimum pressure of the expiration [psi]
+        :return: Tuple of (end, respiratory rate [1/min], peak pressure, PEEP, I/E ratio); None if a phase of the
+        breath has no duration
+        """
+        inspiration = self._expiration_start - self._inspiration_start
+        expiration = end - self._expiration_start
+        self._amplitude = self._peak - peep
+        if inspiration <= 0 or expiration <= 0:
+            pipeline_metrics.count("dropped_breaths")
+            return None
+        return end, 60e9 / (end - self._inspiration_start), self._peak, peep, inspiration / expiration
@@ -0,0 +1,182 @@
+import numpy as np
+from src.model.ringBuffer import RingBuffer
+from src.model.rollingStatistics import RollingStatistics
+
+# Downsampled tiers as tuples of (bucket width [ns], number of buckets kept): 1 s for 1 h, 10 s for 12 h, 1 min for 48 h
+HISTORY_TIERS = (
+    (1_000_000_000, 3600),
+    (10_000_000_000, 4320),
+    (60_000_000_000, 2880),
+)
+
+
+class AggregateTier:
+    """
+    Downsampled tier of a channel's history: minimum, maximum and mean of the samples in consecutive time buckets of
+    fixed width. Complete buckets are kept in ring buffers (timestamped with the start of the bucket), the youngest
+    bucket stays open and is updated in place until a sample of a later bucket arrives.
+    """
+
+    _width = int
+    minimum = RingBuffer
+    maximum = RingBuffer
+    mean = RingBuffer
+    # Open bucket: index (start / width), minimum, maximum, sum and number of its samples
+    _open_bucket = int
+    _open_minimum = float
+    _open_maximum = float
+    _open_sum = float
+    _open_count = 0
+
+    def __init__(self, width: int, capacity: int):
+        """
+        :param width: Bucket width [ns]
+        :param capacity: Maximum number of complete buckets kept (oldest buckets are overwritten)
+        """
+        self._width = width
+        self.minimum = RingBuffer(capacity)
+        self.maximum = RingBuffer(capacity)
+        self.mean = RingBuffer(capacity)
+        self._open_bucket = None
+
+    def __len__(self) -> int:
+        return len(self.mean) + (self._open_bucket is not None)
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    def extend(self, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """
+        Aggregate a batch of samples, vectorised over all buckets touched by the batch.
+
+        :param values: Sensor values
+        :param timestamps: Monotonic timestamps [ns] of the sensor values (ascending)
+        :return: None
+        """
+        if len(values) == 0:
+            return
+        first_bucket = int(timestamps[0]) // self._width
+        if first_bucket == self._open_bucket and int(timestamps[-1]) // self._width == first_bucket:
+            # Usually the whole batch falls into the open bucket
+            self._open_minimum = min(self._open_minimum, float(values.min()))
+            self._open_maximum = max(self._open_maximum, float(values.max()))
+            self._open_sum += float(values.sum())
+            self._open_count += len(values)
+            return
+
+        buckets = timestamps // self._width
+        # Start indices of the runs of samples which fall into the same bucket
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        ids = buckets[starts]
+        minima = np.minimum.reduceat(values, starts)
+        maxima = np.maximum.reduceat(values, starts)
+        sums = np.add.reduceat(values, starts)
+        counts = np.diff(np.append(starts, len(values)))
+
+        if self._open_bucket is not None and ids[0] == self._open_bucket:
+            # The batch continues the open bucket
+            minima[0] = min(minima[0], self._open_minimum)
+            maxima[0] = max(maxima[0], self._open_maximum)
+            sums[0] += self._open_sum
+            counts[0] += self._open_count
+        elif self._open_bucket is not None:
+            self._close_buckets(np.array([self._open_bucket]), np.array([self._open_minimum]),
+                                np.array([self._open_maximum]), np.array([self._open_sum / self._open_count]))
+
+        # All but the last bucket of the batch are complete
+        if len(ids) > 1:
+            self._close_buckets(ids[:-1], minima[:-1], maxima[:-1], sums[:-1] / counts[:-1])
+        self._open_bucket = int(ids[-1])
+        self._open_minimum = float(minima[-1])
+        self._open_maximum = float(maxima[-1])
+        self._open_sum = float(sums[-1])
+        self._open_count = int(counts[-1])
+
+    def oldest_timestamp(self) -> int | None:
+        """
+        :return: Monotonic start timestamp [ns] of the oldest bucket; None if the tier is empty
+        """
+        if len(self.mean) > 0:
+            return int(self.mean.timestamps(len(self.mean))[0])
+        return None if self._open_bucket is None else self._open_bucket * self._width
+
+    def data(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :return: Tuple of (monotonic start timestamps [ns], minima, maxima, means) of all buckets including the open
+        one (oldest first)
+        """
+        timestamps, minima, maxima, means = (self.mean.timestamps(), self.minimum.values(), self.maximum.values(),
+                                             self.mean.values())
+        if self._open_bucket is None:
+            return timestamps, minima, maxima, means
+        return (np.append(timestamps, self._open_bucket * self._width), np.append(minima, self._open_minimum),
+                np.append(maxima, self._open_maximum), np.append(means, self._open_sum / self._open_count))
+
+    def _close_buckets(self, ids: np.ndarray, minima: np.ndarray, maxima: np.ndarray, means: np.ndarray) -> None:
+        timestamps = ids * self._width
+        self.minimum.extend(minima, timestamps)
+        self.maximum.extend(maxima, timestamps)
+        self.mean.extend(means, timestamps)
+
+
+class ChannelHistory:
+    """
+    History of one sensor channel at several resolutions: a bounded raw tier (RingBuffer) and downsampled tiers (see
+    AggregateTier and HISTORY_TIERS), which are all updated incrementally with every batch. Hours of history cost
+    bounded memory, and a graph only has to plot the tier which matches its visible time span. Rolling statistics of
+    the recent samples are updated with every batch as well, so they can be queried by any consumer without scanning
+    the samples.
+    """
+
+    raw = RingBuffer
+    tiers = list
+    statistics = RollingStatistics
+
+    def __init__(self, raw_capacity: int, statistics_window: int, ewma_time_constant: int):
+        """
+        :param raw_capacity: Maximum number of raw samples kept
+        :param statistics_window: Width of the window of the rolling statistics [ns]
+        :param ewma_time_constant: Time constant of the exponentially weighted moving average [ns]
+        """
+        self.raw = RingBuffer(raw_capacity)
+        self.tiers = [AggregateTier(width, capacity) for width, capacity in HISTORY_TIERS]
+        self.statistics = RollingStatistics(statistics_window, ewma_time_constant)
+
+    def extend(self, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """
+        Append a batch of samples to the raw tier, aggregate it into the downsampled tiers and update the rolling
+        statistics.
+
+        :param values: Sensor values
+        :param timestamps: Monotonic timestamps [ns] of the sensor values
+        :return: None
+        """
+        self.raw.extend(values, timestamps)
+        for tier in self.tiers:
+            tier.extend(values, timestamps)
+        self.statistics.extend(values, timestamps)
+
+    def select_tier(self, start: int, end: int, max_points: int) -> AggregateTier | None:
+        """
+        Select the finest tier which still covers the start of a time span and has at most max_points points in it.
+
+        :param start: Monotonic start timestamp [ns] of the time span
+        :param end: Monotonic end timestamp [ns] of the time span
+        :param max_points: Maximum number of points (samples or buckets) in the time span
+        :return: Downsampled tier; None for the raw tier
+        """
+        # The span can't start before the oldest bucket of the history
+        oldest = [tier.oldest_timestamp() for tier in self.tiers]
+        start = max(start, min((timestamp for timestamp in oldest if timestamp is not None), default=start))
+
+        raw_timestamps = self.raw.timestamps()
+        # As long as the raw tier isn't full, it still contains the complete history
+        raw_covers = len(self.raw) < self.raw.capacity or raw_timestamps[0] <= start
+        if raw_covers and np.diff(np.searchsorted(raw_timestamps, [start, end]))[0] <= max_points:
+            return None
+
+        for tier, tier_oldest in zip(self.tiers, oldest):
+            if tier_oldest is not None and tier_oldest <= start and (end - start) // tier.width <= max_points:
+                return tier
+        return self.tiers[-1]
@@ -0,0 +1,89 @@
+import logging
+from typing import NamedTuple
+from configparser import ConfigParser, SectionProxy
+
+channels_filepath = "assets/sensor_channels.ini"
+# Values which a numerical instrument can display: the latest sample, the mean of the rolling statistics' window or
+# the exponentially weighted moving average
+DISPLAYED_VALUES = ("last", "mean", "ewma")
+
+
+class ChannelSpec(NamedTuple):
+    """
+    Declaration of one sensor channel, from which its storage in the sensor data model and its instruments are
+    generated (see the channels file for a description of the fields).
+    """
+    name: str
+    label: str
+    unit: str
+    # Position of the value in a sample sent by the Raspberry Pi Pico; None if the channel is not sent by the Pico
+    wire_index: int | None
+    capacity: int
+    row: int
+    column: int
+    demo_min: float
+    demo_max: float
+    # Alarm limits (see AlarmEngine); None if not checked
+    alarm_min: float | None
+    alarm_max: float | None
+    # Maximum rate of change [unit/s]
+    alarm_max_rate: float | None
+    # Window of the rolling statistics and time constant of the moving average [ns]
+    statistics_window: int
+    ewma_time_constant: int
+    # Value displayed by the numerical instrument (see DISPLAYED_VALUES)
+    display: str
+
+    @property
+    def title(self) -> str:
+        return f"{self.label} [{self.unit}]"
+
+
+def load_channel_registry(filepath: str = channels_filepath) -> list[ChannelSpec]:
+    """
+    Load the sensor channels from the channels file.
+
+    :param filepath: Path of the channels file
+    :return: Sensor channels in the order of the file
+    """
+    logging.debug(f"Loading sensor channels from {filepath}")
+    # Interpolation is disabled, since units may contain a "%"
+    config = ConfigParser(interpolation=None)
+    with open(filepath, encoding="utf8") as channels_file:
+        config.read_file(channels_file)
+
+    channels = []
+    for name in config.sections():
+        section = config[name]
+        wire_index = section.get("wire_index").strip()
+        channels.append(ChannelSpec(
+            name=name,
+            label=section["label"],
+            unit=section["unit"],
+            wire_index=int(wire_index) if wire_index != "" else None,
+            capacity=section.getint("capacity"),
+            row=section.getint("row"),
+            column=section.getint("column"),
+            demo_min=section.getfloat("demo_min"),
+            demo_max=section.getfloat("demo_max"),
+            alarm_min=_optional_float(section, "alarm_min"),
+            alarm_max=_optional_float(section, "alarm_max"),
+            alarm_max_rate=_optional_float(section, "alarm_max_rate"),
+            statistics_window=int(section.getfloat("statistics_window") * 1e9),
+            ewma_time_constant=int(section.getfloat("ewma_time_constant") * 1e9),
+            display=section.get("display"),
+        ))
+        if channels[-1].display not in DISPLAYED_VALUES:
+            raise ValueError(f"Displayed value of sensor channel {name} in {filepath} must be one of "
+                             f"{DISPLAYED_VALUES}, got {channels[-1].display!r}")
+
+    wire_indices = sorted(channel.wire_index for channel in channels if channel.wire_index is not None)
+    if wire_indices != list(range(len(wire_indices))):
+        raise ValueError(f"Wire indices of the sensor channels in {filepath} must be consecutive from 0, got "
+                         f"{wire_indices}")
+    return channels
+
+
+def _optional_float(section: SectionProxy, option: str) -> float | None:
+    value = section.get(option, "").strip()
+    return float(value) if value != "" else None
@@ -0,0 +1,216 @@
+import json
+import time
+import logging
+import threading
+
+# Bucket i of a LatencyHistogram counts durations in [2^(i-1), 2^i) * HISTOGRAM_RESOLUTION_NS, the first bucket counts
+# everything below HISTOGRAM_RESOLUTION_NS and the last bucket everything above
+HISTOGRAM_RESOLUTION_NS = 1024
+HISTOGRAM_BUCKET_COUNT = 26
+# Samples which reach the model later than this after they were received are counted as late [ns]
+LATE_SAMPLE_THRESHOLD_NS = 100_000_000
+
+
+class LatencyHistogram:
+    """
+    Fixed-size histogram of durations with logarithmic (power of two) buckets, from ~1 us to ~17 s. Recording is O(1)
+    and allocation-free, so it can stay enabled in hot paths.
+    """
+
+    counts = list
+    count = int
+    total_ns = int
+    max_ns = int
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts = [0] * HISTOGRAM_BUCKET_COUNT
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns: int) -> None:
+        """
+        :param duration_ns: Duration [ns]
+        :return: None
+        """
+        bucket = (duration_ns // HISTOGRAM_RESOLUTION_NS).bit_length()
+        self.counts[min(bucket, HISTOGRAM_BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, percentile: float) -> float:
+        """
+        :param percentile: Percentile [0, 100]
+        :return: Upper bound of the bucket which contains the percentile [ns] (exact maximum for the last bucket)
+        """
+        if self.count == 0:
+            return 0.0
+        rank = self.count * percentile / 100
+        cumulative = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank and bucket_count > 0:
+                return float(min(HISTOGRAM_RESOLUTION_NS << bucket, self.max_ns))
+        return float(self.max_ns)
+
+    def snapshot(self) -> dict:
+        """
+        :return: Summary of the histogram [ms] and its raw bucket counts
+        """
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ns / self.count / 1e6 if self.count > 0 else 0.0,
+            "p50_ms": self.percentile(50) / 1e6,
+            "p95_ms": self.percentile(95) / 1e6,
+            "p99_ms": self.percentile(99) / 1e6,
+            "max_ms": self.max_ns / 1e6,
+            "buckets": list(self.counts),
+        }
+
+
+class PipelineMetrics:
+    """
+    Timings of the stages of the acquisition and render pipeline (serial read, parsing, model update, rendering), of
+    reconnects, of alarm notifications and of the acknowledgements of commands, and counters of dropped and late
+    samples, of alarms, of commands and of dropped breaths. Stages may be recorded from several threads (e.g. the reader
+    threads of several devices).
+    """
+
+    # Known stages in pipeline order (frame_paint is the time from rendering a frame until Qt has painted it), followed
+    # by the recovery after a lost connection (time from the device reappearing to its first received samples, and gap
+    # between the last samples before and the first after the loss) and the time from the offending sample to showing
+    # its alarm in the main window, and the round-trip latency of commands sent to the Raspberry Pi Pico
+    STAGES = ("serial_read", "parse", "queue_latency", "model_append", "render_frame", "render_graph",
+              "frame_paint", "reconnect_latency", "data_gap", "alarm_latency", "command_rtt")
+
+    _histograms = dict
+    _counters = dict
+    _since = float
+    _lock = threading.Lock
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self._counters = {"samples": 0, "dropped_samples": 0, "late_samples": 0, "reconnects": 0, "alarms": 0,
+                          "commands": 0, "command_retries": 0, "command_failures": 0,
+                          "dropped_breaths": 0}
+        self._since = time.time()
+
+    def record(self, stage: str, duration_ns: int) -> None:
+        """
+        Record the duration of one pass through a pipeline stage.
+
+        :param stage: Stage name (see STAGES)
+        :param duration_ns: Duration [ns]
+        :return: None
+        """
+        with self._lock:
+            self._histograms[stage].record(duration_ns)
+
+    def count(self, counter: str, n: int = 1) -> None:
+        """
+        :param counter: Counter name ("samples", "dropped_samples", "late_samples", "reconnects", "alarms",
+        "commands", "command_retries" or "command_failures")
+        :param n: Increment
+        :return: None
+        """
+        with self._lock:
+            self._counters[counter] += n
+
+    def record_received(self, timestamps) -> None:
+        """
+        Record the latency between receiving a batch of samples and appending it to the model, and count late samples.
+
+        :param timestamps: Monotonic timestamps [ns] at which the samples were received
+        :return: None
+        """
+        now = time.monotonic_ns()
+        late = 0
+        if now - int(timestamps[0]) > LATE_SAMPLE_THRESHOLD_NS:
+            late = int((now - timestamps > LATE_SAMPLE_THRESHOLD_NS).sum())
+        with self._lock:
+            self._histograms["queue_latency"].record(max(now - int(timestamps[-1]), 0))
+            self._counters["samples"] += len(timestamps)
+            self._counters["late_samples"] += late
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        return self._histograms[stage]
+
+    def counter(self, counter: str) -> int:
+        return self._counters[counter]
+
+    def reset(self) -> None:
+        with self._lock:
+            for histogram in self._histograms.values():
+                histogram.reset()
+            self._counters = dict.fromkeys(self._counters, 0)
+            self._since = time.time()
+
+    def snapshot(self) -> dict:
+        """
+        :return: All histograms and counters since the last reset
+        """
+        with self._lock:
+            return {
+                "since": self._since,
+                "counters": dict(self._counters),
+                "stages": {stage: histogram.snapshot() for stage, histogram in self._histograms.items()},
+            }
+
+    def dump(self) -> str:
+        """
+        Log all histograms and counters.
+
+        :return: JSON representation of the metrics
+        """
+        dump = json.dumps(self.snapshot(), indent=2)
+        logging.info(f"Pipeline metrics: {dump}")
+        return dump
+
+
+class StartupProfile:
+    """
+    Durations of the phases of the application start (imports, construction of the main window, first paint, ...),
+    which are reported with --profile-startup. Every phase lasts from the end of the previous one to its mark.
+    """
+
+    _phases = list
+    _start_ns = int
+    _last_ns = int
+
+    def __init__(self):
+        self._phases = []
+        self._start_ns = self._last_ns = time.perf_counter_ns()
+
+    def mark(self, phase: str) -> None:
+        """
+        :param phase: Name of the phase which ends now
+        :return: None
+        """
+        now = time.perf_counter_ns()
+        self._phases.append((phase, now - self._last_ns))
+        self._last_ns = now
+
+    def report(self) -> str:
+        """
+        Log the durations of all phases.
+
+        :return: Table of the phases with their durations and the time since the start [ms]
+        """
+        lines = [f"{'Phase':<40} {'Duration':>10} {'Elapsed':>10}"]
+        elapsed = 0
+        for phase, duration in self._phases:
+            elapsed += duration
+            lines.append(f"{phase:<40} {duration / 1e6:>7.1f} ms {elapsed / 1e6:>7.1f} ms")
+        report = "\n".join(lines)
+        logging.info(f"Startup profile:\n{report}")
+        return report
+
+
+# Metrics of the pipeline of this process, shared by all threads
+pipeline_metrics = PipelineMetrics()
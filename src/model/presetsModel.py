@@ -1,6 +1,6 @@
+import os
 import logging
-from configparser import ConfigParser, DuplicateSectionError
-from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
 
 presets_filepath = "assets/respiration_presets.ini"
 
@@ -31,24 +31,104 @@ preset_key_translations = {
         "en": "Ratio I/E"
     }
 }
+# Keys of the values of every preset, in the order of the table columns
+PRESET_KEYS = tuple(preset_key_translations)
 
 
 class RespirationPresetsModel:
     """
     RespirationPresetsModel serves as a library for respiration presets and initially contains all presets (except
-    DEFAULT) from the presets file.
+    DEFAULT) from the presets file. The presets are kept in memory, indexed by name and in the order of the file, so
+    that looking up a preset doesn't depend on the size of the library. Every change is written to the presets file
+    atomically, i.e. a crash while saving leaves either the previous or the new library, never a corrupt file.
     """
 
-    # Safe presets in ConfigParser instance which makes the values accessible like in a dict
-    presets = ConfigParser
-
-    def __init__(self):
+    _filepath = str
+    # Comment block at the beginning of the presets file, which is preserved when the file is rewritten
+    _file_header = str
+    # Values of the DEFAULT section, which new presets start with
+    defaults = dict
+    # Values of every preset by name and preset names in the order of the table rows; values are kept as strings like
+    # in the presets file
+    _presets = dict
+    _names = list
+
+    def __init__(self, filepath: str = presets_filepath):
+        """
+        :param filepath: Path of the presets file
+        """
         logging.debug("Creating new respiration presets model")
-        self._load_presets_from_file(presets_filepath)
+        self._filepath = filepath
+        self._load_presets_from_file(filepath)
 
     def _load_presets_from_file(self, filepath: str) -> None:
-        self.presets = ConfigParser()
-        self.presets.read(filepath)
+        """
+        Read the presets file, which is an ini file with one section per preset. It's parsed line by line instead of
+        with a ConfigParser, which takes about a second for a library of thousands of presets because of its
+        interpolation and DEFAULT lookups.
+        """
+        sections = {}
+        self._file_header = ""
+        values = None
+        try:
+            with open(filepath, encoding="utf8") as presets_file:
+                for line in presets_file:
+                    stripped = line.strip()
+                    if values is None and (stripped == "" or stripped[0] in "#;"):
+                        self._file_header += line
+                    elif stripped == "" or stripped[0] in "#;":
+                        continue
+                    elif stripped[0] == "[" and stripped[-1] == "]":
+                        values = sections.setdefault(stripped[1:-1], {})
+                    elif values is not None:
+                        key, separator, value = stripped.partition("=")
+                        if separator == "":
+                            key, separator, value = stripped.partition(":")
+                        values[key.strip().lower()] = value.strip()
+        except OSError as error:
+            logging.error(f"Could not read respiration presets from {filepath}: {error}")
+
+        # Presets fall back to the DEFAULT values like in a ConfigParser
+        defaults = sections.pop("DEFAULT", {})
+        self.defaults = {key: defaults.get(key, "") for key in PRESET_KEYS}
+        self._presets = {name: {key: values.get(key, self.defaults[key]) for key in PRESET_KEYS}
+                         for name, values in sections.items()}
+        self._names = list(self._presets)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, identifier: str) -> bool:
+        return identifier in self._presets
+
+    @property
+    def names(self) -> list[str]:
+        """
+        :return: Names of all presets in the order of the table rows
+        """
+        return list(self._names)
+
+    def name(self, row: int) -> str:
+        """
+        :param row: Table row of the preset
+        :return: Name of the preset
+        """
+        return self._names[row]
+
+    def preset(self, identifier: str) -> dict[str, str]:
+        """
+        :param identifier: Name of the preset
+        :return: Copy of the preset's values by key (see PRESET_KEYS)
+        """
+        return dict(self._presets[identifier])
+
+    def value(self, identifier: str, key: str) -> str:
+        """
+        :param identifier: Name of the preset
+        :param key: Key of the value (see PRESET_KEYS)
+        :return: Value
+        """
+        return self._presets[identifier][key]
 
     def create_preset_entry(self, identifier: str, freq: float, p_min: float, p_max: float, vol_min: float,
                             vol_max: float, ie_ratio: float) -> bool:
@@ -65,44 +145,110 @@ class RespirationPresetsModel:
         :return: Success of preset entry creation
         """
 
+        values = (freq, p_min, p_max, vol_min, vol_max, ie_ratio)
+        if not self.insert_preset(identifier, dict(zip(PRESET_KEYS, values))):
+            return False
+        if not self.save():
+            # Keep the library consistent with the file
+            self.remove_preset(identifier)
+            return False
+        logging.info(f"Saved new respiration preset to {self._filepath}")
+        return True
+
+    def insert_preset(self, identifier: str, values: dict[str, float]) -> bool:
+        """
+        Append a new preset to the library without saving it.
+
+        :param identifier: Name of the new preset
+        :param values: Values of the new preset by key (see PRESET_KEYS)
+        :return: Success of inserting the preset
+        """
         # Check if entry to be created already exists
+        if not self.is_new_identifier(identifier):
+            logging.error(f"Preset could not be created: Entry {identifier} already exists or is invalid.")
+            return False
+        self._presets[identifier] = {key: str(values[key]) for key in PRESET_KEYS}
+        self._names.append(identifier)
+        logging.debug(f"Created new respiration preset {identifier}")
+        return True
+
+    def remove_preset(self, identifier: str) -> None:
+        """
+        Remove a preset from the library without saving it.
+
+        :param identifier: Name of the preset
+        :return: None
+        """
+        del self._presets[identifier]
+        self._names.remove(identifier)
+
+    def is_new_identifier(self, identifier: str) -> bool:
+        """
+        :param identifier: Name of a new preset
+        :return: Whether the name is valid and not used by another preset
+        """
+        return identifier.strip() != "" and identifier not in self._presets and identifier != "DEFAULT"
+
+    def modify_preset_entry(self, identifier: str, key: str, value: float) -> bool:
+        """
+        Modifies one value of an existing respiration preset and saves it in the preset file.
+
+        :param identifier: Name of the preset
+        :param key: Key of the value (see PRESET_KEYS)
+        :param value: New value
+        :return: Success of preset entry modification
+        """
+        if identifier not in self._presets or key not in PRESET_KEYS:
+            logging.error(f"Preset could not be modified: No value {key} of entry {identifier}.")
+            return False
+        previous_value = self._presets[identifier][key]
+        self._presets[identifier][key] = str(value)
+        if not self.save():
+            self._presets[identifier][key] = previous_value
+            return False
+        logging.info(f"Set {key} of respiration preset {identifier} to {value}")
+        return True
+
+    def save(self) -> bool:
+        """
+        Write all presets to the presets file. The presets are written to a temporary file next to the presets file,
+        which then replaces it.
+
+        :return: Success of saving the presets
+        """
+        # Sections are written like by a ConfigParser
+        lines = [self._file_header]
+        for name, values in (("DEFAULT", self.defaults), *self._presets.items()):
+            lines.append(f"[{name}]\n")
+            lines.extend(f"{key} = {values[key]}\n" for key in PRESET_KEYS)
+            lines.append("\n")
+        # No blank line after the last section
+        lines.pop()
+        temporary_filepath = f"{self._filepath}.tmp"
         try:
-            self.presets.add_section(identifier)
-            logging.debug(f"Created new respiration preset {identifier}")
-        except DuplicateSectionError:
-            logging.error(f"\nPreset could not be created: Entry {identifier} already exists in file.")
+            with open(file=temporary_filepath, mode="w", encoding="utf8") as presets_file:
+                presets_file.write("".join(lines))
+                presets_file.flush()
+                os.fsync(presets_file.fileno())
+            os.replace(temporary_filepath, self._filepath)
+        except OSError as error:
+            logging.error(f"Could not save respiration presets to {self._filepath}: {error}")
             return False
-        else:
-            # TODO Maybe add validation of the preset values?
-            self.presets[identifier]["frequency"] = str(freq)
-            self.presets[identifier]["pressure_min"] = str(p_min)
-            self.presets[identifier]["pressure_max"] = str(p_max)
-            self.presets[identifier]["volume_min"] = str(vol_min)
-            self.presets[identifier]["volume_max"] = str(vol_max)
-            self.presets[identifier]["i_to_e_ratio"] = str(ie_ratio)
-
-        # Write preset to file
-        logging.info(f"Saved new respiration preset to {presets_filepath}")
-        with open(file=presets_filepath, mode="w") as presets_file:
-            self.presets.write(fp=presets_file)
-            return True
-
-    # TODO Do we need this, or should presets be modified by "dict access"?
-    def modify_preset_entry(self):
-        pass
+        return True
 
 
 class PresetsTableModel(QAbstractTableModel):
     """
     PresetTableModel serves as a PyQt table data model based on QAbstractTableModel which can be easily integrated
     into a PyQt TableView. The methods of QAbstractTableModel are implemented in this class. The model in this class
-    is based on the "pure" RespiratorPresetsModel.
+    is based on the "pure" RespiratorPresetsModel, whose values are read directly instead of being copied into a table,
+    and all changes of presets are made through this model, which notifies the views about the changed rows and cells
+    only.
     """
 
     _raw_model = RespirationPresetsModel
     _lang = str
-    _table_model_rows = []
-    _table_headers_horizontal = []
+    _table_headers_horizontal = list
 
     def __init__(self, presets_model: RespirationPresetsModel, language: str = "de"):
         """
@@ -116,37 +262,48 @@ class PresetsTableModel(QAbstractTableModel):
 
         self._raw_model = presets_model  # This is not the model which is consumed by the TableView!
         self._lang = language
-
-        # Transform raw RespirationPresetsModel to two dimensional array and set the horizontal table headers
-        self._transform_model_to_data_array()
         self._set_horizontal_table_headers()
 
-    def _transform_model_to_data_array(self) -> None:
+    @property
+    def presets_model(self) -> RespirationPresetsModel:
+        return self._raw_model
+
+    def _set_horizontal_table_headers(self) -> None:
         """
-        Transforms the dict like presets model into a table like, two dimensional array, which can be accessed by the
-        TableView. The first element of each array row represents the table's vertical header entry.
+        Sets the table headers on the basis of the preset value identifiers according to the chosen language.
         """
-        for preset_name in self._raw_model.presets.sections():
-            # Append the vertical header (preset title) to the table row
-            table_row = [preset_name]
-            for preset_identifier in self._raw_model.presets[preset_name]:
-                # Append the preset values, which come in a fixed order (see RespirationPresetsModel or .ini file)
-                table_row.append(self._raw_model.presets[preset_name][preset_identifier])
-            # Append row to all table rows
-            self._table_model_rows.append(table_row)
+        self._table_headers_horizontal = [preset_key_translations[key][self._lang] for key in PRESET_KEYS]
 
-    def _set_horizontal_table_headers(self) -> None:
+    def add_preset(self, identifier: str, values: dict[str, str] = None) -> bool:
         """
-        Sets the table headers on the basis of the RespirationPresetsModel preset identifiers according to the chosen
-        language.
+        Create a new preset, which is appended as last table row.
+
+        :param identifier: Name of the new preset
+        :param values: Values of the new preset by key (see PRESET_KEYS); the DEFAULT values if not given
+        :return: Success of creating the preset
         """
-        # Get the first preset identifiers from the first preset (since all preset identifiers are the same for all
-        # presets)
-        preset_identifiers = self._raw_model.presets[self._raw_model.presets.sections()[0]]
-        for preset_id in preset_identifiers:
-            # Get the corresponding translation of the key-like preset value identifier
-            header = preset_key_translations[preset_id][self._lang]
-            self._table_headers_horizontal.append(header)
+        values = self._raw_model.defaults if values is None else values
+        try:
+            numbers = {key: float(values[key]) for key in PRESET_KEYS}
+        except (KeyError, ValueError) as error:
+            logging.error(f"Preset could not be created: Invalid value {error}")
+            return False
+        if not self._raw_model.is_new_identifier(identifier):
+            logging.error(f"Preset could not be created: Entry {identifier} already exists or is invalid.")
+            return False
+
+        row = len(self._raw_model)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._raw_model.insert_preset(identifier, numbers)
+        self.endInsertRows()
+        if not self._raw_model.save():
+            # Keep the library consistent with the file
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self._raw_model.remove_preset(identifier)
+            self.endRemoveRows()
+            return False
+        logging.info(f"Saved new respiration preset {identifier}")
+        return True
 
     """Implementation of QAbstractTableModel methods which are being called by Qt itself (arguments are also supplied
     by Qt when methods are being called/table is being built)."""
@@ -154,40 +311,61 @@ class PresetsTableModel(QAbstractTableModel):
     def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
         """
         This method is being called by the TableView to get the data to be displayed, including other data display
-        information if the data role is accordingly set and queried. The data is supposed to be returned as a two
-        dimensional array, and is accessed by the index parameter, representing a table cell.
+        information if the data role is accordingly set and queried. The data is looked up in the presets model by the
+        index parameter, representing a table cell.
 
         :param index: Table cell index
         :param role: Qt role with which the data information can be queried by the TableView (here only data to be
-        displayed)
+        displayed and edited)
         :return: Data at the queried table cell index
         """
-        if role == Qt.DisplayRole:
-            # Access the column data with offset of + 1, because the first column of each row represents the vertical
-            # header data which is returned by the headerData() method
-            return self._table_model_rows[index.row()][index.column() + 1]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._raw_model.value(self._raw_model.name(index.row()), PRESET_KEYS[index.column()])
 
         if role == Qt.TextAlignmentRole:
             # Align data in the middle of the cell
             return Qt.AlignHCenter + Qt.AlignVCenter
 
-    def rowCount(self, parent: QModelIndex = ...) -> int:
+    def setData(self, index: QModelIndex, value, role: int = Qt.EditRole) -> bool:
+        """
+        Overridden method which is called by the TableView when a table cell was edited. Only numbers are accepted.
+
+        :param index: Table cell index
+        :param value: Edited value
+        :param role: Qt role of the edited data
+        :return: Success of modifying the preset
+        """
+        if role != Qt.EditRole or not index.isValid():
+            return False
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            logging.error(f"Preset could not be modified: {value!r} is not a number")
+            return False
+        if not self._raw_model.modify_preset_entry(self._raw_model.name(index.row()), PRESET_KEYS[index.column()],
+                                                   number):
+            return False
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
         """
         Return the data/table row count.
 
         :param parent: Object's parent
         :return: Table row count
         """
-        return len(self._table_model_rows)
+        # Table models have no child rows
+        return 0 if parent.isValid() else len(self._raw_model)
 
-    def columnCount(self, parent: QModelIndex = ...) -> int:
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
         """
         Returns the data/table column count, without considering the vertical header column.
 
         :param parent: Object's parent
         :return: Table column count (without vertical header column).
         """
-        return len(self._table_model_rows[0]) - 1
+        return 0 if parent.isValid() else len(PRESET_KEYS)
 
     def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
         """
@@ -201,8 +379,8 @@ class PresetsTableModel(QAbstractTableModel):
             if orientation == Qt.Horizontal:
                 return self._table_headers_horizontal[section]
             elif orientation == Qt.Vertical:
-                # Return the first entry of the table rows, which contains the vertical header data
-                return self._table_model_rows[section][0]
+                # The vertical header contains the preset names
+                return self._raw_model.name(section)
 
     def flags(self, index: QModelIndex) -> Qt.ItemFlags:
         """
@@ -212,4 +390,24 @@ class PresetsTableModel(QAbstractTableModel):
         :param index: Index of the item for which the flags are valid
         :return: Qt ItemFlags for data at the specified table index
         """
-        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+
+class PresetsFilterProxyModel(QSortFilterProxyModel):
+    """
+    Proxy model between the PresetsTableModel and the TableView which only shows the presets whose names contain the
+    filter text (case-insensitive).
+    """
+
+    _filter_text = ""
+
+    def set_filter_text(self, text: str) -> None:
+        """
+        :param text: Filter text; all presets are shown if it's empty
+        :return: None
+        """
+        self._filter_text = text.strip().casefold()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        return self._filter_text in self.sourceModel().presets_model.name(source_row).casefold()
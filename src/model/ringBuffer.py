@@ -0,0 +1,116 @@
+import time
+import numpy as np
+
+# Offset for converting timestamps of the monotonic clock into UNIX epoch timestamps [ns]
+MONOTONIC_TO_EPOCH_OFFSET_NS = time.time_ns() - time.monotonic_ns()
+
+
+def to_epoch_seconds(timestamps: np.ndarray) -> np.ndarray:
+    """
+    Convert monotonic timestamps [ns] into UNIX epoch timestamps [s], e.g. for pyqtgraph's DateAxisItem.
+
+    :param timestamps: Monotonic timestamps [ns]
+    :return: UNIX epoch timestamps [s]
+    """
+    return (timestamps + MONOTONIC_TO_EPOCH_OFFSET_NS) * 1e-9
+
+
+def to_monotonic_ns(epoch_seconds: np.ndarray) -> np.ndarray:
+    """
+    Convert UNIX epoch timestamps [s] (e.g. a range of pyqtgraph's DateAxisItem) into monotonic timestamps [ns].
+
+    :param epoch_seconds: UNIX epoch timestamps [s]
+    :return: Monotonic timestamps [ns]
+    """
+    return (epoch_seconds * 1e9).astype(np.int64) - MONOTONIC_TO_EPOCH_OFFSET_NS
+
+
+class RingBuffer:
+    """
+    Columnar ring buffer for the samples of one sensor channel, consisting of a float64 value array and an int64
+    timestamp array (monotonic clock in ns).
+
+    Both arrays are preallocated with twice the capacity and every sample is written twice (at its index and mirrored
+    at index + capacity). That way the last N samples always lie contiguously in memory and can be returned as
+    zero-copy views. A view of the last N samples stays valid for at least (capacity - N) further appends; consumers
+    which want to keep the data for longer have to copy it.
+    """
+
+    _capacity = int
+    _values = np.ndarray
+    _timestamps = np.ndarray
+    # Position at which the next sample is written
+    _index = int
+    _length = int
+
+    def __init__(self, capacity: int):
+        """
+        :param capacity: Maximum number of samples kept in the buffer (oldest samples are overwritten)
+        """
+        self._capacity = capacity
+        self._values = np.zeros(2 * capacity, dtype=np.float64)
+        self._timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self._index = 0
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def extend(self, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """
+        Append a batch of samples to the buffer with vectorised slice assignments instead of a loop over the samples.
+
+        :param values: Sensor values
+        :param timestamps: Monotonic timestamps [ns] of the sensor values
+        :return: None
+        """
+        n = len(values)
+        if n > self._capacity:
+            # Only the youngest samples would survive anyway
+            values = values[-self._capacity:]
+            timestamps = timestamps[-self._capacity:]
+            n = self._capacity
+
+        i = self._index
+        first = min(n, self._capacity - i)
+        rest = n - first
+        for array, data in ((self._values, values), (self._timestamps, timestamps)):
+            array[i:i + first] = array[i + self._capacity:i + self._capacity + first] = data[:first]
+            if rest > 0:
+                # Wrap around to the beginning of the buffer
+                array[:rest] = array[self._capacity:self._capacity + rest] = data[first:]
+
+        self._index = (i + n) % self._capacity
+        self._length = min(self._length + n, self._capacity)
+
+    def values(self, n: int = None) -> np.ndarray:
+        """
+        :param n: Number of samples; all samples if not given
+        :return: Read-only view of the values of the last n samples (oldest first)
+        """
+        return self._last_n_view(self._values, n)
+
+    def timestamps(self, n: int = None) -> np.ndarray:
+        """
+        :param n: Number of samples; all samples if not given
+        :return: Read-only view of the monotonic timestamps [ns] of the last n samples (oldest first)
+        """
+        return self._last_n_view(self._timestamps, n)
+
+    def last_value(self) -> float:
+        """
+        :return: Value of the youngest sample
+        """
+        return float(self._values[self._index + self._capacity - 1])
+
+    def _last_n_view(self, array: np.ndarray, n: int = None) -> np.ndarray:
+        if n is None or n > self._length:
+            n = self._length
+        end = self._index + self._capacity
+        view = array[end - n:end]
+        view.flags.writeable = False
+        return view
@@ -0,0 +1,165 @@
+import math
+import numpy as np
+from typing import NamedTuple
+
+# Number of buckets into which the window of RollingStatistics is divided; the window slides in steps of one bucket
+STATISTICS_BUCKET_COUNT = 10
+
+
+class Statistics(NamedTuple):
+    """
+    Statistics of a channel's samples within the window of its RollingStatistics (NaN if the window is empty).
+    """
+    count: int
+    mean: float
+    minimum: float
+    maximum: float
+    std: float
+    # Exponentially weighted moving average over all samples
+    ewma: float
+
+
+class RollingStatistics:
+    """
+    Rolling mean, minimum, maximum and standard deviation of a channel's samples within a sliding time window, and an
+    exponentially weighted moving average. The window is divided into STATISTICS_BUCKET_COUNT time buckets, each
+    keeping the count, sum, sum of squares, minimum and maximum of its samples. A batch of samples only updates the
+    buckets it falls into (usually just the youngest one, which is kept open like in AggregateTier), and a query
+    combines the buckets, so neither depends on the number of samples in the window. The window slides in steps of one
+    bucket, i.e. it covers between (STATISTICS_BUCKET_COUNT - 1) and STATISTICS_BUCKET_COUNT bucket widths.
+    """
+
+    _bucket_width = int
+    _ewma_time_constant = int
+    # Bucket number (timestamp // bucket width) and aggregates of each complete bucket, stored at bucket number %
+    # bucket count
+    _ids = np.ndarray
+    _counts = np.ndarray
+    _sums = np.ndarray
+    _squared_sums = np.ndarray
+    _minima = np.ndarray
+    _maxima = np.ndarray
+    # Youngest bucket: number, count, sum, sum of squares, minimum and maximum of its samples
+    _open_bucket = int
+    _open_count = 0
+    _open_sum = float
+    _open_squared_sum = float
+    _open_minimum = float
+    _open_maximum = float
+    # Sums are taken of the differences to the first sample, so that the variance doesn't cancel out for large values
+    _offset = float
+    _ewma = float
+    _ewma_timestamp = int
+
+    def __init__(self, window: int, ewma_time_constant: int):
+        """
+        :param window: Width of the window [ns]
+        :param ewma_time_constant: Time constant of the exponentially weighted moving average [ns]
+        """
+        self._bucket_width = max(window // STATISTICS_BUCKET_COUNT, 1)
+        self._ewma_time_constant = ewma_time_constant
+        self._ids = np.full(STATISTICS_BUCKET_COUNT, -1, dtype=np.int64)
+        self._counts = np.zeros(STATISTICS_BUCKET_COUNT, dtype=np.int64)
+        self._sums = np.zeros(STATISTICS_BUCKET_COUNT)
+        self._squared_sums = np.zeros(STATISTICS_BUCKET_COUNT)
+        self._minima = np.full(STATISTICS_BUCKET_COUNT, math.inf)
+        self._maxima = np.full(STATISTICS_BUCKET_COUNT, -math.inf)
+        self._open_bucket = None
+        self._offset = None
+        self._ewma = math.nan
+        self._ewma_timestamp = None
+
+    @property
+    def window(self) -> int:
+        """
+        :return: Width of the window [ns]
+        """
+        return self._bucket_width * STATISTICS_BUCKET_COUNT
+
+    def extend(self, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """
+        Add a batch of samples.
+
+        :param values: Sensor values
+        :param timestamps: Monotonic timestamps [ns] of the sensor values (ascending)
+        :return: None
+        """
+        if len(values) == 0:
+            return
+        if self._offset is None:
+            self._offset = float(values[0])
+        self._extend_ewma(values, timestamps)
+
+        first_bucket = int(timestamps[0]) // self._bucket_width
+        if int(timestamps[-1]) // self._bucket_width == first_bucket:
+            # Usually the whole batch falls into the youngest bucket
+            self._add_to_open_bucket(first_bucket, values)
+            return
+
+        buckets = timestamps // self._bucket_width
+        # Start indices of the runs of samples which fall into the same bucket; buckets which are older than the window
+        # by the end of the batch are skipped
+        starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+        starts = starts[buckets[starts] > buckets[-1] - STATISTICS_BUCKET_COUNT]
+        for start, end in zip(starts, np.append(starts[1:], len(values))):
+            self._add_to_open_bucket(int(buckets[start]), values[start:end])
+
+    def _add_to_open_bucket(self, bucket: int, values: np.ndarray) -> None:
+        if bucket != self._open_bucket:
+            if self._open_bucket is not None:
+                self._close_open_bucket()
+            self._open_bucket = bucket
+            self._open_count = 0
+            self._open_sum = 0.0
+            self._open_squared_sum = 0.0
+            self._open_minimum = math.inf
+            self._open_maximum = -math.inf
+        deviations = values - self._offset
+        self._open_count += len(values)
+        self._open_sum += float(deviations.sum())
+        self._open_squared_sum += float(deviations.dot(deviations))
+        self._open_minimum = min(self._open_minimum, float(values.min()))
+        self._open_maximum = max(self._open_maximum, float(values.max()))
+
+    def _close_open_bucket(self) -> None:
+        slot = self._open_bucket % STATISTICS_BUCKET_COUNT
+        self._ids[slot] = self._open_bucket
+        self._counts[slot] = self._open_count
+        self._sums[slot] = self._open_sum
+        self._squared_sums[slot] = self._open_squared_sum
+        self._minima[slot] = self._open_minimum
+        self._maxima[slot] = self._open_maximum
+
+    def _extend_ewma(self, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """
+        Update the EWMA with a batch in closed form. Samples of a batch may share a timestamp (e.g. text lines of one
+        serial read), so the time since the previous batch is spread evenly over the batch's samples.
+        """
+        if self._ewma_timestamp is None:
+            self._ewma = float(values[0])
+            self._ewma_timestamp = int(timestamps[0])
+        interval = max(int(timestamps[-1]) - self._ewma_timestamp, 0) / len(values)
+        alpha = 1.0 - math.exp(-interval / self._ewma_time_constant)
+        self._ewma_timestamp = int(timestamps[-1])
+        if len(values) == 1:
+            self._ewma += alpha * (float(values[0]) - self._ewma)
+            return
+        # ewma_n = (1 - alpha)^n * ewma_0 + alpha * sum((1 - alpha)^(n - 1 - i) * x_i)
+        decays = (1.0 - alpha) ** np.arange(len(values) - 1, -1, -1)
+        self._ewma = (1.0 - alpha) * decays[0] * self._ewma + alpha * float(decays.dot(values))
+
+    def statistics(self) -> Statistics:
+        """
+        :return: Statistics of the samples in the window, which ends with the youngest bucket
+        """
+        if self._open_bucket is None:
+            return Statistics(0, math.nan, math.nan, math.nan, math.nan, self._ewma)
+        in_window = self._ids > self._open_bucket - STATISTICS_BUCKET_COUNT
+        count = self._open_count + int(self._counts[in_window].sum())
+        mean_deviation = (self._open_sum + float(self._sums[in_window].sum())) / count
+        squared_sum = self._open_squared_sum + float(self._squared_sums[in_window].sum())
+        variance = max(squared_sum / count - mean_deviation ** 2, 0.0)
+        return Statistics(count, self._offset + mean_deviation,
+                          min(self._open_minimum, float(self._minima[in_window].min(initial=math.inf))),
+                          max(self._open_maximum, float(self._maxima[in_window].max(initial=-math.inf))),
+                          math.sqrt(variance), self._ewma)
@@ -1,33 +1,12 @@
+import time
 import logging
-from collections import deque
-from datetime import datetime
+import numpy as np
 from PySide6.QtCore import QObject, Signal
-
-MAX_QUEUE_LENGTH = 1000
-
-
-# TODO somehow use this class to abstract signals from actual model
-class SensorModelSignals(QObject):
-    """
-    SensorModelSignals shall be used to inform controller/view about changes in the sensor data models.
-    """
-
-    modified_air_pressure_data = Signal
-    modified_air_temp_data = Signal
-    modified_animal_temp_data = Signal
-    modified_heatbed_temp_data = Signal
-    modified_eTVOC_data = Signal
-    modified_eCO2_data = Signal
-
-    def __init__(self):
-        super(SensorModelSignals, self).__init__()
-
-        self.modified_air_pressure_data = Signal(float)
-        self.modified_air_temp_data = Signal(float)
-        self.modified_animal_temp_data = Signal(float)
-        self.modified_heatbed_temp_data = Signal(float)
-        self.modified_eTVOC_data = Signal(float)
-        self.modified_eCO2_data = Signal(float)
+from src.model.channelHistory import ChannelHistory
+from src.model.rollingStatistics import Statistics
+from src.model.channelRegistry import ChannelSpec
+from src.model.sessionRecorder import SessionRecorder
+from src.model.metricsModel import pipeline_metrics
 
 
 class SensorDataModel(QObject):
@@ -36,143 +15,127 @@ class SensorDataModel(QObject):
     """
 
     # Signals
-    modified_air_pressure_data = Signal(deque)
-    modified_air_temp_data = Signal(deque)
-    modified_animal_temp_data = Signal(deque)
-    modified_heatbed_temp_data = Signal(deque)
-    modified_eTVOC_data = Signal(deque)
-    modified_eCO2_data = Signal(deque)
-    modified_relative_humidity_data = Signal(deque)
-
-    # Data queues
-    _air_pressure_data = deque
-    _air_temp_data = deque
-    _animal_temp_data = deque
-    _heatbed_temp_data = deque
-    _eCO2_data = deque
-    _eTVOC_data = deque
-    _relative_humidity_data = deque
-
-    _min_pressure_border = float
-    _max_pressure_border = float
-
-    def __init__(self):
-        """
-        The sensor data model consists of independent queues (of type collection.deque). That way reading one sensor
-        value from the queue does not depend on another value, which was recorded at the same time instance.
-        """
-        logging.debug("Creating new sensor data model")
-        super(SensorDataModel, self).__init__()
+    # Histories of all channels which were modified by a batch of samples by channel name
+    modified_channels = Signal(dict)
 
-        # deques with sensor data: tuple of (sensor value, datetime timestamp)
-        self._air_pressure_data = deque()
-        self._air_temp_data = deque()
-        self._animal_temp_data = deque()
-        self._heatbed_temp_data = deque()
-        self._eCO2_data = deque()
-        self._eTVOC_data = deque()
-        self._relative_humidity_data = deque()
+    # Channel histories by channel name
+    _channels = dict
+    # Channel names by wire index, i.e. by column of the samples sent by the Raspberry Pi Pico
+    _wire_channels = list
 
-        # Borders for pressure alarm
-        self._min_pressure_border = float()
-        self._max_pressure_border = float()
+    # Optional recorder which streams every sample to disk
+    _recorder = SessionRecorder
 
-    # Global getters and setters
-
-    @property
-    def air_pressure_data(self) -> deque:
-        return self._air_pressure_data
-
-    @air_pressure_data.setter
-    def air_pressure_data(self, data: float):
-        self._cut_long_queue(self._air_pressure_data, MAX_QUEUE_LENGTH)
-        self._air_pressure_data.append((data, datetime.now()))
-        self.modified_air_pressure_data.emit(self._air_pressure_data)
+    def __init__(self, channels: list[ChannelSpec]):
+        """
+        The sensor data model consists of independent channel histories, each with a preallocated ring buffer of the
+        raw samples and downsampled tiers (see ChannelHistory). That way reading one sensor value from a buffer does not
+        depend on another value, which was recorded at the same time instance.
 
-    @property
-    def air_temp_data(self) -> deque:
-        return self._air_temp_data
+        :param channels: Sensor channels of the channel registry
+        """
+        logging.debug("Creating new sensor data model")
+        super(SensorDataModel, self).__init__()
+        self._recorder = None
 
-    @air_temp_data.setter
-    def air_temp_data(self, data: float):
-        self._cut_long_queue(self._air_temp_data, MAX_QUEUE_LENGTH)
-        self._air_temp_data.append((data, datetime.now()))
-        self.modified_air_temp_data.emit(self._air_temp_data)
+        # Histories of the sensor data: columns of sensor values and monotonic timestamps [ns]
+        self._channels = {
+            channel.name: ChannelHistory(channel.capacity, channel.statistics_window, channel.ewma_time_constant)
+            for channel in channels
+        }
+        wire_channels = sorted((channel.wire_index, channel.name) for channel in channels
+                               if channel.wire_index is not None)
+        self._wire_channels = [name for _, name in wire_channels]
 
     @property
-    def animal_temp_data(self) -> deque:
-        return self._animal_temp_data
-
-    @animal_temp_data.setter
-    def animal_temp_data(self, data: float):
-        self._cut_long_queue(self._animal_temp_data, MAX_QUEUE_LENGTH)
-        self._animal_temp_data.append((data, datetime.now()))
-        self.modified_animal_temp_data.emit(self._animal_temp_data)
+    def channel_names(self) -> list[str]:
+        return list(self._channels)
 
     @property
-    def heatbed_temp_data(self) -> deque:
-        return self._heatbed_temp_data
-
-    @heatbed_temp_data.setter
-    def heatbed_temp_data(self, data: float):
-        self._cut_long_queue(self._heatbed_temp_data, MAX_QUEUE_LENGTH)
-        self._heatbed_temp_data.append((data, datetime.now()))
-        self.modified_heatbed_temp_data.emit(self.heatbed_temp_data)
+    def wire_channel_names(self) -> list[str]:
+        """
+        :return: Names of the channels sent by the Raspberry Pi Pico in the order of their values in a sample
+        """
+        return list(self._wire_channels)
 
     @property
-    def eCO2_data(self) -> deque:
-        return self._eCO2_data
-
-    @eCO2_data.setter
-    def eCO2_data(self, data: float):
-        self._cut_long_queue(self._eCO2_data, MAX_QUEUE_LENGTH)
-        self._eCO2_data.append((data, datetime.now()))
-        self.modified_eCO2_data.emit(self._eCO2_data)
+    def wire_value_count(self) -> int:
+        """
+        :return: Number of sensor values in a sample sent by the Raspberry Pi Pico
+        """
+        return len(self._wire_channels)
 
-    @property
-    def eTVOC_data(self) -> deque:
-        return self._eTVOC_data
+    def channel(self, name: str) -> ChannelHistory:
+        """
+        :param name: Channel name (e.g. "air_pressure")
+        :return: History of the channel
+        """
+        return self._channels[name]
 
-    @eTVOC_data.setter
-    def eTVOC_data(self, data: float):
-        self._cut_long_queue(self._eTVOC_data, MAX_QUEUE_LENGTH)
-        self._eTVOC_data.append((data, datetime.now()))
-        self.modified_eTVOC_data.emit(self._eTVOC_data)
+    def statistics(self, name: str) -> Statistics:
+        """
+        :param name: Channel name
+        :return: Rolling statistics of the channel's recent samples
+        """
+        return self._channels[name].statistics.statistics()
 
-    @property
-    def relative_humidity_data(self) -> deque:
-        return self._relative_humidity_data
+    def snapshot(self) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """
+        Copy the raw samples of all channels, e.g. for exporting them in another thread while new samples are appended.
 
-    @relative_humidity_data.setter
-    def relative_humidity_data(self, data: float):
-        self._cut_long_queue(self._relative_humidity_data, MAX_QUEUE_LENGTH)
-        self._relative_humidity_data.append((data, datetime.now()))
-        self.modified_relative_humidity_data.emit(self._relative_humidity_data)
+        :return: Tuples of (values, monotonic timestamps [ns]) by channel name
+        """
+        return {name: (channel.raw.values().copy(), channel.raw.timestamps().copy())
+                for name, channel in self._channels.items()}
 
-    @property
-    def min_pressure_border(self) -> float:
-        return self._min_pressure_border
+    def set_recorder(self, recorder: SessionRecorder | None) -> None:
+        """
+        Set the recorder to which every sample appended to the model is streamed.
 
-    @min_pressure_border.setter
-    def min_pressure_border(self, min_pressure: float):
-        self._min_pressure_border = min_pressure
+        :param recorder: Session recorder; None to stop recording
+        :return: None
+        """
+        self._recorder = recorder
 
-    @property
-    def max_pressure_border(self) -> float:
-        return self._max_pressure_border
+    def append_frames(self, values: np.ndarray, timestamps: np.ndarray,
+                      derived_samples: dict[str, tuple[np.ndarray, np.ndarray]] = None) -> None:
+        """
+        Append a batch of samples as sent by the Raspberry Pi Pico, i.e. one column per channel with a wire index.
 
-    @max_pressure_border.setter
-    def max_pressure_border(self, max_pressure: float):
-        self._max_pressure_border = max_pressure
+        :param values: Sensor values with shape (number of samples, wire_value_count)
+        :param timestamps: Monotonic timestamps [ns] of the samples
+        :param derived_samples: Samples of derived channels which are appended with the batch, see append_samples()
+        :return: None
+        """
+        samples = {name: (values[:, column], timestamps) for column, name in enumerate(self._wire_channels)}
+        if derived_samples:
+            samples.update(derived_samples)
+        self.append_samples(samples)
 
-    @staticmethod
-    def _cut_long_queue(queue: deque, max_queue_length: int) -> None:
+    def append_samples(self, samples: dict[str, tuple[np.ndarray, np.ndarray]]) -> None:
         """
-        Shortens a deque type queue in case it exceeds a maximum length (oldest queue entry is being removed).
+        Append a batch of samples to several channels at once. The modified_channels signal is emitted only once per
+        batch instead of once per sample and channel.
 
-        :param queue: Deque type queue
-        :param max_queue_length: Maximum allowed length of the queue
+        :param samples: Tuples of (values, monotonic timestamps [ns]) by channel name (e.g. "air_pressure"); unknown
+        channels (e.g. of a replayed session with other channels) are ignored
         :return: None
         """
-        if len(queue) > max_queue_length:
-            queue.popleft()
+        start = time.perf_counter_ns()
+        modified = {}
+        for channel, (values, timestamps) in samples.items():
+            if len(values) == 0 or channel not in self._channels:
+                continue
+            if len(modified) == 0:
+                # Channels of one batch are usually received together, so the first one stands for the batch
+                pipeline_metrics.record_received(timestamps)
+            history = self._channels[channel]
+            history.extend(values, timestamps)
+            modified[channel] = history
+            if self._recorder is not None:
+                self._recorder.record(channel, values, timestamps)
+        pipeline_metrics.record("model_append", time.perf_counter_ns() - start)
+
+        # Emit the signal after all channels have been updated, so that consumers see a consistent model
+        if len(modified) > 0:
+            self.modified_channels.emit(modified)
@@ -0,0 +1,247 @@
+import os
+import mmap
+import queue
+import struct
+import logging
+import threading
+from zlib import crc32
+from typing import Iterator, NamedTuple
+import numpy as np
+from src.model.ringBuffer import MONOTONIC_TO_EPOCH_OFFSET_NS
+
+# Session file format (little-endian). All samples are appended in chunks, every chunk holds the samples of one
+# channel. Chunks are self-describing, so the index of the file is rebuilt from the chunk headers when it is opened and
+# nothing has to be written when the session ends. Data after the last complete chunk (e.g. after a power loss) is
+# ignored by the reader. All arrays are 8 byte aligned, so they can be memory-mapped.
+#
+# +--------------+----------------+------------------------------------------------------------+
+# |  Part        |  Type          |  Description                                               |
+# +--------------+----------------+------------------------------------------------------------+
+# | File header  |  8s I H H q    |  Magic, header size, version, channel count, epoch offset  |
+# |              |  bytes         |  Channel names (UTF-8, separated by "\n", zero padded)     |
+# | Chunk header |  4s H H I I    |  Magic, channel index, reserved, sample count, CRC-32      |
+# | Chunk data   |  int64[count]  |  Monotonic timestamps [ns]                                 |
+# |              |  float64[count]|  Sensor values                                             |
+# +--------------+----------------+------------------------------------------------------------+
+
+SESSION_FILE_MAGIC = b"RSPSESS1"
+SESSION_FILE_VERSION = 1
+CHUNK_MAGIC = b"CHNK"
+FILE_HEADER = struct.Struct("<8sIHHq")
+CHUNK_HEADER = struct.Struct("<4sHHII")
+# Alignment of the header and the chunk arrays [bytes]
+ALIGNMENT = 8
+# Interval in which recorded samples are written to disk [s]
+FLUSH_INTERVAL = 1.0
+
+
+class ChunkIndexEntry(NamedTuple):
+    """
+    Position of one chunk in a session file.
+    """
+    channel: str
+    count: int
+    # Offset of the timestamp array in the file [bytes]
+    offset: int
+
+
+class SessionRecorder:
+    """
+    SessionRecorder streams every sample of the SensorDataModel to an append-only session file. Recording only puts
+    the samples into a queue; a background thread writes them in chunks and syncs the file to disk once per
+    FLUSH_INTERVAL, so that disk I/O never stalls the GUI.
+    """
+
+    _filepath = str
+    _channel_indices = dict
+    _queue = queue.SimpleQueue
+    _stop_event = threading.Event
+    _writer_thread = threading.Thread
+
+    def __init__(self, filepath: str, channel_names: list[str]):
+        """
+        :param filepath: Path of the session file to be created
+        :param channel_names: Names of all channels which can be recorded
+        """
+        logging.debug(f"Creating new session recorder for {filepath}")
+        self._filepath = filepath
+        self._channel_indices = {name: index for index, name in enumerate(channel_names)}
+        self._queue = queue.SimpleQueue()
+        self._stop_event = threading.Event()
+
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        self._file = open(filepath, mode="xb")
+        self._write_file_header(channel_names)
+
+        self._writer_thread = threading.Thread(target=self._write_loop, name="SessionRecorder", daemon=True)
+        self._writer_thread.start()
+        logging.info(f"Recording session to {filepath}")
+
+    @property
+    def filepath(self) -> str:
+        return self._filepath
+
+    def record(self, channel: str, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """
+        Queue samples of one channel to be written to the session file.
+
+        :param channel: Channel name
+        :param values: Sensor values
+        :param timestamps: Monotonic timestamps [ns] of the sensor values
+        :return: None
+        """
+        self._queue.put((self._channel_indices[channel], np.ascontiguousarray(values, dtype=np.float64),
+                         np.ascontiguousarray(timestamps, dtype=np.int64)))
+
+    def close(self) -> None:
+        """
+        Write all queued samples and close the session file.
+
+        :return: None
+        """
+        if self._writer_thread.is_alive():
+            self._stop_event.set()
+            self._writer_thread.join()
+            self._file.close()
+            logging.info(f"Closed session recording {self._filepath}")
+
+    def _write_file_header(self, channel_names: list[str]) -> None:
+        names = "\n".join(channel_names).encode("utf8")
+        header_size = _align(FILE_HEADER.size + len(names))
+        self._file.write(FILE_HEADER.pack(SESSION_FILE_MAGIC, header_size, SESSION_FILE_VERSION, len(channel_names),
+                                          MONOTONIC_TO_EPOCH_OFFSET_NS))
+        self._file.write(names.ljust(header_size - FILE_HEADER.size, b"\0"))
+        self._sync()
+
+    def _write_loop(self) -> None:
+        while not self._stop_event.wait(FLUSH_INTERVAL):
+            self._write_queued_samples()
+        self._write_queued_samples()
+
+    def _write_queued_samples(self) -> None:
+        # Merge all queued samples per channel, so that every flush writes at most one chunk per channel
+        batches = {}
+        while True:
+            try:
+                channel_index, values, timestamps = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batches.setdefault(channel_index, []).append((values, timestamps))
+
+        if len(batches) == 0:
+            return
+        try:
+            for channel_index, samples in batches.items():
+                values = np.concatenate([values for values, _ in samples])
+                timestamps = np.concatenate([timestamps for _, timestamps in samples])
+                payload = timestamps.tobytes() + values.tobytes()
+                self._file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, channel_index, 0, len(values), crc32(payload)))
+                self._file.write(payload)
+            self._sync()
+        except OSError as error:
+            logging.error(f"Could not write samples to session file {self._filepath}: {error}")
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+
+class SessionReader:
+    """
+    SessionReader memory-maps a session file which was written by the SessionRecorder. Samples are returned as
+    zero-copy views of the file.
+    """
+
+    channel_names = list
+    epoch_offset_ns = int
+    chunks = list
+
+    def __init__(self, filepath: str):
+        """
+        :param filepath: Path of the session file
+        :raises ValueError: File is not a session file
+        """
+        logging.debug(f"Opening session file {filepath}")
+        with open(filepath, mode="rb") as session_file:
+            self._mmap = mmap.mmap(session_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_size, self.channel_names, self.epoch_offset_ns = _parse_file_header(self._mmap, filepath)
+        self.chunks = self._build_index(header_size)
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def iter_chunks(self, channels: list[str] = None) -> Iterator[tuple[str, np.ndarray, np.ndarray]]:
+        """
+        Iterate over the chunks of the session in the order in which they were recorded.
+
+        :param channels: Channel names to be included; all channels if not given
+        :return: Iterator of tuples (channel name, monotonic timestamps [ns], values)
+        """
+        for chunk in self.chunks:
+            if channels is None or chunk.channel in channels:
+                yield chunk.channel, *self._chunk_arrays(chunk)
+
+    def _chunk_arrays(self, chunk: ChunkIndexEntry) -> tuple[np.ndarray, np.ndarray]:
+        timestamps = np.frombuffer(self._mmap, dtype=np.int64, count=chunk.count, offset=chunk.offset)
+        values = np.frombuffer(self._mmap, dtype=np.float64, count=chunk.count, offset=chunk.offset + 8 * chunk.count)
+        return timestamps, values
+
+    def _build_index(self, offset: int) -> list[ChunkIndexEntry]:
+        """
+        Walk the chunk headers and stop at the first incomplete or corrupt chunk.
+
+        :param offset: Offset of the first chunk [bytes]
+        :return: Index of all valid chunks
+        """
+        chunks = []
+        while offset + CHUNK_HEADER.size <= len(self._mmap):
+            magic, channel_index, _reserved, count, checksum = CHUNK_HEADER.unpack_from(self._mmap, offset)
+            data_offset = offset + CHUNK_HEADER.size
+            data_end = data_offset + 16 * count
+            if magic != CHUNK_MAGIC or channel_index >= len(self.channel_names) or data_end > len(self._mmap):
+                break
+            if crc32(self._mmap[data_offset:data_end]) != checksum:
+                break
+            chunks.append(ChunkIndexEntry(self.channel_names[channel_index], count, data_offset))
+            offset = data_end
+
+        if offset < len(self._mmap):
+            logging.warning(f"Ignoring {len(self._mmap) - offset} bytes after the last complete chunk of session file")
+        return chunks
+
+
+def read_channel_names(filepath: str) -> list[str]:
+    """
+    Read the channel names of a session file from its file header only. Unlike opening a SessionReader, the chunks
+    aren't indexed (which reads the whole file), so this is cheap for sessions of any length.
+
+    :param filepath: Path of the session file
+    :return: Channel names
+    :raises ValueError: File is not a session file
+    """
+    with open(filepath, mode="rb") as session_file:
+        header = session_file.read(FILE_HEADER.size)
+        if len(header) == FILE_HEADER.size:
+            header += session_file.read(max(FILE_HEADER.unpack(header)[1] - FILE_HEADER.size, 0))
+    return _parse_file_header(header, filepath)[1]
+
+
+def _parse_file_header(buffer, filepath: str) -> tuple[int, list[str], int]:
+    """
+    :param buffer: Buffer starting with the file header of a session file
+    :param filepath: Path of the session file, for error messages
+    :return: Tuple of (header size [bytes], channel names, epoch offset [ns])
+    :raises ValueError: Buffer doesn't start with the file header of a session file
+    """
+    if len(buffer) < FILE_HEADER.size:
+        raise ValueError(f"{filepath} is not a session file")
+    magic, header_size, _version, channel_count, epoch_offset_ns = FILE_HEADER.unpack_from(buffer)
+    if magic != SESSION_FILE_MAGIC:
+        raise ValueError(f"{filepath} is not a session file")
+    names = bytes(buffer[FILE_HEADER.size:header_size]).rstrip(b"\0").decode("utf8")
+    return header_size, names.split("\n")[:channel_count], epoch_offset_ns
+
+
+def _align(size: int) -> int:
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def min_max_decimation_indices(values: np.ndarray, bins: int) -> np.ndarray:
+    """
+    Level-of-detail reduction for plotting: the values are split into (equally sized) bins and only the minimum and the
+    maximum of each bin are kept, in the order in which they occur. Unlike plain subsampling this preserves peaks, e.g.
+    pressure peaks, no matter how far the graph is zoomed out.
+
+    :param values: Values to be plotted
+    :param bins: Number of bins, typically the pixel width of the plot
+    :return: Sorted indices of the values to be plotted (at most ~2 * bins)
+    """
+    n = len(values)
+    if n <= 2 * bins:
+        return np.arange(n)
+
+    bin_size = n // bins
+    main = bin_size * bins
+    blocks = values[:main].reshape(bins, bin_size)
+    offsets = np.arange(bins) * bin_size
+    extrema = np.stack((blocks.argmin(axis=1) + offsets, blocks.argmax(axis=1) + offsets), axis=1)
+    indices = [np.sort(extrema, axis=1).ravel()]
+
+    if main < n:
+        # Remaining values which don't fill a whole bin form one additional bin
+        tail = values[main:]
+        indices.append(np.sort([main + tail.argmin(), main + tail.argmax()]))
+    # Always keep the youngest value, so that the graph ends at the current value
+    indices.append([n - 1])
+    return np.unique(np.concatenate(indices))
@@ -0,0 +1,166 @@
+import logging
+from PySide6.QtCore import QDateTime, Qt, Signal
+from PySide6.QtWidgets import QCheckBox, QComboBox, QDateTimeEdit, QFileDialog, QFormLayout, QHBoxLayout, QLineEdit, \
+    QListWidget, QListWidgetItem, QMessageBox, QProgressBar, QPushButton, QRadioButton, QVBoxLayout, QWidget
+
+# File name filters of the export formats (see EXPORT_FORMATS of the ExportWorker)
+# TODO add translations
+export_format_filters = {
+    "csv": "CSV-Dateien (*.csv)",
+    "npz": "NumPy-Archive (*.npz)",
+}
+
+
+class ExportViewWindow(QWidget):
+    """
+    Window for exporting the current device session or a recorded session file, filtered by channel and time range.
+    """
+    # TODO add translations
+
+    # Signals
+    # Path of the session file which was selected as source
+    session_file_selected = Signal(str)
+
+    def __init__(self):
+        logging.debug("Initialising export view window")
+        super(ExportViewWindow, self).__init__()
+        self.setWindowTitle("Sitzung exportieren")
+        self.setMinimumSize(450, 450)
+
+        self._build_export_view_window()
+
+    def _build_export_view_window(self):
+        main_layout = QVBoxLayout()
+        self.setLayout(main_layout)
+        form_layout = QFormLayout()
+        main_layout.addLayout(form_layout)
+
+        # Source: the device session of the selected tab or a recorded session file
+        self.current_session_button = QRadioButton("Aktuelle Sitzung")
+        self.current_session_button.setChecked(True)
+        self.session_file_button = QRadioButton("Sitzungsdatei")
+        self.session_file_edit = QLineEdit()
+        self.session_file_edit.setReadOnly(True)
+        self.browse_session_file_button = QPushButton("Durchsuchen...")
+        self.browse_session_file_button.clicked.connect(self._browse_session_file)
+        session_file_layout = QHBoxLayout()
+        session_file_layout.addWidget(self.session_file_button)
+        session_file_layout.addWidget(self.session_file_edit)
+        session_file_layout.addWidget(self.browse_session_file_button)
+        source_layout = QVBoxLayout()
+        source_layout.addWidget(self.current_session_button)
+        source_layout.addLayout(session_file_layout)
+        form_layout.addRow("Quelle", source_layout)
+
+        self.channel_list = QListWidget()
+        form_layout.addRow("Kanäle", self.channel_list)
+
+        # Time range, all samples are exported if it isn't enabled
+        self.time_range_checkbox = QCheckBox("Nur Zeitraum")
+        self.start_edit = QDateTimeEdit(QDateTime.currentDateTime().addSecs(-3600))
+        self.end_edit = QDateTimeEdit(QDateTime.currentDateTime())
+        for edit in (self.start_edit, self.end_edit):
+            edit.setDisplayFormat("dd.MM.yyyy HH:mm:ss")
+            edit.setCalendarPopup(True)
+            edit.setEnabled(False)
+            self.time_range_checkbox.toggled.connect(edit.setEnabled)
+        time_range_layout = QHBoxLayout()
+        time_range_layout.addWidget(self.time_range_checkbox)
+        time_range_layout.addWidget(self.start_edit)
+        time_range_layout.addWidget(self.end_edit)
+        form_layout.addRow("Zeitraum", time_range_layout)
+
+        self.format_combo_box = QComboBox()
+        for export_format, file_filter in export_format_filters.items():
+            self.format_combo_box.addItem(file_filter, export_format)
+        form_layout.addRow("Format", self.format_combo_box)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1000)
+        main_layout.addWidget(self.progress_bar)
+
+        # Buttons for handling the export
+        button_layout = QHBoxLayout()
+        self.export_button = QPushButton("Exportieren...")
+        self.cancel_button = QPushButton("Abbrechen")
+        self.cancel_button.setEnabled(False)
+        button_layout.addWidget(self.cancel_button)
+        button_layout.addWidget(self.export_button)
+        main_layout.addLayout(button_layout)
+
+    def _browse_session_file(self) -> None:
+        filepath, _ = QFileDialog.getOpenFileName(self, "Sitzungsdatei öffnen", "assets/sessions",
+                                                  "Sitzungsdateien (*.rsr)")
+        if filepath:
+            self.session_file_edit.setText(filepath)
+            self.session_file_button.setChecked(True)
+            self.session_file_selected.emit(filepath)
+
+    def set_channels(self, channel_names: list[str]) -> None:
+        """
+        Show the channels of the source, which are all selected.
+
+        :param channel_names: Channel names
+        :return: None
+        """
+        self.channel_list.clear()
+        for name in channel_names:
+            item = QListWidgetItem(name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            self.channel_list.addItem(item)
+
+    def selected_channels(self) -> list[str]:
+        return [self.channel_list.item(row).text() for row in range(self.channel_list.count())
+                if self.channel_list.item(row).checkState() == Qt.Checked]
+
+    def session_filepath(self) -> str | None:
+        """
+        :return: Path of the selected session file; None if the current device session is exported
+        """
+        if self.session_file_button.isChecked() and self.session_file_edit.text():
+            return self.session_file_edit.text()
+        return None
+
+    def time_range(self) -> tuple[int, int] | None:
+        """
+        :return: Tuple of (start, end) UNIX epoch timestamps [ns]; None if all samples are exported
+        """
+        if not self.time_range_checkbox.isChecked():
+            return None
+        return self.start_edit.dateTime().toMSecsSinceEpoch() * 1_000_000, \
+            self.end_edit.dateTime().toMSecsSinceEpoch() * 1_000_000
+
+    def export_format(self) -> str:
+        return self.format_combo_box.currentData()
+
+    def ask_target_filepath(self) -> str | None:
+        """
+        :return: Path of the exported file chosen by the user; None if the user cancelled
+        """
+        export_format = self.export_format()
+        filepath, _ = QFileDialog.getSaveFileName(self, "Exportieren als", f"export.{export_format}",
+                                                  export_format_filters[export_format])
+        return filepath or None
+
+    def set_exporting(self, exporting: bool) -> None:
+        """
+        :param exporting: Whether an export is running, during which the settings can't be changed
+        :return: None
+        """
+        self.export_button.setEnabled(not exporting)
+        self.cancel_button.setEnabled(exporting)
+        if exporting:
+            self.progress_bar.setValue(0)
+
+    def show_progress(self, exported: int, total: int) -> None:
+        """
+        :param exported: Number of exported samples
+        :param total: Number of samples to be exported
+        :return: None
+        """
+        self.progress_bar.setValue(self.progress_bar.maximum() if total == 0 else
+                                   int(self.progress_bar.maximum() * exported / total))
+
+    def show_error(self, message: str) -> None:
+        QMessageBox.warning(self, "Export fehlgeschlagen", message)
@@ -0,0 +1,97 @@
+import logging
+from PySide6.QtCore import Slot
+from PySide6.QtWidgets import QGridLayout, QWidget
+from src.model.channelRegistry import ChannelSpec
+from src.view.instrumentView import NumericalInstrument, GraphInstrument, SharedGraphInstrument
+from src.view.renderScheduler import RenderScheduler
+
+
+class InstrumentPanel(QWidget):
+    """
+    Panel containing the numerical and graph instruments of the sensor data of one device. One numerical and one graph
+    instrument are generated for every channel of the channel registry. Alternatively the graphs of all channels are
+    shown on one shared canvas next to the numerical instruments (see set_shared_canvas()).
+    """
+
+    render_scheduler = RenderScheduler
+    # Tuples of (numerical instrument, graph instrument) by channel name
+    instruments = dict
+    # Graphs of all channels with a shared time axis; None until the shared canvas is shown for the first time
+    shared_graph = SharedGraphInstrument
+    _channels = list
+    # Latest histories of all channels by channel name, with which the shared canvas is filled when it's built
+    _histories = dict
+
+    def __init__(self, render_scheduler: RenderScheduler, channels: list[ChannelSpec], parent: QWidget = None):
+        """
+        :param render_scheduler: Scheduler which repaints the instruments
+        :param channels: Sensor channels of the channel registry
+        :param parent: Parent widget
+        """
+        logging.debug("Initialise instrument panel")
+        super(InstrumentPanel, self).__init__(parent)
+        self.render_scheduler = render_scheduler
+        self.instruments = {}
+        self.shared_graph = None
+        self._channels = channels
+        self._histories = {}
+
+        # Grid layout to nicely place the numerical instruments inside the panel
+        self.num_instruments_layout = QGridLayout()
+        self.num_instruments_layout.setSpacing(0)
+        self.setLayout(self.num_instruments_layout)
+
+        self._build_instrument_view(channels)
+
+    def _build_instrument_view(self, channels: list[ChannelSpec]):
+        """
+        Builds the numerical and graph instruments of the panel. Each channel takes two grid columns, the numerical
+        instrument followed by the graph instrument.
+        """
+        # TODO add translations
+        logging.debug("Creating instrument widgets")
+        for channel in channels:
+            numerical_instrument = NumericalInstrument(channel.title, self.render_scheduler, channel.display)
+            graph_instrument = GraphInstrument(self.render_scheduler)
+            self.num_instruments_layout.addWidget(numerical_instrument, channel.row, 2 * channel.column)
+            self.num_instruments_layout.addWidget(graph_instrument, channel.row, 2 * channel.column + 1)
+            self.instruments[channel.name] = (numerical_instrument, graph_instrument)
+
+    def set_shared_canvas(self, shared: bool) -> None:
+        """
+        Switch between one graph instrument per channel and the graphs of all channels on one shared canvas, which is
+        placed next to the numerical instruments.
+
+        :param shared: Whether the graphs are shown on the shared canvas
+        :return: None
+        """
+        logging.debug(f"{'Showing' if shared else 'Hiding'} shared canvas of instrument panel")
+        if shared and self.shared_graph is None:
+            # The canvas is only built when it's needed, so that the panel is created as fast as before
+            self.shared_graph = SharedGraphInstrument(self._channels, self.render_scheduler)
+            # The canvas spans all rows of the column after the numerical instruments
+            column = 2 * max(channel.column for channel in self._channels) + 2
+            rows = self.num_instruments_layout.rowCount()
+            self.num_instruments_layout.addWidget(self.shared_graph, 0, column, rows, 1)
+            self.num_instruments_layout.setColumnStretch(column, 1)
+            self.shared_graph.on_modified_channels(self._histories)
+        # Hidden instruments are skipped by the render scheduler, so the hidden graphs don't cost any paint time
+        for _, graph_instrument in self.instruments.values():
+            graph_instrument.setVisible(not shared)
+        if self.shared_graph is not None:
+            self.shared_graph.setVisible(shared)
+
+    @Slot(dict)
+    def on_modified_channels(self, channels: dict) -> None:
+        """
+        Schedule repainting the instruments of all modified channels.
+
+        :param channels: Histories of the modified channels by channel name
+        :return: None
+        """
+        self._histories.update(channels)
+        for name, history in channels.items():
+            for instrument in self.instruments.get(name, ()):
+                instrument.on_modified_data(history)
+        if self.shared_graph is not None:
+            self.shared_graph.on_modified_channels(channels)
@@ -1,30 +1,119 @@
 import time
 import logging
-from collections import deque
 from PySide6.QtCore import QSize, Slot
 from PySide6.QtWidgets import QLCDNumber, QLabel, QVBoxLayout, QWidget, QSizePolicy
-from pyqtgraph import PlotWidget, PlotItem, PlotDataItem, DateAxisItem
+import numpy as np
+from typing import TYPE_CHECKING
+from src.model.ringBuffer import to_epoch_seconds, to_monotonic_ns
+from src.model.channelHistory import AggregateTier, ChannelHistory
+from src.model.channelRegistry import ChannelSpec
+from src.view.decimation import min_max_decimation_indices
+from src.view.renderScheduler import RenderScheduler
+from src.model.metricsModel import pipeline_metrics
+
+if TYPE_CHECKING:
+    # pyqtgraph takes longer to import than the rest of the GUI, so it's only imported when the first graph is built,
+    # which lets the main window appear first (see GraphInstrument._build_graph_instrument())
+    from pyqtgraph import GraphicsLayoutWidget, PlotWidget, PlotItem, PlotDataItem, ViewBox
+
+# Maximum number of samples or buckets per pixel column which are decimated for a graph, coarser history tiers are
+# plotted if the visible time span contains more
+MAX_POINTS_PER_PIXEL = 4
+# Colour and width [px] of graph lines at full render quality, lines are 1 px wide from quality level 2 on
+GRAPH_PEN_COLOR = "#0088FF"
+GRAPH_PEN_WIDTH = 1.5
+# Opacity of the grid lines of graphs
+GRAPH_GRID_ALPHA = 0.4
+# Width of the y-axes of the shared canvas [px]; pyqtgraph lines linked x-axes up on screen, so the plots only show the
+# same time range if their y-axes are equally wide
+SHARED_AXIS_WIDTH = 50
+# Values which deviate from the target of a numerical instrument by more than this fraction of the target are
+# highlighted
+TARGET_TOLERANCE = 0.1
+
+
+class Instrument(QWidget):
+    """
+    Base class for instrument widgets displaying sensor data. Modified data is only stored and the instrument is marked
+    as dirty in the RenderScheduler, which repaints it with the next frame. Without a RenderScheduler the instrument is
+    repainted immediately.
+    """
+
+    _render_scheduler = RenderScheduler
+    _data = ChannelHistory
+
+    def __init__(self, render_scheduler: RenderScheduler = None):
+        super(Instrument, self).__init__()
+        self._render_scheduler = render_scheduler
+        self._data = None
+
+    @Slot(ChannelHistory)
+    def on_modified_data(self, data: ChannelHistory) -> None:
+        """
+        Schedule repainting the instrument with the modified data.
+
+        :param data: History of the sensor data to be displayed
+        :return: None
+        """
+        self._data = data
+        if self._render_scheduler is None:
+            self.render_data()
+        else:
+            self._render_scheduler.mark_dirty(self)
+
+    def render_data(self) -> None:
+        """
+        Repaint the instrument with the latest modified data. Called by the RenderScheduler.
+
+        :return: None
+        """
+        raise NotImplementedError
+
+    def in_focus(self) -> bool:
+        """
+        :return: Whether the user is attending to the instrument; instruments out of focus are repainted less often at
+        the lowest render quality (see QUALITY_LEVELS)
+        """
+        return True
 
 
-class NumericalInstrument(QWidget):
+class NumericalInstrument(Instrument):
     """
-    Instrument widget which displays numerical values in LCD display style with a text label.
+    Instrument widget which displays numerical values in LCD display style with a text label. The LCD displays the
+    latest value, or the rolling mean or moving average of the channel's statistics for noisy sensors, and the rolling
+    statistics are summarised below the label. If a target value is set (e.g. from the selected respiration preset),
+    it's shown as well and values deviating from it are highlighted.
     """
 
     _min_width = 200
     _decimal_places = 5
     _lcd = QLCDNumber
     _instrument_title = str
-
-    def __init__(self, instrument_label: str):
+    _statistics_label = QLabel
+    # Displayed value, see DISPLAYED_VALUES of the channel registry
+    _display = str
+    _target_label = QLabel
+    _target = None
+    _deviates = False
+    # Style sheet of the LCD, to which the highlighting of deviating values is added
+    _lcd_style = ""
+
+    def __init__(self, instrument_label: str, render_scheduler: RenderScheduler = None, display: str = "last"):
+        """
+        :param instrument_label: Description to be displayed
+        :param render_scheduler: Scheduler which repaints the instrument
+        :param display: Displayed value: "last", "mean" or "ewma"
+        """
         logging.debug("Creating new numerical instrument widget")
-        super(NumericalInstrument, self).__init__()
+        super(NumericalInstrument, self).__init__(render_scheduler)
+        self._display = display
         self._build_numerical_instrument(instrument_label)
 
         # Set border around widget and inner elements as visual hint during debugging
         if __debug__:
             self.setStyleSheet("border: 1px solid blue;")
-            self._lcd.setStyleSheet("border: 1px solid red;")
+            self._lcd_style = "border: 1px solid red;"
+            self._lcd.setStyleSheet(self._lcd_style)
             self._instrument_title.setStyleSheet("border: 1px solid green;")
 
     def _build_numerical_instrument(self, instrument_label: str) -> None:
@@ -47,8 +136,17 @@ class NumericalInstrument(QWidget):
         self._lcd.setSegmentStyle(self._lcd.Flat)
         self._lcd.setSmallDecimalPoint(True)
 
+        # TODO add translations
+        self._statistics_label = QLabel()
+        # The label's text changes with every frame, a fixed size keeps it from relayouting the whole panel each time
+        self._statistics_label.setFixedSize(self._min_width - 20, 2 * self._statistics_label.fontMetrics().height())
+        self._target_label = QLabel()
+        self._target_label.hide()
+
         inner_layout.addWidget(self._lcd)
         inner_layout.addWidget(self._instrument_title)
+        inner_layout.addWidget(self._statistics_label)
+        inner_layout.addWidget(self._target_label)
 
         self._set_size_policies()
 
@@ -74,32 +172,66 @@ class NumericalInstrument(QWidget):
         num_instr_sp = QSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
         self.setSizePolicy(num_instr_sp)
 
-    @Slot(deque)
-    def on_modified_data(self, data: deque) -> None:
+    def render_data(self) -> None:
         """
         Update value on LCD display.
 
-        :param data: Data as tuples of (value, datetime) to be displayed
         :return: None
         """
-        # Get youngest (last) entry from sensor data deque and display the value in LCD
-        value = data[-1][0]
+        # The rolling statistics are kept up to date by the model, so they're only read here
+        statistics = self._data.statistics.statistics()
+        if self._display == "mean":
+            value = statistics.mean
+        elif self._display == "ewma":
+            value = statistics.ewma
+        else:
+            # Get youngest (last) sample from sensor data ring buffer
+            value = self._data.raw.last_value()
         self._lcd.display(value)
+        text = (f"Ø {self._data.statistics.window / 1e9:g} s: {statistics.mean:.4g} ± {statistics.std:.2g}\n"
+                f"{statistics.minimum:.4g} – {statistics.maximum:.4g}")
+        if text != self._statistics_label.text():
+            self._statistics_label.setText(text)
+        if self._target is not None:
+            self._set_deviates(abs(value - self._target) > TARGET_TOLERANCE * abs(self._target))
+
+    def set_target(self, target: float | None) -> None:
+        """
+        Set the value with which the displayed values are compared.
+
+        :param target: Target value; None to not compare the values
+        :return: None
+        """
+        self._target = target
+        self._target_label.setText(f"Soll: {target:g}" if target is not None else "")
+        self._target_label.setVisible(target is not None)
+        if target is None:
+            self._set_deviates(False)
 
+    def _set_deviates(self, deviates: bool) -> None:
+        # Style sheets are only set on changes, since applying them is expensive
+        if deviates != self._deviates:
+            self._deviates = deviates
+            self._lcd.setStyleSheet(self._lcd_style + ("color: red;" if deviates else ""))
 
-class GraphInstrument(QWidget):
+
+class GraphInstrument(Instrument):
     """
-    Instrument for displaying data as a graph in a cartesian coordinate system.
+    Instrument for displaying data as a graph in a cartesian coordinate system. Only the visible time range is plotted,
+    reduced to min/max pairs per pixel column (see _visible_graph_data()). The graph is drawn with the render quality
+    level of the RenderScheduler, which is applied when the graph is rendered.
     """
-    _MAX_VALUES = 120
     _min_height = 150
     _inner_layout = QVBoxLayout
-    _plot_widget = PlotWidget
-    _graph_data = PlotDataItem
+    _plot_widget: "PlotWidget"
+    _graph_data: "PlotDataItem"
+    _view_box: "ViewBox"
+    # Render quality level with which the graph is drawn (see QUALITY_LEVELS)
+    _quality_level = 0
 
-    def __init__(self):
+    def __init__(self, render_scheduler: RenderScheduler = None):
         logging.debug("Creating new graph instrument widget")
-        super(GraphInstrument, self).__init__()
+        super(GraphInstrument, self).__init__(render_scheduler)
         self._build_graph_instrument()
         if __debug__:
             self.setStyleSheet("border: 1px solid blue;")
@@ -111,6 +243,8 @@ class GraphInstrument(QWidget):
 
         :return: None
         """
+        from pyqtgraph import PlotWidget, PlotItem, PlotDataItem, DateAxisItem
+
         # Native PyQt wrapper for inner contents of GraphInstrument (might be handy for later extension)
         wrap_layout = QVBoxLayout(self)
         wrap = QWidget()
@@ -124,18 +258,22 @@ class GraphInstrument(QWidget):
         # x-axis shall display datetime information for each y-value
         x_axis = DateAxisItem()
         # The PlotDataItem contains and manages the actual data to be displayed
-        self._graph_data = PlotDataItem(pen={"color": "#0088FF", "width": 1.5}, antialias=True)
+        self._graph_data = PlotDataItem(pen={"color": GRAPH_PEN_COLOR, "width": GRAPH_PEN_WIDTH}, antialias=True)
         # The PlotItem contains all graph-related widgets (graph itself, axes, labels, etc.)
         _graph = PlotItem(axisItems={"bottom": x_axis}, enableMenu=False)
-        _graph.showGrid(True, True, 0.4)
+        _graph.showGrid(True, True, GRAPH_GRID_ALPHA)
         _graph.addItem(self._graph_data)
+        # Panning/zooming changes the visible time range, which has to be decimated again
+        self._view_box = _graph.getViewBox()
+        self._view_box.sigRangeChangedManually.connect(self._on_range_changed_manually)
 
         # pyqtgraph container for the graph which we can embed in our PyQt GUI
-        _plot_widget = PlotWidget(background="#00000000", plotItem=_graph)  # Set background (#RRGGBBAA) transparent
-        _plot_widget.setAntialiasing(True)
-        _plot_widget.plotItem.setMouseEnabled(x=True, y=False)  # Allow zooming only along the x-axis
+        # Set background (#RRGGBBAA) transparent
+        self._plot_widget = PlotWidget(background="#00000000", plotItem=_graph)
+        self._plot_widget.setAntialiasing(True)
+        self._plot_widget.plotItem.setMouseEnabled(x=True, y=False)  # Allow zooming only along the x-axis
 
-        self._inner_layout.addWidget(_plot_widget)
+        self._inner_layout.addWidget(self._plot_widget)
 
         # GraphInstrument should shall not exceed given size hint
         graph_instr_sp = QSizePolicy(QSizePolicy.Maximum, QSizePolicy.Maximum)
@@ -149,25 +287,222 @@ class GraphInstrument(QWidget):
         """
         return QSize(self._min_height * 3, self._min_height)
 
-    @Slot(deque)
-    def on_modified_data(self, data: deque) -> None:
+    def render_data(self) -> None:
         """
         Update data to be displayed in GraphInstrument. Setting the data automatically redraws the graph.
 
-        :param data: Data as tuple of (value, datetime) to be plotted in the GraphInstrument
         :return: None
         """
-        times = []
-        values = []
+        render_start = time.perf_counter_ns()
+        if self._render_scheduler is not None and self._render_scheduler.quality_level != self._quality_level:
+            self._apply_quality_level(self._render_scheduler.quality_level)
+        x, y = _visible_graph_data(self._data, self._view_box, self._view_box.autoRangeEnabled()[0])
+        self._graph_data.setData(x=x, y=y, antialias=self._quality_level < 1)
+        pipeline_metrics.record("render_graph", time.perf_counter_ns() - render_start)
+
+    def in_focus(self) -> bool:
+        """
+        :return: Whether the graph is under the mouse cursor or has the keyboard focus
+        """
+        return self.underMouse() or self._plot_widget.hasFocus()
 
-        # TODO room for optimization here: maybe taking the last N data points can be avoided by MAX_QUEUE_LENGTH in
-        # the SensorDataModel, and just plotting all data + scaling axes might be faster than doing this, especially in
-        # high throughput scenarios
-        last_n = list(data)
-        if len(data) > self._MAX_VALUES:
-            last_n = last_n[120:]
+    def _apply_quality_level(self, level: int) -> None:
+        """
+        Change how the graph is drawn according to a render quality level (see QUALITY_LEVELS). The antialiasing of
+        the line is passed with the data by render_data().
 
-        for data_point in last_n:
-            values.append(data_point[0])
-            times.append(data_point[1].timestamp())
-        self._graph_data.setData(x=times, y=values)
+        :param level: Render quality level
+        :return: None
+        """
+        self._quality_level = level
+        self._plot_widget.setAntialiasing(level < 1)
+        _apply_graph_quality(self._plot_widget.plotItem, self._graph_data, level)
+
+    def _on_range_changed_manually(self, _mask) -> None:
+        if self._data is not None:
+            self.on_modified_data(self._data)
+
+
+class SharedGraphInstrument(Instrument):
+    """
+    Instrument for displaying the graphs of several channels on one shared canvas: a pyqtgraph GraphicsLayoutWidget
+    with one plot per channel, stacked in one column. The x-axes of the plots are linked and only the bottom plot shows
+    the time axis, so panning and zooming any plot moves all of them, and all graphs are painted as one scene instead of
+    one GraphInstrument widget per channel. Every channel is plotted like by GraphInstrument, and only the channels
+    modified since the previous frame are plotted again.
+    """
+    _canvas: "GraphicsLayoutWidget"
+    # PlotItems and PlotDataItems by channel name
+    _plots = dict
+    _graph_data = dict
+    # ViewBox to which the x-axes of the other plots are linked; the graphs follow the latest samples while its x-axis
+    # is auto-ranged, which is re-enabled with its auto range button after panning/zooming
+    _master_view_box: "ViewBox"
+    # Histories of all channels by channel name and names of the channels modified since the last frame (dict is used
+    # as insertion-ordered set)
+    _histories = dict
+    _modified = dict
+    # Render quality level with which the graphs are drawn (see QUALITY_LEVELS)
+    _quality_level = 0
+
+    def __init__(self, channels: list[ChannelSpec], render_scheduler: RenderScheduler = None):
+        """
+        :param channels: Channels to be plotted, from top to bottom
+        :param render_scheduler: Scheduler which repaints the instrument
+        """
+        logging.debug("Creating new shared graph instrument widget")
+        super(SharedGraphInstrument, self).__init__(render_scheduler)
+        self._plots = {}
+        self._graph_data = {}
+        self._histories = {}
+        self._modified = {}
+        self._build_shared_graph_instrument(channels)
+
+    def _build_shared_graph_instrument(self, channels: list[ChannelSpec]) -> None:
+        from pyqtgraph import GraphicsLayoutWidget, PlotDataItem, DateAxisItem, LabelItem
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self._canvas = GraphicsLayoutWidget()
+        self._canvas.setBackground("#00000000")
+        self._canvas.setAntialiasing(True)
+        layout.addWidget(self._canvas)
+
+        # The x-axes follow a channel which is sent by the Raspberry Pi Pico, since derived channels (e.g. of the breath
+        # analyzer) are only updated once per breath
+        master = next((channel for channel in channels if channel.wire_index is not None), channels[0])
+        for row, channel in enumerate(channels):
+            # Only the bottom plot gets a time axis, the others share it
+            bottom_axis = {"bottom": DateAxisItem()} if row == len(channels) - 1 else {}
+            plot = self._canvas.addPlot(row=row, col=0, axisItems=bottom_axis, enableMenu=False)
+            plot.getAxis("left").setWidth(SHARED_AXIS_WIDTH)
+            # The plots are too low for rotated axis labels, so the channel is named in the top left corner of the plot
+            title = LabelItem(channel.title, size="8pt", justify="left")
+            title.setParentItem(plot.getViewBox())
+            title.anchor(itemPos=(0, 0), parentPos=(0, 0), offset=(4, 0))
+            plot.showGrid(True, True, GRAPH_GRID_ALPHA)
+            plot.setMouseEnabled(x=True, y=False)  # Allow zooming only along the x-axis
+            if row < len(channels) - 1:
+                plot.hideAxis("bottom")
+            graph_data = PlotDataItem(pen={"color": GRAPH_PEN_COLOR, "width": GRAPH_PEN_WIDTH}, antialias=True)
+            plot.addItem(graph_data)
+            # Panning/zooming any plot changes the visible time range of all plots, which have to be decimated again
+            plot.getViewBox().sigRangeChangedManually.connect(self._on_range_changed_manually)
+            self._plots[channel.name] = plot
+            self._graph_data[channel.name] = graph_data
+
+        self._master_view_box = self._plots[master.name].getViewBox()
+        for name, plot in self._plots.items():
+            if name != master.name:
+                plot.setXLink(self._master_view_box)
+                plot.enableAutoRange(x=False)
+                # Auto-ranging the x-axis of a linked plot would fit it to its own samples
+                plot.hideButtons()
+
+    def on_modified_channels(self, channels: dict[str, ChannelHistory]) -> None:
+        """
+        Schedule repainting the graphs of the modified channels.
+
+        :param channels: Histories of the modified channels by channel name
+        :return: None
+        """
+        for name, history in channels.items():
+            if name in self._plots:
+                self._histories[name] = history
+                self._modified[name] = None
+        if self._render_scheduler is None:
+            self.render_data()
+        elif len(self._modified) > 0:
+            self._render_scheduler.mark_dirty(self)
+
+    def render_data(self) -> None:
+        """
+        Update the graphs of the channels modified since the last frame.
+
+        :return: None
+        """
+        render_start = time.perf_counter_ns()
+        if self._render_scheduler is not None and self._render_scheduler.quality_level != self._quality_level:
+            self._apply_quality_level(self._render_scheduler.quality_level)
+        follow = self._master_view_box.autoRangeEnabled()[0]
+        for name in self._modified:
+            x, y = _visible_graph_data(self._histories[name], self._plots[name].getViewBox(), follow)
+            self._graph_data[name].setData(x=x, y=y, antialias=self._quality_level < 1)
+        self._modified = {}
+        pipeline_metrics.record("render_graph", time.perf_counter_ns() - render_start)
+
+    def in_focus(self) -> bool:
+        """
+        :return: Whether the canvas is under the mouse cursor or has the keyboard focus
+        """
+        return self.underMouse() or self._canvas.hasFocus()
+
+    def _apply_quality_level(self, level: int) -> None:
+        self._quality_level = level
+        self._canvas.setAntialiasing(level < 1)
+        for name, plot in self._plots.items():
+            _apply_graph_quality(plot, self._graph_data[name], level)
+
+    def _on_range_changed_manually(self, _mask) -> None:
+        self._modified = dict.fromkeys(self._histories)
+        self.on_modified_channels({})
+
+
+def _visible_graph_data(data: ChannelHistory, view_box: "ViewBox", follow: bool) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Select and decimate the samples of a channel which are visible in a graph. Only the visible time range is plotted,
+    reduced to min/max pairs per pixel column (see min_max_decimation_indices). If the graph is zoomed out beyond the
+    raw samples, the downsampled history tier which matches the visible time span is plotted as min/max envelope.
+
+    :param data: History of the channel
+    :param view_box: ViewBox of the graph
+    :param follow: Whether the graph follows the latest samples, i.e. it wasn't panned/zoomed by the user
+    :return: Tuple of (x, y) to be plotted: UNIX epoch timestamps [s] and values
+    """
+    pixels = max(int(view_box.width()), 1)
+    # The ring buffer returns zero-copy views, only the decimated samples are converted and handed to pyqtgraph
+    timestamps = data.raw.timestamps()
+    values = data.raw.values()
+
+    if not follow:
+        # Graph was panned/zoomed by the user, so only the visible time range (plus one sample on each side, so that
+        # the line runs to the edges) of the matching history tier is plotted
+        x_min, x_max = view_box.viewRange()[0]
+        span = to_monotonic_ns(np.array([x_min, x_max]))
+        tier = data.select_tier(int(span[0]), int(span[1]), MAX_POINTS_PER_PIXEL * pixels)
+        if tier is not None:
+            timestamps, values = _tier_envelope(tier)
+        start, end = np.searchsorted(timestamps, span)
+        timestamps = timestamps[max(start - 1, 0):end + 1]
+        values = values[max(start - 1, 0):end + 1]
+
+    indices = min_max_decimation_indices(values, pixels)
+    return to_epoch_seconds(timestamps[indices]), values[indices]
+
+
+def _tier_envelope(tier: AggregateTier) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :param tier: Downsampled history tier
+    :return: Tuple of (timestamps, values) with the minimum and the maximum of each bucket at the bucket's centre
+    """
+    timestamps, minima, maxima, _ = tier.data()
+    centres = timestamps + tier.width // 2
+    return np.repeat(centres, 2), np.column_stack((minima, maxima)).ravel()
+
+
+def _apply_graph_quality(plot: "PlotItem", graph_data: "PlotDataItem", level: int) -> None:
+    """
+    Change how a graph is drawn according to a render quality level (see QUALITY_LEVELS), except for antialiasing,
+    which is set on the graph's view and passed with the data.
+
+    :param plot: PlotItem of the graph
+    :param graph_data: PlotDataItem of the graph
+    :param level: Render quality level
+    :return: None
+    """
+    graph_data.setPen(color=GRAPH_PEN_COLOR, width=GRAPH_PEN_WIDTH if level < 2 else 1)
+    # The data is already decimated per pixel column, pyqtgraph's "peak" downsampling only kicks in when the view box
+    # is narrower than the decimated data and keeps the spikes like the decimation
+    graph_data.setClipToView(level >= 3)
+    graph_data.setDownsampling(auto=level >= 3, method="peak")
+    plot.showGrid(level < 3, level < 3, GRAPH_GRID_ALPHA)
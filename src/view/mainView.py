@@ -1,7 +1,13 @@
 import logging
-from src.view.instrumentView import NumericalInstrument, GraphInstrument
+from src.view.instrumentPanel import InstrumentPanel
+from src.model.channelRegistry import ChannelSpec
+from src.view.renderScheduler import RenderScheduler
 from PySide6.QtGui import QAction
-from PySide6.QtWidgets import QGridLayout, QMainWindow, QWidget, QMenuBar, QStatusBar
+from PySide6.QtWidgets import QLabel, QMainWindow, QMenuBar, QStatusBar, QTabWidget, QVBoxLayout, QWidget
+
+# Names of the render quality levels (see QUALITY_LEVELS of the RenderScheduler)
+# TODO add translations
+render_quality_names = ("voll", "ohne Kantenglättung", "dünne Linien", "vereinfacht", "minimal")
 
 
 class RespiratorMainWindow(QMainWindow):
@@ -11,14 +17,13 @@ class RespiratorMainWindow(QMainWindow):
 
     menu_bar = QMenuBar
     status_bar = QStatusBar
-
-    animal_temp_instrument = NumericalInstrument
-    heatbed_temp_instrument = NumericalInstrument
-    air_temp_instrument = NumericalInstrument
-    pressure_inspiration_instrument = NumericalInstrument
-    eTVOC_instrument = NumericalInstrument
-    eCO2_instrument = NumericalInstrument
-    relative_humidity_instrument = NumericalInstrument
+    render_scheduler = RenderScheduler
+    # One instrument panel per device
+    panel_tabs = QTabWidget
+    # Banner above the instrument panels which lists the active alarms
+    alarm_label = QLabel
+    # Permanent status bar entry with the render quality level
+    render_quality_label = QLabel
 
     def __init__(self):
         logging.debug("Initialise main window")
@@ -26,17 +31,26 @@ class RespiratorMainWindow(QMainWindow):
         self.setWindowTitle("Ventilator GUI")
         self.setMinimumSize(1000, 600)
 
-        # Create main container (widget) containing the numerical instruments
-        self.num_instruments_container = QWidget(self)
-        self.setCentralWidget(self.num_instruments_container)
-        # Grid layout to nicely place the numerical instruments inside the main container
-        self.num_instruments_layout = QGridLayout()
-        self.num_instruments_layout.setSpacing(0)
-        self.num_instruments_container.setLayout(self.num_instruments_layout)
+        # Create main container containing the alarm banner and one instrument panel per device; the tabs are only
+        # shown if there is more than one device
+        central_widget = QWidget(self)
+        central_layout = QVBoxLayout(central_widget)
+        central_layout.setContentsMargins(0, 0, 0, 0)
+        self.alarm_label = QLabel()
+        self.alarm_label.setStyleSheet("background-color: red; color: white; font-weight: bold; padding: 4px;")
+        self.alarm_label.hide()
+        central_layout.addWidget(self.alarm_label)
+        self.panel_tabs = QTabWidget()
+        self.panel_tabs.setTabBarAutoHide(True)
+        central_layout.addWidget(self.panel_tabs)
+        self.setCentralWidget(central_widget)
+
+        # Instruments of all panels are repainted with a fixed frame rate, independent of the arrival of sensor data
+        self.render_scheduler = RenderScheduler()
 
         self._build_menu_bar()
         self._build_status_bar()
-        self._build_instrument_view()
+        self.render_scheduler.quality_changed.connect(self.show_render_quality)
 
     def _build_menu_bar(self):
         """
@@ -47,64 +61,111 @@ class RespiratorMainWindow(QMainWindow):
         self.setMenuBar(self.menu_bar)
         # TODO add translations
         # Mark ALT key shortcuts with an "&" sign
+        file_menu = self.menu_bar.addMenu("&Datei")
+        self.open_export_action = QAction("Sitzung &exportieren...")
+        file_menu.addAction(self.open_export_action)
+
         tools_menu = self.menu_bar.addMenu("&Einstellungen")
         self.open_presets_action = QAction("Beatmungs-&Voreinstellungen...")
         tools_menu.addAction(self.open_presets_action)
 
+        view_menu = self.menu_bar.addMenu("&Ansicht")
+        # All graphs of a panel on one canvas with a shared time axis instead of one graph per channel
+        self.shared_canvas_action = QAction("Gemeinsame &Zeitachse")
+        self.shared_canvas_action.setCheckable(True)
+        self.shared_canvas_action.toggled.connect(self.set_shared_canvas)
+        view_menu.addAction(self.shared_canvas_action)
+
+        diagnostics_menu = self.menu_bar.addMenu("&Diagnose")
+        self.dump_metrics_action = QAction("&Pipeline-Messwerte protokollieren")
+        diagnostics_menu.addAction(self.dump_metrics_action)
+
     def _build_status_bar(self):
         logging.debug("Creating status bar for main window")
         self.status_bar = QStatusBar()
         self.status_bar.showMessage("Respirator <status>")
+        self.render_quality_label = QLabel()
+        self.status_bar.addPermanentWidget(self.render_quality_label)
+        self.show_render_quality(self.render_scheduler.quality_level)
         self.setStatusBar(self.status_bar)
 
-    def _build_instrument_view(self):
-        """
-        Builds the part of the main view containing the numerical instruments.
+    def add_instrument_panel(self, title: str, channels: list[ChannelSpec]) -> InstrumentPanel:
         """
-        # TODO add translations
-        logging.debug("Creating instrument widgets")
-        # Create all numerical and graph instrument widgets
-        self.animal_temp_instrument = NumericalInstrument("Temperatur Tier [°C]")
-        self.animal_temp_graph = GraphInstrument()
+        Add an instrument panel for a device as new tab.
 
-        self.heatbed_temp_instrument = NumericalInstrument("Temperatur Heizplatte [°C]")
-        self.heatbed_temp_graph = GraphInstrument()
-
-        self.air_temp_instrument = NumericalInstrument("Temperatur Luft [°C]")
-        self.air_temp_graph = GraphInstrument()
-
-        self.pressure_inspiration_instrument = NumericalInstrument("Druck Inspirationskammer [psi]")
-        self.pressure_inspiration_graph = GraphInstrument()
-
-        self.eTVOC_instrument = NumericalInstrument("eTVOC [1]")
-        self.eTVOC_graph = GraphInstrument()
-
-        self.eCO2_instrument = NumericalInstrument("eCO2 [1]")
-        self.eCO2_graph = GraphInstrument()
-
-        self.relative_humidity_instrument = NumericalInstrument("Luftfeuchtigkeit [%]")
-        self.relative_humidity_graph = GraphInstrument()
+        :param title: Tab title, e.g. the device's serial port
+        :param channels: Sensor channels of the channel registry
+        :return: Instrument panel
+        """
+        logging.debug(f"Adding instrument panel for {title}")
+        panel = InstrumentPanel(self.render_scheduler, channels)
+        if self.shared_canvas_action.isChecked():
+            panel.set_shared_canvas(True)
+        self.panel_tabs.addTab(panel, title)
+        return panel
+
+    def set_shared_canvas(self, shared: bool) -> None:
+        """
+        Switch the instrument panels of all devices between one graph per channel and one shared canvas.
 
-        logging.debug("Appending instruments to main window")
-        # Set first two columns of instruments
-        self.num_instruments_layout.addWidget(self.animal_temp_instrument, 0, 0)
-        self.num_instruments_layout.addWidget(self.animal_temp_graph, 0, 1)
+        :param shared: Whether the graphs are shown on a shared canvas
+        :return: None
+        """
+        logging.info(f"Switching to {'shared canvas' if shared else 'one graph per channel'}")
+        for index in range(self.panel_tabs.count()):
+            self.panel_tabs.widget(index).set_shared_canvas(shared)
 
-        self.num_instruments_layout.addWidget(self.heatbed_temp_instrument, 1, 0)
-        self.num_instruments_layout.addWidget(self.heatbed_temp_graph, 1, 1)
+    def current_instrument_panel(self) -> InstrumentPanel | None:
+        """
+        :return: Instrument panel of the selected tab; None if there are no panels
+        """
+        return self.panel_tabs.currentWidget()
 
-        self.num_instruments_layout.addWidget(self.air_temp_instrument, 2, 0)
-        self.num_instruments_layout.addWidget(self.air_temp_graph, 2, 1)
+    def show_alarms(self, alarms: list[str]) -> None:
+        """
+        Show the active alarms in the alarm banner, which is hidden if there are none.
 
-        self.num_instruments_layout.addWidget(self.pressure_inspiration_instrument, 3, 0)
-        self.num_instruments_layout.addWidget(self.pressure_inspiration_graph, 3, 1)
+        :param alarms: Descriptions of the active alarms
+        :return: None
+        """
+        self.alarm_label.setText("\n".join(alarms))
+        self.alarm_label.setVisible(len(alarms) > 0)
+        if len(alarms) > 0:
+            # Make sure the banner is painted now and not only with the next frame of the render scheduler
+            self.alarm_label.repaint()
 
-        # Set second two column of instruments
-        self.num_instruments_layout.addWidget(self.eTVOC_instrument, 0, 2)
-        self.num_instruments_layout.addWidget(self.eTVOC_graph, 0, 3)
+    def show_render_quality(self, level: int) -> None:
+        """
+        :param level: Render quality level of the render scheduler
+        :return: None
+        """
+        # TODO add translations
+        self.render_quality_label.setText(f"Darstellung: {render_quality_names[level]}")
 
-        self.num_instruments_layout.addWidget(self.eCO2_instrument, 1, 2)
-        self.num_instruments_layout.addWidget(self.eCO2_graph, 1, 3)
+    def show_pipeline_metrics(self, metrics: dict, connected_devices: int, device_count: int) -> None:
+        """
+        Show the connection status and a summary of the pipeline metrics in the status bar.
 
-        self.num_instruments_layout.addWidget(self.relative_humidity_instrument, 2, 2)
-        self.num_instruments_layout.addWidget(self.relative_humidity_graph, 2, 3)
+        :param metrics: Snapshot of the PipelineMetrics
+        :param connected_devices: Number of connected Raspberry Pi Picos
+        :param device_count: Number of Raspberry Pi Picos which are read from
+        :return: None
+        """
+        # TODO add translations
+        stages = metrics["stages"]
+        counters = metrics["counters"]
+        if device_count > 1:
+            connection = f"{connected_devices}/{device_count} verbunden"
+        else:
+            connection = "verbunden" if connected_devices > 0 else "nicht verbunden"
+        self.status_bar.showMessage(
+            f"Respirator {connection} | "
+            f"p95 Lesen {stages['serial_read']['p95_ms']:.1f} ms, "
+            f"Parsen {stages['parse']['p95_ms']:.2f} ms, "
+            f"Warteschlange {stages['queue_latency']['p95_ms']:.1f} ms, "
+            f"Modell {stages['model_append']['p95_ms']:.2f} ms, "
+            f"Frame {stages['render_frame']['p95_ms']:.1f} ms | "
+            f"Messwerte {counters['samples']}, verworfen {counters['dropped_samples']}, "
+            f"verspätet {counters['late_samples']}, Alarme {counters['alarms']} "
+            f"(p95 {stages['alarm_latency']['p95_ms']:.1f} ms), Befehle {counters['commands']} "
+            f"(p95 {stages['command_rtt']['p95_ms']:.1f} ms, fehlgeschlagen {counters['command_failures']})")
@@ -1,13 +1,23 @@
 import logging
-from src.model.presetsModel import PresetsTableModel, RespirationPresetsModel
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QTableView, QAbstractItemView, QPushButton
+from PySide6.QtCore import Qt
+from src.model.presetsModel import PresetsFilterProxyModel, PresetsTableModel, RespirationPresetsModel
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QTableView, QAbstractItemView, QPushButton, \
+    QLineEdit, QInputDialog, QLabel
+
+# Number of rows whose contents determine the column widths of the presets table
+RESIZE_CONTENTS_PRECISION = 50
 
 
 class PresetsTableView(QTableView):
     """
-    This class is used to represent the respiration presets' data in a table view.
+    This class is used to represent the respiration presets' data in a table view. The table can be filtered by preset
+    name, and its cells can be edited.
     """
 
+    _presets_model = RespirationPresetsModel
+    _table_model = PresetsTableModel
+    _filter_model = PresetsFilterProxyModel
+
     def __init__(self):
         logging.debug("Initialising presets table view")
         super(PresetsTableView, self).__init__()
@@ -16,32 +26,61 @@ class PresetsTableView(QTableView):
         logging.debug("Setting PyQt TableView model from respiration presets model")
         self._presets_model = RespirationPresetsModel()
         self._table_model = PresetsTableModel(self._presets_model)
-        self.setModel(self._table_model)
+        self._filter_model = PresetsFilterProxyModel()
+        self._filter_model.setSourceModel(self._table_model)
+        self.setModel(self._filter_model)
 
         # Make the user select only one whole row at a time
         self.setSelectionMode(QAbstractItemView.SingleSelection)
         self.setSelectionBehavior(QAbstractItemView.SelectRows)
 
-        self.resizeRowsToContents()
+        # Cells are edited by double-click or typing, so that a click only selects a preset
+        self.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
+
+        # The column widths are measured from the first rows only (instead of 1000 rows by default), which keeps
+        # opening large libraries instant; the values of all presets are short numbers anyway
+        self.horizontalHeader().setResizeContentsPrecision(RESIZE_CONTENTS_PRECISION)
         self.resizeColumnsToContents()
 
     def get_table_row_data(self) -> {}:
         """
         Retrieve the data of the currently selected table row directly from the native RespirationPresetsModel.
 
-        :return: Table row data (dict style).
+        :return: Table row data (dict style); empty if no preset is selected
         """
-        data = {}
-        selected_row_index = self.currentIndex().row()
-        # Get the key/name of the selected preset using the row index
-        preset = list(self._presets_model.presets.sections())[selected_row_index]
-
-        # Loop through all presets values (options)
-        for preset_value in self._presets_model.presets.options(preset):
-            data[preset_value] = self._presets_model.presets.get(preset, preset_value)
+        index = self.currentIndex()
+        if not index.isValid():
+            return {}
+        # Get the key/name of the selected preset using the row index of the unfiltered table
+        selected_row_index = self._filter_model.mapToSource(index).row()
+        preset = self._presets_model.name(selected_row_index)
+        data = self._presets_model.preset(preset)
         logging.debug(f"Selected preset '{preset}' ({selected_row_index + 1}. row) with data {data}")
         return data
 
+    def set_filter_text(self, text: str) -> None:
+        """
+        :param text: Text which the names of the shown presets contain; all presets are shown if it's empty
+        :return: None
+        """
+        self._filter_model.set_filter_text(text)
+
+    def add_preset(self, identifier: str) -> bool:
+        """
+        Create a new preset with the DEFAULT values and select it, so that its values can be edited.
+
+        :param identifier: Name of the new preset
+        :return: Success of creating the preset
+        """
+        if not self._table_model.add_preset(identifier):
+            return False
+        source_index = self._table_model.index(self._table_model.rowCount() - 1, 0)
+        index = self._filter_model.mapFromSource(source_index)
+        if index.isValid():
+            self.setCurrentIndex(index)
+            self.scrollTo(index)
+        return True
+
 
 class PresetsViewWindow(QWidget):
     """
@@ -63,8 +102,15 @@ class PresetsViewWindow(QWidget):
         main_layout = QVBoxLayout()
         button_layout = QHBoxLayout()
 
+        # Filter of the presets by name above the table
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Voreinstellungen filtern...")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self.presets_table.set_filter_text)
+
         # Add table to main_layout layout before adding button_layout to it, so that table is displayed above buttons
         self.setLayout(main_layout)
+        main_layout.addWidget(self.filter_edit)
         main_layout.addWidget(self.presets_table)
 
         # Buttons for handling presets
@@ -72,7 +118,35 @@ class PresetsViewWindow(QWidget):
         self.send_preset_button.setText("Voreinstellung an Beatmungsgerät senden")
         self.add_preset_button = QPushButton()
         self.add_preset_button.setText("Neue Voreinstellung erstellen")
+        self.apply_preset_button = QPushButton()
+        self.apply_preset_button.setText("Alarmgrenzen und Sollwerte übernehmen")
+
+        # Status of the last preset sent to the respirator or applied to its alarm limits
+        self.command_status_label = QLabel()
+        main_layout.addWidget(self.command_status_label)
 
         main_layout.addLayout(button_layout)
         button_layout.addWidget(self.add_preset_button)
+        button_layout.addWidget(self.apply_preset_button)
         button_layout.addWidget(self.send_preset_button)
+
+    def ask_preset_name(self) -> str | None:
+        """
+        :return: Name of the new preset entered by the user; None if the user cancelled
+        """
+        name, accepted = QInputDialog.getText(self, "Neue Voreinstellung", "Name der Voreinstellung:")
+        return name.strip() if accepted and name.strip() else None
+
+    def selected_preset_name(self) -> str:
+        """
+        :return: Name of the selected preset; "" if no preset is selected
+        """
+        index = self.presets_table.currentIndex()
+        return self.presets_table.model().headerData(index.row(), Qt.Vertical) if index.isValid() else ""
+
+    def show_command_status(self, status: str) -> None:
+        """
+        :param status: Status of the last preset sent to the respirator or applied to its alarm limits
+        :return: None
+        """
+        self.command_status_label.setText(status)
@@ -0,0 +1,161 @@
+import time
+import logging
+from PySide6.QtCore import QObject, QTimer, Signal, Slot
+from PySide6.QtWidgets import QWidget
+from src.model.metricsModel import pipeline_metrics
+
+# Default frame rate with which the instrument widgets are repainted [fps]
+DEFAULT_FRAME_RATE = 30
+
+# Render quality levels, from the best to the cheapest. Every level keeps the reductions of the levels above it.
+# | Level | Reduction                                                                                  |
+# |-------|--------------------------------------------------------------------------------------------|
+# | 0     | None: antialiased 1.5 px lines and grid                                                    |
+# | 1     | Lines and grid are drawn without antialiasing                                              |
+# | 2     | 1 px lines, which Qt draws much faster than wider ones                                     |
+# | 3     | pyqtgraph clips the graphs to the visible range and downsamples them, no grid              |
+# | 4     | Instruments out of focus are only repainted with every OFF_FOCUS_FRAME_DIVISOR-th frame    |
+QUALITY_LEVELS = 5
+# The quality is reduced if painting the frames of a window takes longer than this fraction of the frame interval on
+# average, and raised again after QUALITY_RECOVERY_WINDOWS consecutive windows below the lower fraction
+QUALITY_REDUCE_FRACTION = 0.75
+QUALITY_RAISE_FRACTION = 0.35
+# Number of painted frames over which the paint time is averaged before the quality is adjusted
+QUALITY_WINDOW_FRAMES = 15
+QUALITY_RECOVERY_WINDOWS = 4
+# Instruments out of focus are repainted with every n-th frame at the lowest quality level
+OFF_FOCUS_FRAME_DIVISOR = 3
+
+
+class RenderScheduler(QObject):
+    """
+    RenderScheduler decouples repainting the instrument widgets from the arrival of sensor data. Instruments are only
+    marked as dirty when their data is modified, and all dirty instruments are repainted together at a fixed frame
+    rate. Instruments which are hidden or in a minimised window are skipped (and stay dirty) until they are visible
+    again.
+
+    The scheduler also governs the render quality (see QUALITY_LEVELS), so that the frame rate is held on slow
+    machines: the paint time of every frame is measured, from rendering the instruments until Qt has painted them, and
+    the quality is stepped down while the frames exceed their budget and up again once there is enough headroom.
+    Instruments read the quality_level when they are rendered.
+    """
+
+    # Signals
+    # New render quality level
+    quality_changed = Signal(int)
+    # Time in which the dirty instruments of a frame were rendered [ns], emitted before Qt paints them
+    frame_rendered = Signal("qint64")
+
+    _timer = QTimer
+    # Dirty instruments (dict is used as insertion-ordered set)
+    _dirty = dict
+    _frame_interval_ns = int
+    _frame_count = 0
+    # Start of the frame whose paint time is measured [ns]; None if no frame is being painted
+    _paint_start = None
+    # Sum and number of the paint times within the current window, and number of consecutive windows below the budget
+    _window_paint_ns = 0
+    _window_frames = 0
+    _fast_windows = 0
+    _quality_level = 0
+
+    def __init__(self, frame_rate: float = DEFAULT_FRAME_RATE):
+        """
+        :param frame_rate: Frame rate with which dirty instruments are repainted [fps]
+        """
+        logging.debug("Creating new render scheduler")
+        super(RenderScheduler, self).__init__()
+        self._dirty = {}
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._render_frame)
+        self.set_frame_rate(frame_rate)
+        self._timer.start()
+
+    def set_frame_rate(self, frame_rate: float) -> None:
+        """
+        Set the frame rate with which dirty instruments are repainted.
+
+        :param frame_rate: Frame rate [fps]
+        :return: None
+        """
+        logging.debug(f"Setting render frame rate to {frame_rate} fps")
+        self._timer.setInterval(max(1, round(1000 / frame_rate)))
+        self._frame_interval_ns = self._timer.interval() * 1_000_000
+
+    @property
+    def quality_level(self) -> int:
+        """
+        :return: Current render quality level, 0 being the best (see QUALITY_LEVELS)
+        """
+        return self._quality_level
+
+    def mark_dirty(self, instrument: QWidget) -> None:
+        """
+        Mark an instrument to be repainted with the next frame. The instrument has to implement render_data().
+
+        :param instrument: Instrument widget
+        :return: None
+        """
+        self._dirty[instrument] = None
+
+    @Slot()
+    def _render_frame(self) -> None:
+        if len(self._dirty) == 0:
+            return
+
+        start = time.perf_counter_ns()
+        self._frame_count += 1
+        skip_off_focus = self._quality_level == QUALITY_LEVELS - 1 and self._frame_count % OFF_FOCUS_FRAME_DIVISOR != 0
+        rendered = False
+        pending = {}
+        for instrument in self._dirty:
+            if not instrument.isVisible() or instrument.window().isMinimized():
+                # Keep the instrument dirty, so that it's up-to-date as soon as it's visible again
+                pending[instrument] = None
+            elif skip_off_focus and not instrument.in_focus():
+                pending[instrument] = None
+            else:
+                instrument.render_data()
+                rendered = True
+        self._dirty = pending
+        render_time = time.perf_counter_ns() - start
+        pipeline_metrics.record("render_frame", render_time)
+        if rendered:
+            self.frame_rendered.emit(render_time)
+
+        if rendered and self._paint_start is None:
+            # Qt paints the rendered instruments with the events which are already queued, so a zero timer fires once
+            # the frame is painted
+            self._paint_start = start
+            QTimer.singleShot(0, self._on_frame_painted)
+
+    @Slot()
+    def _on_frame_painted(self) -> None:
+        paint_time = time.perf_counter_ns() - self._paint_start
+        self._paint_start = None
+        pipeline_metrics.record("frame_paint", paint_time)
+        self._window_paint_ns += paint_time
+        self._window_frames += 1
+        if self._window_frames < QUALITY_WINDOW_FRAMES:
+            return
+
+        average = self._window_paint_ns / self._window_frames
+        self._window_paint_ns = 0
+        self._window_frames = 0
+        if average > QUALITY_REDUCE_FRACTION * self._frame_interval_ns:
+            self._fast_windows = 0
+            if self._quality_level < QUALITY_LEVELS - 1:
+                self._set_quality_level(self._quality_level + 1, average)
+        elif average < QUALITY_RAISE_FRACTION * self._frame_interval_ns:
+            self._fast_windows += 1
+            if self._fast_windows >= QUALITY_RECOVERY_WINDOWS and self._quality_level > 0:
+                self._fast_windows = 0
+                self._set_quality_level(self._quality_level - 1, average)
+        else:
+            self._fast_windows = 0
+
+    def _set_quality_level(self, level: int, average_paint_ns: float) -> None:
+        logging.info("Setting render quality level to %d (average paint time %.1f ms, frame interval %.1f ms)", level,
+                     average_paint_ns / 1e6, self._frame_interval_ns / 1e6)
+        self._quality_level = level
+        self.quality_changed.emit(level)
@@ -0,0 +1,37 @@
+import numpy as np
+from src.model.breathAnalyzer import BreathAnalyzer, RESPIRATORY_RATE_CHANNEL
+from src.model.metricsModel import pipeline_metrics
+
+
+def _breaths(count: int, samples_per_breath: int = 40) -> np.ndarray:
+    """
+    :return: Pressure waveform swinging between PEEP (5 psi) and peak (20 psi)
+    """
+    phase = np.arange(count * samples_per_breath) / samples_per_breath * 2 * np.pi
+    return 12.5 - 7.5 * np.cos(phase)
+
+
+def test_batch_with_shared_timestamp_drops_breaths():
+    # Text lines of one serial read share the read's host timestamp
+    analyzer = BreathAnalyzer()
+    pressure = _breaths(5)
+    dropped = pipeline_metrics.counter("dropped_breaths")
+
+    derived = analyzer.process(pressure, np.full(len(pressure), 1_000_000_000, dtype=np.int64))
+
+    assert derived == {}
+    assert pipeline_metrics.counter("dropped_breaths") > dropped
+
+
+def test_breaths_after_shared_timestamp_are_reported():
+    analyzer = BreathAnalyzer()
+    pressure = _breaths(5)
+    analyzer.process(pressure, np.full(len(pressure), 1_000_000_000, dtype=np.int64))
+
+    # One breath per second
+    timestamps = 2_000_000_000 + np.arange(len(pressure), dtype=np.int64) * 25_000_000
+    derived = analyzer.process(pressure, timestamps)
+
+    rates, _ = derived[RESPIRATORY_RATE_CHANNEL]
+    assert len(rates) > 0
+    assert np.allclose(rates, 60.0, rtol=0.05)
@@ -0,0 +1,199 @@
+import os
+import sys
+import tty
+import time
+import select
+import argparse
+from collections import deque
+import numpy as np
+
+ROOT_DIRPATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRPATH)
+
+from src.controller.picoProtocol import COMMAND_DEDUPE_WINDOW, SENSOR_VALUE_COUNT, encode_ack, encode_frames
+
+# Maximum interval between two writes to the pseudo-terminal; higher sample rates are written in bursts [s]
+MAX_WRITE_INTERVAL = 0.01
+# Respiration pressure [psi] at the end of the expiration (PEEP) and at the end of the inspiration (peak)
+PEEP_PRESSURE = 5.0
+PEAK_PRESSURE = 20.0
+# Time constant of the pressure curve relative to the inspiration/expiration duration
+PRESSURE_TIME_CONSTANT = 0.25
+
+
+class PicoSimulator:
+    """
+    Virtual Raspberry Pi Pico, which emits realistic breathing waveforms in the Pico's wire format (text lines or
+    binary frames) on a pseudo-terminal. Jitter, dropped bytes and corrupt samples can be injected to stress the serial
+    code path of the GUI. Commands sent by the GUI (e.g. presets) are printed and acknowledged between two writes of
+    samples, and lost commands can be injected to exercise retries.
+    """
+
+    def __init__(self, rate: float, binary: bool, breathing_rate: float, ie_ratio: float, jitter: float,
+                 drop_rate: float, corrupt_rate: float, seed: int = None, command_loss: float = 0.0):
+        """
+        :param rate: Sample rate [samples/s]
+        :param binary: Whether binary frames are sent instead of text lines
+        :param breathing_rate: Respiration rate [breaths/min]
+        :param ie_ratio: Inspiration to expiration ratio
+        :param jitter: Maximum random delay of each write [s]
+        :param drop_rate: Probability of each byte to be dropped
+        :param corrupt_rate: Probability of each sample to be corrupted
+        :param seed: Seed of the random number generator
+        :param command_loss: Probability of each received command to be ignored, i.e. not acknowledged
+        """
+        self._rate = rate
+        self._binary = binary
+        self._breath_duration = 60.0 / breathing_rate
+        self._inspiration_fraction = ie_ratio / (1.0 + ie_ratio)
+        self._jitter = jitter
+        self._drop_rate = drop_rate
+        self._corrupt_rate = corrupt_rate
+        self._rng = np.random.default_rng(seed)
+        self._sent_samples = 0
+        self._command_loss = command_loss
+        # Incomplete command line and IDs of the last applied commands, which are acknowledged again without being applied
+        # if they are repeated; like on the Pico, older IDs are forgotten and applied again (see picoProtocol)
+        self._pending_command = b""
+        self._applied_commands = deque(maxlen=COMMAND_DEDUPE_WINDOW)
+
+        self._master_fd, slave_fd = os.openpty()
+        # Raw mode, so that the line discipline doesn't alter the sent data
+        tty.setraw(slave_fd)
+        self.port = os.ttyname(slave_fd)
+        self._slave_fd = slave_fd
+
+    def run(self, duration: float = None) -> None:
+        """
+        Send samples until the duration has passed or the simulator is interrupted.
+
+        :param duration: Duration [s]; infinite if not given
+        :return: None
+        """
+        start = time.perf_counter()
+        while duration is None or time.perf_counter() - start < duration:
+            due = int((time.perf_counter() - start) * self._rate)
+            if due > self._sent_samples:
+                self._write(self._generate(self._sent_samples, due))
+                self._sent_samples = due
+            self._read_commands()
+
+            delay = min(1.0 / self._rate, MAX_WRITE_INTERVAL)
+            if self._jitter > 0:
+                delay += self._rng.uniform(0, self._jitter)
+            time.sleep(delay)
+
+    def _generate(self, first: int, end: int) -> bytes:
+        """
+        Generate the samples with the indices [first, end) in the wire format.
+
+        :param first: Index of the first sample
+        :param end: Index after the last sample
+        :return: Encoded samples
+        """
+        t = np.arange(first, end) / self._rate
+        count = len(t)
+        values = np.empty((count, SENSOR_VALUE_COUNT))
+        # Order of the values as in the Raspberry Pi Pico respirator implementation
+        values[:, 0] = 30.5 + 1.5 * np.sin(2 * np.pi * t / 600) + self._rng.normal(0, 0.05, count)
+        values[:, 1] = 90 + 5 * np.sin(2 * np.pi * t / 900) + self._rng.normal(0, 0.2, count)
+        values[:, 2] = 400 + 60 * self._breathing_phase(t)[1] + self._rng.normal(0, 5, count)
+        values[:, 3] = self._pressure(t)
+        values[:, 4] = 175 + 25 * np.sin(2 * np.pi * t / 300) + self._rng.normal(0, 3, count)
+
+        corrupt = self._rng.random(count) < self._corrupt_rate
+        if self._binary:
+            data = bytearray(encode_frames(np.arange(first, end), (t * 1e6).astype(np.int64), values))
+            # Flip one byte in each corrupt frame, which breaks its CRC (or its sync word)
+            frame_size = len(data) // count
+            for index in np.flatnonzero(corrupt):
+                data[index * frame_size + self._rng.integers(frame_size)] ^= 0xFF
+        else:
+            lines = ["/".join(f"{value:.2f}" for value in row) for row in values]
+            for index in np.flatnonzero(corrupt):
+                lines[index] = lines[index][:self._rng.integers(len(lines[index]))] + "#?"
+            data = bytearray(("\r\n".join(lines) + "\r\n").encode("utf8"))
+
+        if self._drop_rate > 0:
+            data = np.frombuffer(bytes(data), dtype=np.uint8)[self._rng.random(len(data)) >= self._drop_rate]
+        return bytes(data)
+
+    def _breathing_phase(self, t: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        :param t: Time [s]
+        :return: Tuple of (inspiration mask, normalised time within the current inspiration/expiration [0, 1))
+        """
+        position = (t % self._breath_duration) / self._breath_duration
+        inspiration = position < self._inspiration_fraction
+        phase = np.where(inspiration, position / self._inspiration_fraction,
+                         (position - self._inspiration_fraction) / (1 - self._inspiration_fraction))
+        return inspiration, phase
+
+    def _pressure(self, t: np.ndarray) -> np.ndarray:
+        # Pressure rises exponentially towards the peak during the inspiration and decays towards PEEP afterwards
+        inspiration, phase = self._breathing_phase(t)
+        rise = 1 - np.exp(-phase / PRESSURE_TIME_CONSTANT)
+        decay = np.exp(-phase / PRESSURE_TIME_CONSTANT)
+        shape = np.where(inspiration, rise, decay * (1 - np.exp(-1 / PRESSURE_TIME_CONSTANT)))
+        noise = self._rng.normal(0, 0.1, len(t))
+        return PEEP_PRESSURE + (PEAK_PRESSURE - PEEP_PRESSURE) * shape + noise
+
+    def _write(self, data: bytes) -> None:
+        view = memoryview(data)
+        while len(view) > 0:
+            written = os.write(self._master_fd, view)
+            view = view[written:]
+
+    def _read_commands(self) -> None:
+        while select.select([self._master_fd], [], [], 0)[0]:
+            data = os.read(self._master_fd, 4096)
+            if data == b"":
+                break
+            lines = (self._pending_command + data).split(b"\n")
+            self._pending_command = lines.pop()
+            for line in lines:
+                self._on_command(line)
+
+    def _on_command(self, line: bytes) -> None:
+        command_id, separator, payload = line.removeprefix(b"$").partition(b":")
+        if not line.startswith(b"$") or separator == b"" or not command_id.isdigit():
+            print(f"Received: {line!r}", file=sys.stderr)
+            return
+        if self._rng.random() < self._command_loss:
+            print(f"Ignoring command {int(command_id)}: {payload!r}", file=sys.stderr)
+            return
+        if int(command_id) not in self._applied_commands:
+            self._applied_commands.append(int(command_id))
+            print(f"Received command {int(command_id)}: {payload!r}", file=sys.stderr)
+        self._write(encode_ack(int(command_id)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Virtual Raspberry Pi Pico on a pseudo-terminal (Linux/macOS). Start "
+                                                 "the GUI with --port <printed port> to connect to it.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Sample rate [samples/s] (default: 1)")
+    parser.add_argument("--binary", action="store_true", help="Send binary frames instead of text lines")
+    parser.add_argument("--breathing-rate", type=float, default=60.0,
+                        help="Respiration rate [breaths/min] (default: 60)")
+    parser.add_argument("--ie-ratio", type=float, default=0.8, help="Inspiration to expiration ratio (default: 0.8)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random delay of each write [ms]")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Probability of each byte to be dropped")
+    parser.add_argument("--corrupt-rate", type=float, default=0.0,
+                        help="Probability of each sample to be corrupted")
+    parser.add_argument("--command-loss", type=float, default=0.0,
+                        help="Probability of each received command to be ignored (not acknowledged)")
+    parser.add_argument("--duration", type=float, help="Stop after this duration [s]")
+    parser.add_argument("--seed", type=int, help="Seed of the random number generator")
+    args = parser.parse_args()
+
+    simulator = PicoSimulator(args.rate, args.binary, args.breathing_rate, args.ie_ratio, args.jitter / 1000,
+                              args.drop_rate, args.corrupt_rate, args.seed, args.command_loss)
+    print(simulator.port, flush=True)
+    try:
+        simulator.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()